@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import file_fingerprint
+from cell_statistics import time_window
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from projection import dataset_crs, parse_crs, reproject_gdf, same_crs, warp_index
+from stats_sketch import robust_limits, variable_sketch
+from tracing import span
+
+# Frames read and drawn per worker task (one read of their time steps)
+FRAMES_PER_TASK = 16
+MANIFEST_NAME = "render_manifest.json"
+SPEC_NAME = "render_spec.json"
+DEFAULT_SPEC = {
+    "netcdf": None,
+    "variables": [],
+    "derived": {"definitions": {}, "aliases": {}, "subsets": {}},
+    "start": None,
+    "end": None,
+    "every": 1,
+    "shapefile": None,
+    "xy": None,
+    "xy_labels": None,
+    "display_crs": "",
+    "limits": {},  # variable -> [vmin, vmax]; missing variables use robust limits of all their values
+    "cmap": "viridis",
+    "size": [8, 6],
+    "dpi": 100,
+    "output": None,
+    "workers": 1,
+}
+
+
+def read_spec(path):
+    with open(path) as f:
+        spec = dict(DEFAULT_SPEC, **json.load(f))
+    if not spec["netcdf"] or not spec["variables"] or not spec["output"]:
+        raise ValueError("A render spec needs 'netcdf', 'variables' and 'output'.")
+    return spec
+
+
+def write_spec(path, spec):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(spec, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _registry(spec):
+    derived = spec["derived"]
+    subsets = {
+        path: {dim: slice(*window) for dim, window in indexers.items()}
+        for path, indexers in derived.get("subsets", {}).items()
+    }
+    return DerivedVariableRegistry.from_spec(
+        DatasetManager(chunk_cache_bytes=0), dict(derived, subsets=subsets)
+    )
+
+
+def time_label(value, position):
+    """YYYY-MM-DD of a time step (numpy or cftime), or its position for other time axes."""
+    try:
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        text = str(value)[:10]
+        return text if text[:4].isdigit() else f"step{position:05d}"
+
+
+def frame_positions(times, start=None, end=None, every=1):
+    """Positions of the time steps in [start, end], every n-th."""
+    first, stop = time_window(times, start, end)
+    return np.arange(first, stop, max(1, int(every)))
+
+
+def load_overlays(spec, display):
+    """Shapefile (in the display CRS) and XY table of a spec, read once and handed to every worker."""
+    from session import load_source  # Cached binary copies of the parsed sources
+    import geopandas as gpd
+    gdf = reproject_gdf(load_source(spec["shapefile"], gpd.read_file), display) if spec["shapefile"] else None
+    xy = load_source(spec["xy"], pd.read_csv) if spec["xy"] else None
+    return gdf, xy
+
+
+def style_key(spec):
+    """Everything besides the data that changes how a frame looks."""
+    overlays = [file_fingerprint(spec[name]) if spec[name] else "" for name in ("shapefile", "xy")]
+    return overlays + [str(spec[name]) for name in ("xy_labels", "display_crs", "cmap", "size", "dpi")]
+
+
+def plan_frames(spec, registry):
+    """[(variable, positions, labels, png paths, digests, limits)] of every frame in a spec.
+
+    A frame's digest covers the variable's data identity, its time step, the colour
+    limits and the style, so an unchanged frame renders to the same digest.
+    """
+    path, style = spec["netcdf"], style_key(spec)
+    plans = []
+    for var_name in spec["variables"]:
+        variable = registry.open(path, var_name)
+        limits = spec["limits"].get(var_name) or robust_limits(variable_sketch(registry, path, var_name)) or (0, 1)
+        identity = registry.identity(path, var_name) + style + [repr(tuple(float(v) for v in limits))]
+        if variable.ndim == 3:
+            times = variable["time"].values
+            positions = frame_positions(times, spec["start"], spec["end"], spec["every"])
+            labels = [time_label(times[i], i) for i in positions]
+        else:
+            positions, labels = np.array([-1]), ["map"]
+        folder = os.path.join(spec["output"], var_name)
+        pngs = [os.path.join(folder, f"{var_name}_{label}.png") for label in labels]
+        digests = [
+            hashlib.sha1("|".join(identity + [str(i), label]).encode()).hexdigest()
+            for i, label in zip(positions, labels)
+        ]
+        plans.append((var_name, positions, labels, pngs, digests, tuple(float(v) for v in limits)))
+    return plans
+
+
+_renderer = {}
+
+
+def _init_renderer(spec, overlays):
+    """Per-process renderer: opened variables and one Agg figure with the overlays already drawn."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib.patheffects as path_effects
+
+    registry = _registry(spec)
+    figure = Figure(figsize=tuple(spec["size"]), dpi=spec["dpi"])
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    gdf, xy = overlays
+    if gdf is not None:
+        gdf.plot(ax=ax, edgecolor="black", facecolor="none", zorder=3)
+    if xy is not None:
+        ax.scatter(xy["East"], xy["North"], color="red", marker="o", zorder=4)
+        if spec["xy_labels"]:
+            for east, north, label in zip(xy["East"], xy["North"], xy[spec["xy_labels"]]):
+                text = ax.text(east, north, str(label), fontsize=10, ha="right", va="bottom", color="white", zorder=5)
+                text.set_path_effects([path_effects.Stroke(linewidth=2, foreground="black"), path_effects.Normal()])
+    _renderer.clear()
+    _renderer.update(
+        spec=spec, registry=registry, figure=figure, ax=ax, image=None, colorbar=None,
+        display=parse_crs(spec["display_crs"]),
+        grid_crs=dataset_crs(registry.dataset_manager.get(spec["netcdf"])),
+    )
+
+
+def _geometry(variable):
+    """(warp index or None, extent, origin) to draw frames of a variable in the display CRS."""
+    lon, lat = variable["lon"].values, variable["lat"].values
+    display, grid_crs = _renderer["display"], _renderer["grid_crs"]
+    if display is not None and not same_crs(grid_crs, display):
+        index = warp_index(lon, lat, grid_crs, display)
+        return index, index.extent, "upper"
+    half_x = abs(lon[-1] - lon[0]) / max(1, lon.size - 1) / 2
+    half_y = abs(lat[-1] - lat[0]) / max(1, lat.size - 1) / 2
+    extent = [min(lon[0], lon[-1]) - half_x, max(lon[0], lon[-1]) + half_x,
+              min(lat[0], lat[-1]) - half_y, max(lat[0], lat[-1]) + half_y]
+    return None, extent, "lower" if lat[-1] >= lat[0] else "upper"
+
+
+def render_task(var_name, positions, labels, pngs, limits):
+    """Render frames of one variable into PNGs (runs in a worker); returns how many were written."""
+    spec, ax = _renderer["spec"], _renderer["ax"]
+    variable = _renderer["registry"].open(spec["netcdf"], var_name)
+    with span("io:read", variable=var_name, frames=len(positions)):
+        if variable.ndim == 3:
+            block = variable.isel(time=list(map(int, positions))).values
+        else:
+            block = variable.isel().values[None]
+    index, extent, origin = _geometry(variable)
+    image = _renderer["image"]
+    if image is None:
+        image = ax.imshow(block[0], cmap=spec["cmap"], zorder=1)
+        _renderer["image"] = image
+        _renderer["colorbar"] = _renderer["figure"].colorbar(image, ax=ax)
+        geographic = _renderer["display"] is not None and _renderer["display"].is_geographic
+        ax.set_xlabel("Longitude" if geographic else "East (m)")
+        ax.set_ylabel("Latitude" if geographic else "North (m)")
+    image.set_extent(extent)
+    image.origin = origin
+    image.set_clim(*limits)
+    _renderer["colorbar"].set_label(variable.attrs.get("units", ""))
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    os.makedirs(os.path.dirname(pngs[0]), exist_ok=True)
+    for frame, label, png in zip(block, labels, pngs):
+        with span("render:frame", variable=var_name, frame=label):
+            image.set_data(index.warp(frame) if index is not None else frame)
+            ax.set_title(f"{var_name} - {label}" if label != "map" else var_name)
+            _renderer["figure"].savefig(png + ".tmp.png")
+            os.replace(png + ".tmp.png", png)  # A cancelled run never leaves a half-written frame
+    return len(pngs)
+
+
+def read_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def render_maps(spec, progress=None):
+    """Render every frame of a spec, skipping frames already rendered and unchanged.
+
+    Overlays are read and reprojected once, here, then drawn once into each
+    worker's figure; every frame after that only swaps the image data and title.
+    Frames of a variable go to workers in tasks of FRAMES_PER_TASK so each task is
+    a single read. ``progress(done, total)`` may raise to stop the run (finished
+    frames are kept in the manifest). Returns (rendered, skipped).
+    """
+    os.makedirs(spec["output"], exist_ok=True)
+    registry = _registry(spec)
+    plans = plan_frames(spec, registry)
+    manifest = read_manifest(spec["output"])
+
+    tasks = []
+    skipped = 0
+    for var_name, positions, labels, pngs, digests, limits in plans:
+        todo = [
+            i for i, (png, digest) in enumerate(zip(pngs, digests))
+            if not (os.path.exists(png) and manifest.get(os.path.relpath(png, spec["output"])) == digest)
+        ]
+        skipped += len(pngs) - len(todo)
+        for start in range(0, len(todo), FRAMES_PER_TASK):
+            chosen = todo[start:start + FRAMES_PER_TASK]
+            tasks.append((
+                var_name, [int(positions[i]) for i in chosen], [labels[i] for i in chosen],
+                [pngs[i] for i in chosen], limits, [digests[i] for i in chosen],
+            ))
+    total = sum(len(task[1]) for task in tasks)
+    if not tasks:
+        return 0, skipped
+
+    overlays = load_overlays(spec, parse_crs(spec["display_crs"]) or dataset_crs(
+        registry.dataset_manager.get(spec["netcdf"])))
+    done = 0
+
+    def finished(task):
+        nonlocal done
+        for png, digest in zip(task[3], task[5]):
+            manifest[os.path.relpath(png, spec["output"])] = digest
+        write_manifest(spec["output"], manifest)
+        done += len(task[1])
+        if progress:
+            progress(done, total)
+
+    workers = max(1, min(int(spec["workers"]), len(tasks)))
+    if workers == 1:
+        _init_renderer(spec, overlays)
+        for task in tasks:
+            render_task(*task[:5])
+            finished(task)
+        return done, skipped
+
+    # Spawned workers open their own file handles (HDF5 handles don't survive a fork)
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_renderer, initargs=(spec, overlays),
+    ) as pool:
+        futures = {pool.submit(render_task, *task[:5]): task for task in tasks}
+        try:
+            for future in as_completed(futures):
+                future.result()
+                finished(futures[future])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return done, skipped
+
+
+def main(argv=None):
+    """Headless entry point: ``python batch_render.py spec.json [--workers N]``."""
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print("Usage: batch_render.py SPEC.json [--workers N]\n"
+              f"Keys of a spec (see the {SPEC_NAME} saved by the app): {', '.join(DEFAULT_SPEC)}")
+        return 0 if argv else 2
+    spec = read_spec(argv[0])
+    if "--workers" in argv:
+        spec["workers"] = int(argv[argv.index("--workers") + 1])
+
+    def progress(done, total):
+        print(f"\rRendered {done}/{total} frames", end="", flush=True)
+
+    rendered, skipped = render_maps(spec, progress)
+    print(f"\nRendered {rendered} frames, {skipped} unchanged, in {spec['output']}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
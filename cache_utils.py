@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+def get_cache_dir(subdir=None):
+    """Return (and create) the app cache directory, next to the exe when compiled."""
+    if getattr(sys, 'frozen', False):  # If compiled
+        base = os.path.join(os.path.dirname(sys.executable), "cache")
+    else:  # Running in development mode
+        base = os.path.join(os.path.expanduser("~"), ".cuwalid_cache")
+    path = os.path.join(base, subdir) if subdir else base
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file's current contents: path, size and modification time."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def nbytes_of(value):
+    """Best-effort size in bytes of a cached value (numpy arrays, DataFrames, ...)."""
+    size = getattr(value, "nbytes", None)
+    if size is not None:
+        return int(size)
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by item count and/or total bytes."""
+
+    def __init__(self, max_items=None, max_bytes=None, on_evict=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._discard(key, evicted=False)
+            size = nbytes_of(value) if self.max_bytes is not None else 0
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Never cache something larger than the whole budget (0 disables caching)
+            self._items[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._shrink()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            return self._discard(key, evicted=True)
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._items.keys()):
+                self._discard(key, evicted=True)
+
+    def _shrink(self):
+        while self._items and (
+            (self.max_items is not None and len(self._items) > self.max_items)
+            or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._items))
+            self._discard(oldest, evicted=True)
+
+    def _discard(self, key, evicted):
+        value = self._items.pop(key)
+        self._total_bytes -= self._sizes.pop(key, 0)
+        if evicted and self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"Error evicting cache entry {key}: {e}")
+        return value
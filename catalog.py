@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import sqlite3
+import netCDF4
+
+from cache_utils import get_cache_dir, file_fingerprint
+
+CATALOG_EXTENSIONS = (".nc", ".nc4")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    root TEXT,
+    fingerprint TEXT,
+    time_start TEXT,
+    time_end TEXT,
+    n_time INTEGER,
+    xmin REAL, ymin REAL, xmax REAL, ymax REAL,
+    crs TEXT,
+    scanned REAL
+);
+CREATE TABLE IF NOT EXISTS variables (
+    path TEXT REFERENCES files(path) ON DELETE CASCADE,
+    name TEXT,
+    dims TEXT,
+    shape TEXT,
+    dtype TEXT,
+    units TEXT,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS variables_name ON variables(name);
+"""
+
+
+def _first_last(variable):
+    # Only the two end values are read, never the whole coordinate
+    if variable.size == 0:
+        return None, None
+    return variable[0].item(), variable[-1].item()
+
+
+def _crs_of(dataset):
+    """CRS text from a CF grid_mapping variable or a global attribute, if present."""
+    for var in dataset.variables.values():
+        mapping_name = getattr(var, "grid_mapping", None)
+        if mapping_name and mapping_name in dataset.variables:
+            mapping = dataset.variables[mapping_name]
+            for attr in ("crs_wkt", "spatial_ref", "proj4"):
+                if attr in mapping.ncattrs():
+                    return str(mapping.getncattr(attr))
+            return mapping_name
+    for attr in ("crs", "proj4", "spatial_ref"):
+        if attr in dataset.ncattrs():
+            return str(dataset.getncattr(attr))
+    return None
+
+
+def read_metadata(path):
+    """Variables, time coverage, extent and CRS of a NetCDF file, without reading any data."""
+    with netCDF4.Dataset(path) as dataset:
+        variables = []
+        for name, var in dataset.variables.items():
+            if name in dataset.dimensions:
+                continue  # Coordinate variables are described by the file record
+            variables.append({
+                "name": name,
+                "dims": list(var.dimensions),
+                "shape": list(var.shape),
+                "dtype": str(var.dtype),
+                "units": str(getattr(var, "units", "")),
+            })
+
+        record = {"time_start": None, "time_end": None, "n_time": None}
+        if "time" in dataset.variables:
+            time_var = dataset.variables["time"]
+            time_var.set_auto_mask(False)
+            first, last = _first_last(time_var)
+            record["n_time"] = time_var.size
+            if first is not None and hasattr(time_var, "units"):
+                calendar = getattr(time_var, "calendar", "standard")
+                first, last = netCDF4.num2date([first, last], time_var.units, calendar)
+                record["time_start"], record["time_end"] = first.isoformat(), last.isoformat()
+
+        extent = []
+        for dim in ("lon", "lat"):
+            low = high = None
+            if dim in dataset.variables:
+                first, last = _first_last(dataset.variables[dim])
+                if first is not None:
+                    low, high = min(first, last), max(first, last)
+            extent.append((low, high))
+        (record["xmin"], record["xmax"]), (record["ymin"], record["ymax"]) = extent
+        record["crs"] = _crs_of(dataset)
+    return record, variables
+
+
+class DatasetCatalog:
+    """SQLite index of the NetCDF files under one or more directories.
+
+    Only metadata is read when scanning, and files whose fingerprint is unchanged
+    are skipped, so rescanning a large output tree is quick.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(get_cache_dir(), "catalog.sqlite")
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def scan(self, root, progress=None):
+        """Index new or changed files under ``root`` and drop entries for deleted ones.
+
+        Returns (updated, unchanged, removed) counts.
+        """
+        root = os.path.abspath(root)
+        known = {
+            row["path"]: row["fingerprint"]
+            for row in self.connection.execute("SELECT path, fingerprint FROM files WHERE root = ?", (root,))
+        }
+        found = []
+        for folder, _, names in os.walk(root):
+            found += [os.path.join(folder, name) for name in names if name.lower().endswith(CATALOG_EXTENSIONS)]
+
+        updated = unchanged = 0
+        for i, path in enumerate(sorted(found)):
+            fingerprint = file_fingerprint(path)
+            if known.get(path) == fingerprint:
+                unchanged += 1
+            else:
+                try:
+                    record, variables = read_metadata(path)
+                except OSError:
+                    continue  # Not a readable NetCDF file (or still being written)
+                self._store(root, path, fingerprint, record, variables)
+                updated += 1
+            if progress is not None:
+                progress(i + 1, len(found))
+
+        found_paths = set(found)
+        removed = [path for path in known if path not in found_paths]
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+        return updated, unchanged, len(removed)
+
+    def _store(self, root, path, fingerprint, record, variables):
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, root, fingerprint, record["time_start"], record["time_end"], record["n_time"],
+                 record["xmin"], record["ymin"], record["xmax"], record["ymax"], record["crs"], time.time()),
+            )
+            self.connection.executemany(
+                "INSERT INTO variables VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, var["name"], json.dumps(var["dims"]), json.dumps(var["shape"]), var["dtype"], var["units"])
+                 for var in variables],
+            )
+
+    def search(self, text=None):
+        """Catalogued files whose path or variable names contain ``text``, with their variables."""
+        query = "SELECT * FROM files"
+        params = ()
+        if text:
+            query += (" WHERE path LIKE ? OR path IN (SELECT path FROM variables WHERE name LIKE ?)")
+            params = (f"%{text}%", f"%{text}%")
+        entries = []
+        for row in self.connection.execute(query + " ORDER BY path", params):
+            entry = dict(row)
+            entry["variables"] = [
+                var["name"] for var in self.connection.execute(
+                    "SELECT name FROM variables WHERE path = ? ORDER BY name", (row["path"],)
+                )
+            ]
+            entries.append(entry)
+        return entries
+
+    def files_with_variable(self, name):
+        return [
+            row["path"] for row in self.connection.execute(
+                "SELECT path FROM variables WHERE name = ? ORDER BY path", (name,)
+            )
+        ]
+
+    def roots(self):
+        return [row["root"] for row in self.connection.execute("SELECT DISTINCT root FROM files ORDER BY root")]
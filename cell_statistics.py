@@ -0,0 +1,237 @@
+import re
+import bisect
+import warnings
+import multiprocessing
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.transform import from_origin
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from extraction import time_chunk_for
+from tracing import traced
+
+MAP_STATISTICS = ["Mean", "Min", "Max", "Percentile", "Exceedance count", "Trend (per year)"]
+
+
+def time_in_years(times):
+    """Elapsed time in years since the first step (step index for non-datetime axes)."""
+    try:
+        index = pd.DatetimeIndex(times)
+        return ((index - index[0]) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64) / 365.25
+    except (TypeError, ValueError):
+        pass
+    try:
+        # cftime dates (360-day, noleap, ...) subtract to timedeltas in their own calendar
+        return np.array([(t - times[0]).total_seconds() for t in times], dtype=np.float64) / 86400 / 365.25
+    except (TypeError, AttributeError):
+        return np.arange(len(times), dtype=np.float64)
+
+
+def _date_fields(value):
+    """(year, month, day, hour, minute, second) of a date string, datetime or cftime date.
+
+    Strings are split by hand so dates like 2000-02-30 in a 360-day calendar are accepted.
+    """
+    if isinstance(value, str):
+        match = re.match(r"\s*(-?\d+)-(\d+)-(\d+)(?:[ T](\d+):(\d+)(?::(\d+))?)?", value)
+        if not match:
+            raise ValueError(f"Cannot read the date '{value}'; use YYYY-MM-DD")
+        return tuple(int(field or 0) for field in match.groups())
+    return (value.year, value.month, value.day, value.hour, value.minute, value.second)
+
+
+def time_window(times, start=None, end=None):
+    """(first, stop) indices of the steps within [start, end], found by binary search."""
+    try:
+        index = pd.DatetimeIndex(times)
+    except (TypeError, ValueError):
+        # cftime axes: compare calendar fields, which sort the same way as the dates
+        keys = [_date_fields(t) for t in times]
+        first = bisect.bisect_left(keys, _date_fields(start)) if start else 0
+        stop = bisect.bisect_right(keys, _date_fields(end)) if end else len(keys)
+        return int(first), int(stop)
+    first = index.searchsorted(pd.Timestamp(start), side="left") if start else 0
+    stop = index.searchsorted(pd.Timestamp(end), side="right") if end else len(index)
+    return int(first), int(stop)
+
+
+class CellAccumulator:
+    """Mergeable per-cell running sums for mean, extremes, exceedances and linear trend.
+
+    Everything accumulates in float64 so long windows don't lose precision.
+    """
+
+    def __init__(self, shape, threshold=None):
+        self.threshold = threshold
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.sum = np.zeros(shape, dtype=np.float64)
+        self.min = np.full(shape, np.nan)
+        self.max = np.full(shape, np.nan)
+        self.exceed = np.zeros(shape, dtype=np.int64)
+        # Trend sums: sum(t), sum(t^2), sum(t*y) over the valid steps of each cell
+        self.sum_t = np.zeros(shape, dtype=np.float64)
+        self.sum_tt = np.zeros(shape, dtype=np.float64)
+        self.sum_ty = np.zeros(shape, dtype=np.float64)
+
+    def update(self, t, block):
+        block = np.asarray(block, dtype=np.float64)
+        valid = ~np.isnan(block)
+        values = np.where(valid, block, 0.0)
+        t = np.asarray(t, dtype=np.float64)[:, None, None]
+
+        self.count += valid.sum(axis=0)
+        self.sum += values.sum(axis=0)
+        self.min = np.fmin(self.min, np.where(valid, block, np.inf).min(axis=0))
+        self.max = np.fmax(self.max, np.where(valid, block, -np.inf).max(axis=0))
+        if self.threshold is not None:
+            self.exceed += (valid & (block > self.threshold)).sum(axis=0)
+        self.sum_t += np.where(valid, t, 0.0).sum(axis=0)
+        self.sum_tt += np.where(valid, t * t, 0.0).sum(axis=0)
+        self.sum_ty += (values * t).sum(axis=0)
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self.exceed += other.exceed
+        self.sum_t += other.sum_t
+        self.sum_tt += other.sum_tt
+        self.sum_ty += other.sum_ty
+        return self
+
+    def result(self, statistic):
+        has_data = self.count > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if statistic == "Mean":
+                out = self.sum / self.count
+            elif statistic == "Min":
+                out = np.where(np.isinf(self.min), np.nan, self.min)
+            elif statistic == "Max":
+                out = np.where(np.isinf(self.max), np.nan, self.max)
+            elif statistic == "Exceedance count":
+                out = self.exceed.astype(np.float64)
+            elif statistic == "Trend (per year)":
+                n = self.count
+                denominator = n * self.sum_tt - self.sum_t ** 2
+                out = (n * self.sum_ty - self.sum_t * self.sum) / denominator
+                out = np.where((n > 1) & (denominator != 0), out, np.nan)
+            else:
+                raise ValueError(f"Unknown statistic: {statistic}")
+        return np.where(has_data, out, np.nan)
+
+
+def _open(path, var_name, registry_spec):
+    # Each worker opens the file itself; nothing is cached because every chunk is read once
+    registry = DerivedVariableRegistry.from_spec(DatasetManager(chunk_cache_bytes=0), registry_spec)
+    return registry.open(path, var_name)
+
+
+@traced("worker:summary range")
+def reduce_time_range(path, var_name, registry_spec, first, stop, threshold=None):
+    """Accumulate one contiguous range of time steps (runs in a worker process)."""
+    variable = _open(path, var_name, registry_spec)
+    shape = (variable.sizes["lat"], variable.sizes["lon"])
+    accumulator = CellAccumulator(shape, threshold)
+    t_all = time_in_years(variable["time"].values)
+    chunk = time_chunk_for(shape[0] * shape[1])
+    for start in range(first, stop, chunk):
+        end = min(start + chunk, stop)
+        block = variable.isel(time=slice(start, end)).values
+        accumulator.update(t_all[start:end], block)
+    return accumulator
+
+
+@traced("worker:percentile rows")
+def percentile_rows(path, var_name, registry_spec, first, stop, row_start, row_stop, q):
+    """Exact per-cell percentile for a band of rows over the whole window.
+
+    Percentiles can't be merged from partial sums, so the grid is split into row
+    bands sized to the memory budget and each band reads its window once.
+    """
+    variable = _open(path, var_name, registry_spec)
+    n_lon = variable.sizes["lon"]
+    n_time = stop - first
+    band = max(1, time_chunk_for(n_time * n_lon))  # rows per band within the byte budget
+    out = np.full((row_stop - row_start, n_lon), np.nan)
+    for row in range(row_start, row_stop, band):
+        end = min(row + band, row_stop)
+        block = np.asarray(variable.isel(time=slice(first, stop), lat=slice(row, end)).values, dtype=np.float64)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN cells stay NaN
+            out[row - row_start:end - row_start] = np.nanpercentile(block, q, axis=0)
+    return out
+
+
+def _split(first, stop, parts):
+    edges = np.linspace(first, stop, max(1, parts) + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def compute_cell_statistic(path, var_name, registry_spec, statistic, start=None, end=None,
+                           threshold=None, percentile=None, workers=1):
+    """Per-cell summary map of a 3-D variable over a time window.
+
+    With workers > 1 the window (or, for percentiles, the rows) is split across a
+    process pool and the partial results are merged.
+    Returns (map[lat, lon], lat, lon, (first, stop)).
+    """
+    variable = _open(path, var_name, registry_spec)
+    lat = variable["lat"].values
+    lon = variable["lon"].values
+    first, stop = time_window(variable["time"].values, start, end)
+    if stop <= first:
+        raise ValueError("The selected time window contains no time steps.")
+
+    if statistic == "Percentile":
+        if percentile is None:
+            raise ValueError("Enter the percentile to compute (0-100).")
+        bands = _split(0, lat.size, workers)
+        args = [(path, var_name, registry_spec, first, stop, a, b, percentile) for a, b in bands]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                parts = list(pool.map(percentile_rows, *zip(*args)))
+        else:
+            parts = [percentile_rows(*arg) for arg in args]
+        return np.vstack(parts), lat, lon, (first, stop)
+
+    if statistic == "Exceedance count" and threshold is None:
+        raise ValueError("Enter the threshold to count exceedances of.")
+
+    ranges = _split(first, stop, workers)
+    args = [(path, var_name, registry_spec, a, b, threshold) for a, b in ranges]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(reduce_time_range, *zip(*args)))
+    else:
+        parts = [reduce_time_range(*arg) for arg in args]
+    accumulator = parts[0]
+    for part in parts[1:]:
+        accumulator.merge(part)
+    return accumulator.result(statistic), lat, lon, (first, stop)
+
+
+def north_up(data, lat, lon):
+    """Flip a (lat, lon) grid to north-up and return it with its imshow extent."""
+    data = np.asarray(data)
+    if lat.size > 1 and lat[0] < lat[-1]:
+        data = data[::-1]
+    dx = abs(lon[1] - lon[0]) if lon.size > 1 else 1.0
+    dy = abs(lat[1] - lat[0]) if lat.size > 1 else 1.0
+    extent = [lon.min() - dx / 2, lon.max() + dx / 2, lat.min() - dy / 2, lat.max() + dy / 2]
+    return data, extent
+
+
+def write_ascii_grid(path, data, extent, nodata=-9999.0):
+    """Write a north-up grid as an ESRI ASCII raster that the raster loader can read back."""
+    rows, cols = data.shape
+    cell = (extent[1] - extent[0]) / cols
+    transform = from_origin(extent[0], extent[3], cell, (extent[3] - extent[2]) / rows)
+    with rasterio.open(
+        path, "w", driver="AAIGrid", height=rows, width=cols, count=1,
+        dtype="float64", transform=transform, nodata=nodata,
+    ) as dst:
+        dst.write(np.where(np.isnan(data), nodata, data), 1)
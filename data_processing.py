@@ -1,21 +1,62 @@
 import os
 import sys
+import hashlib
 import traceback
-import rasterio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import xarray as xr
 from PyQt6.QtCore import Qt, QTimer, QObject, pyqtSignal, QThread
-from PyQt6.QtWidgets import QFileDialog, QListWidgetItem, QApplication
-from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QFileDialog, QListWidgetItem, QApplication, QTableWidgetItem
+from PyQt6.QtGui import QTextCursor, QPixmap
 from cuwalid.dryp.main_DRYP import run_DRYP
-from shapely.geometry import mapping
+from batch_render import DEFAULT_SPEC, SPEC_NAME, write_spec
+from cache_utils import LRUCache
+from cell_statistics import compute_cell_statistic, north_up, write_ascii_grid
+from dataset_manager import subset_indexers
+from derived_variables import companion_path
+from export_writers import (
+    EXPORT_FILTERS, TABLE_FILTERS, open_tidy_writer, open_writer, read_table, with_export_extension, write_table,
+)
+from extraction import (
+    iter_point_blocks, iter_region_blocks, iter_variable_blocks, iter_zone_blocks, point_indices, polygon_mask,
+    zone_index,
+)
+from job_queue import format_eta
+from parallel_extraction import iter_parallel_blocks
+from projection import dataset_crs, parse_crs, reproject_gdf
+from precision import compact_raster
+from preflight import preflight
+from rechunk import rechunk_dataset
+from regridding import grid_bounds, grid_coordinates, regrid_weights, target_grid, write_regridded
+from skill_scores import pair_columns, score_pairs
+from session import (
+    SESSION_FILTER, SESSION_WIDGETS, SOURCES, LazySource, decode_subsets, encode_subsets, load_source, read_raster,
+    read_session, set_widget_state, source_cache_path, widget_state, write_session,
+)
+from stats_sketch import cached_sketch, sketch_variable, variable_sketch
+from temporal_aggregation import StreamingAggregator
+from thumbnails import THUMBNAIL_SIZE, render_thumbnails, thumbnail_paths
+from tracing import span, traced, tracer
+from ui.catalog_dialog import create_catalog_dialog
 
 class DataProcessor:
     def __init__(self, ui):
         self.ui = ui
         self.json_input = None
+        self.catalog_entries = []  # Rows shown in the catalog browser
+        # Previews render in a separate process (HDF5 reads aren't thread-safe) and are polled
+        self.thumbnail_pool = None
+        self.thumbnail_jobs = {}  # future -> (path, variable)
+        self.thumbnail_timer = QTimer()
+        self.thumbnail_timer.timeout.connect(self.poll_thumbnails)
+        # Whole-variable colour limits scan in their own process, so they don't wait behind previews
+        self.sketch_pool = None
+        self.sketch_jobs = {}  # future -> (path, variable)
+        # Extracted/aggregated tables keyed by file fingerprint, selection and settings
+        self.results_cache = LRUCache(max_bytes=256 * 1024 ** 2)
+        self.job_rows = []  # Job ids in the order of the jobs table
 
     def load_raster(self):
         filename, _ = QFileDialog.getOpenFileName(self.ui, "Open Raster File", "", "ASCII Files (*.asc)")
@@ -29,16 +70,34 @@ class DataProcessor:
 
     def process_raster_with_loading(self, file_path):
         try:
-            with rasterio.open(file_path) as src:
-                data = src.read(1)
-                extent = [src.bounds.left, src.bounds.right, src.bounds.bottom, src.bounds.top]
-            self.ui.raster_data = (data, extent)
+            data, extent, crs = load_source(file_path, read_raster)
+            self.ui.raster_data = self.compact_raster((data, extent))
+            self.ui.raster_crs = parse_crs(crs)
+            self.ui.source_paths["raster"] = file_path
             self.ui.status_bar.showMessage(f"Raster loaded successfully: {file_path}")
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error loading raster: {e}")
         finally:
             self.ui.hide_loading()
 
+    def compact_raster(self, raster):
+        data, extent = raster
+        return compact_raster(data, self.ui.grid_precision.currentText()), extent
+
+    def set_grid_precision(self, *_):
+        """Apply the Grid Precision setting to the NetCDF block cache and the loaded raster."""
+        precision = self.ui.grid_precision.currentText()
+        text = self.ui.precision_tolerance.text().strip()
+        try:
+            tolerance = float(text) if text else None
+        except ValueError:
+            self.ui.status_bar.showMessage(f"Enter the largest acceptable int16 error as a number, not '{text}'.")
+            return
+        self.ui.dataset_manager.set_precision(precision, tolerance)
+        if not isinstance(self.ui.__dict__.get("raster_data"), LazySource) and self.ui.raster_data is not None:
+            self.ui.raster_data = self.compact_raster(self.ui.raster_data)
+        self.ui.status_bar.showMessage(f"Grids are kept as {precision.lower()}.")
+
     def load_shapefile(self):
         filename, _ = QFileDialog.getOpenFileName(self.ui, "Open Shapefile", "", "Shapefiles (*.shp)")
         if filename:
@@ -62,11 +121,12 @@ class DataProcessor:
     def process_xy_with_loading(self, filename):
         try:
             # Read the CSV file
-            df = pd.read_csv(filename)
+            df = load_source(filename, pd.read_csv)
 
             # Ensure 'North' and 'East' columns exist
             if {"North", "East"}.issubset(df.columns):
                 self.ui.xy_data = df  # Store in UI for later use
+                self.ui.source_paths["xy"] = filename
                 
                 # Check for a third column (excluding 'North' and 'East')
                 extra_cols = [col for col in df.columns if col not in {"North", "East"}]
@@ -85,8 +145,9 @@ class DataProcessor:
     def process_shapefile_with_loading(self, filename):
         try:
             # Reading shapefile directly, no file locking by default
-            gdf = gpd.read_file(filename)
+            gdf = load_source(filename, gpd.read_file)
             self.ui.shapefile_data = gdf
+            self.ui.source_paths["shapefile"] = filename
             self.ui.status_bar.showMessage(f"Shapefile loaded successfully: {filename}")
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error loading shapefile: {e}")
@@ -98,40 +159,694 @@ class DataProcessor:
         if filename:
             self.ui.show_loading("Loading NetCDF file...")
             self.ui.status_bar.showMessage(f"Loading NetCDF File: {filename}")
-            self.ui.netcdf_file_label.setText(f"Loaded: {filename.split('/')[-1]}")  # Update label
             QTimer.singleShot(100, lambda: self.process_netcdf_with_loading(filename))
 
+    @traced("app:open dataset")
     def process_netcdf_with_loading(self, filename):
         try:
-            with xr.open_dataset(filename) as ds:
-                # Fully load into memory and detach from file
-                loaded_ds = ds.load()
+            # Opened lazily and kept in the dataset manager, so switching back is instant
+            self.ui.dataset_manager.open(filename)
+            self.apply_netcdf_subset(filename)
+            self.refresh_dataset_selector(filename)
+            self.activate_netcdf_dataset(filename)
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error loading NetCDF file: {e}")
+        finally:
+            self.ui.hide_loading()
 
-            self.ui.netcdf_dataset = loaded_ds  # Now it's memory-only, file can be closed
-            self.ui.netcdf_path = filename  
-            
-            numeric_vars = [
-                var for var in loaded_ds.data_vars 
-                if loaded_ds[var].ndim in [2, 3] 
-                and np.issubdtype(loaded_ds[var].dtype, np.number)
+    def refresh_dataset_selector(self, active):
+        self.ui.netcdf_dataset_selector.blockSignals(True)
+        self.ui.netcdf_dataset_selector.clear()
+        for path in self.ui.dataset_manager.paths:
+            self.ui.netcdf_dataset_selector.addItem(os.path.basename(path), path)
+        self.ui.netcdf_dataset_selector.setCurrentIndex(
+            self.ui.netcdf_dataset_selector.findData(os.path.abspath(active))
+        )
+        self.ui.netcdf_dataset_selector.blockSignals(False)
+        self.ui.netcdf_dataset_selector.setEnabled(True)
+        self.ui.close_netcdf_button.setEnabled(True)
+        self.ui.optimise_layout_button.setEnabled(True)
+
+    def browse_catalog(self):
+        if not hasattr(self.ui, "catalog_dialog"):
+            create_catalog_dialog(self.ui)
+        self.refresh_catalog()
+        self.ui.catalog_dialog.show()
+        self.ui.catalog_dialog.raise_()
+
+    def scan_catalog_folder(self):
+        folder = QFileDialog.getExistingDirectory(self.ui, "Select DRYP Output Folder")
+        if folder:
+            self.scan_catalog([folder])
+
+    def rescan_catalog(self):
+        self.scan_catalog(self.ui.catalog.roots())
+
+    def scan_catalog(self, folders):
+        """Index the folders (metadata only; unchanged files are skipped) and refresh the table."""
+        def progress(done, total):
+            self.ui.catalog_status.setText(f"Scanning {done}/{total} files...")
+            QApplication.processEvents()
+
+        try:
+            totals = [0, 0, 0]
+            for folder in folders:
+                for i, count in enumerate(self.ui.catalog.scan(folder, progress)):
+                    totals[i] += count
+            self.ui.catalog_status.setText(
+                f"{totals[0]} indexed, {totals[1]} unchanged, {totals[2]} removed"
+            )
+        except Exception as e:
+            self.ui.catalog_status.setText(f"Error scanning catalog: {e}")
+        self.refresh_catalog()
+
+    def refresh_catalog(self):
+        entries = self.ui.catalog.search(self.ui.catalog_filter.text().strip() or None)
+        self.catalog_entries = entries
+        table = self.ui.catalog_table
+        table.setRowCount(len(entries))
+        for row, entry in enumerate(entries):
+            extent = [entry[key] for key in ("xmin", "ymin", "xmax", "ymax")]
+            cells = [
+                entry["path"],
+                ", ".join(entry["variables"]),
+                (entry["time_start"] or "")[:10],
+                (entry["time_end"] or "")[:10],
+                "" if entry["n_time"] is None else str(entry["n_time"]),
+                ", ".join(f"{v:g}" for v in extent) if None not in extent else "",
             ]
+            for column, text in enumerate(cells):
+                table.setItem(row, column, QTableWidgetItem(text))
+        table.resizeColumnsToContents()
+
+    def open_catalog_entry(self, row):
+        if row < 0 or row >= len(self.catalog_entries):
+            return
+        path = self.catalog_entries[row]["path"]
+        if not os.path.exists(path):
+            self.ui.catalog_status.setText(f"File no longer exists: {path}. Rescan to update the catalog.")
+            return
+        self.ui.show_loading("Loading NetCDF file...")
+        QTimer.singleShot(100, lambda: self.process_netcdf_with_loading(path))
+
+    def switch_netcdf_dataset(self, index):
+        path = self.ui.netcdf_dataset_selector.itemData(index)
+        if not path:
+            return
+        try:
+            self.activate_netcdf_dataset(path)
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error switching NetCDF dataset: {e}")
+
+    def close_netcdf_dataset(self):
+        index = self.ui.netcdf_dataset_selector.currentIndex()
+        path = self.ui.netcdf_dataset_selector.itemData(index)
+        if not path:
+            return
+        self.ui.dataset_manager.close(path)
+        self.ui.netcdf_dataset_selector.removeItem(index)  # Triggers a switch to the next dataset
+        if self.ui.netcdf_dataset_selector.count() == 0:
+            self.ui.netcdf_dataset = None
+            self.ui.netcdf_path = None
+            self.ui.netcdf_file_label.setText("No file loaded")
+            self.ui.netcdf_var_selector.clear()
+            self.ui.netcdf_var_selector.setEnabled(False)
+            self.refresh_extraction_variables([])
+            self.ui.netcdf_dataset_selector.setEnabled(False)
+            self.ui.close_netcdf_button.setEnabled(False)
+            self.ui.optimise_layout_button.setEnabled(False)
+            self.ui.plot_netcdf_button.setEnabled(False)
+        self.ui.status_bar.showMessage(f"Closed NetCDF dataset: {os.path.basename(path)}")
+
+    def optimise_netcdf_layout(self):
+        path = self.ui.netcdf_path
+        if not path:
+            self.ui.status_bar.showMessage("No NetCDF dataset loaded.")
+            return
+        if self.ui.dataset_manager.register_layouts(path):
+            self.ui.status_bar.showMessage(f"Layout already optimised for {os.path.basename(path)}")
+            return
+        self.ui.show_loading("Re-chunking NetCDF dataset...")
+        QTimer.singleShot(100, lambda: self.process_layout_with_loading(path))
+
+    def process_layout_with_loading(self, path):
+        def progress(fraction):
+            self.ui.status_bar.showMessage(f"Re-chunking {os.path.basename(path)}: {fraction:.0%}")
+            QApplication.processEvents()
+
+        try:
+            # Copies being rewritten must not be open or routed to meanwhile
+            self.ui.dataset_manager.unregister_layouts(path)
+            stores = rechunk_dataset(path, progress=progress)
+            self.ui.dataset_manager.register_layouts(path)
+            location = os.path.dirname(next(iter(stores.values())))
+            self.ui.status_bar.showMessage(f"Optimised layout written to {location}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error optimising NetCDF layout: {e}")
+        finally:
+            self.ui.hide_loading()
+
+    def define_derived_variable(self):
+        """Parse 'name = expression [units]' from the UI and add it to the variable list."""
+        text = self.ui.derived_expression_input.text().strip()
+        if "=" not in text:
+            self.ui.status_bar.showMessage("Enter a derived variable as 'name = expression', e.g. dch = rch - rp.fch")
+            return
+        name, expression = (part.strip() for part in text.split("=", 1))
+        units = None
+        if expression.endswith("]") and "[" in expression:
+            expression, units = expression[:-1].rsplit("[", 1)
+            expression, units = expression.strip(), units.strip()
 
-            if numeric_vars:
-                self.ui.netcdf_var_selector.clear()
-                self.ui.netcdf_var_selector.addItems(numeric_vars)
-                self.ui.netcdf_var_selector.setEnabled(True)
-                self.ui.plot_netcdf_button.setEnabled(True)
-                self.ui.status_bar.showMessage(f"NetCDF loaded successfully: {filename}")
+        previous = self.ui.derived_variables.definitions.get(name)
+        try:
+            self.ui.derived_variables.define(name, expression, units)
+            if self.ui.netcdf_path:
+                # Opening checks the referenced files and grids without reading any data
+                self.ui.derived_variables.open(self.ui.netcdf_path, name)
+                self.activate_netcdf_dataset(self.ui.netcdf_path)
+                self.ui.netcdf_var_selector.setCurrentText(name)
+            self.ui.status_bar.showMessage(f"Derived variable defined: {name} = {expression}")
+        except Exception as e:
+            # A failed redefinition keeps the builtin or earlier working definition
+            if previous is None:
+                self.ui.derived_variables.remove(name)
+            else:
+                self.ui.derived_variables.definitions[name] = previous
+            self.ui.status_bar.showMessage(f"Error defining derived variable: {e}")
+
+    def subset_bbox(self, grid_crs=None):
+        """(xmin, ymin, xmax, ymax) in the grid's CRS for the selected subset source, or None for the full domain."""
+        source = self.ui.subset_source.currentText()
+        if source == "Shapefile extent":
+            if self.ui.shapefile_data is None or self.ui.shapefile_data.empty:
+                raise ValueError("Load a shapefile to subset by its extent.")
+            # Every vertex is reprojected, so the box bounds the polygons on the grid
+            return tuple(reproject_gdf(self.ui.shapefile_data, grid_crs).total_bounds)
+        if source == "Points extent":
+            points = self.ui.points_csv_data
+            if points is None or points.empty:
+                raise ValueError("Load a points CSV to subset by its extent.")
+            # XY tables carry no CRS; as in point extraction, East/North are grid coordinates
+            return points["East"].min(), points["North"].min(), points["East"].max(), points["North"].max()
+        if source == "Manual box":
+            values = [float(v) for v in self.ui.subset_bbox.text().replace(";", ",").split(",") if v.strip()]
+            if len(values) != 4:
+                raise ValueError("Enter the box as 'xmin, ymin, xmax, ymax'.")
+            return tuple(values)
+        return None
+
+    def apply_netcdf_subset(self, path):
+        """Restrict a dataset (and its *rp.nc companion) to the chosen box and time range."""
+        manager = self.ui.dataset_manager
+        dataset = manager.get(path)
+        indexers = subset_indexers(
+            dataset, self.subset_bbox(dataset_crs(dataset)),
+            self.ui.subset_start.text().strip() or None,
+            self.ui.subset_end.text().strip() or None,
+        )
+        for target in (path, companion_path(path)):
+            if target == path or os.path.exists(target):
+                manager.set_subset(target, indexers)
+        return indexers
+
+    def apply_subset_to_active(self):
+        path = self.ui.netcdf_path
+        if not path:
+            self.ui.status_bar.showMessage("No NetCDF dataset loaded.")
+            return
+        try:
+            indexers = self.apply_netcdf_subset(path)
+            self.activate_netcdf_dataset(path)
+            if indexers:
+                sizes = ", ".join(f"{dim} {w.stop - w.start}" for dim, w in indexers.items())
+                self.ui.status_bar.showMessage(f"Subset applied to {os.path.basename(path)}: {sizes}")
             else:
-                self.ui.status_bar.showMessage("No plottable numeric data found in NetCDF file.")
-                self.ui.plot_netcdf_button.setEnabled(False)
+                self.ui.status_bar.showMessage(f"Using the full domain of {os.path.basename(path)}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error applying subset: {e}")
+
+    def activate_netcdf_dataset(self, filename):
+        """Make an open dataset the active one and refresh the variable selector."""
+        dataset = self.ui.dataset_manager.get(filename)
+        self.ui.netcdf_dataset = dataset
+        self.ui.netcdf_path = os.path.abspath(filename)
+        self.ui.netcdf_file_label.setText(f"Loaded: {os.path.basename(filename)}")
+
+        previous_var = self.ui.netcdf_var_selector.currentText()
+        numeric_vars = self.ui.dataset_manager.numeric_variables(dataset)
+        numeric_vars += [
+            name for name in self.ui.derived_variables.available(self.ui.netcdf_path)
+            if name not in numeric_vars
+        ]
+
+        if numeric_vars:
+            self.ui.netcdf_var_selector.clear()
+            self.ui.netcdf_var_selector.addItems(numeric_vars)
+            self.refresh_extraction_variables(numeric_vars)
+            if previous_var in numeric_vars:
+                # Keep the same variable selected when comparing runs
+                self.ui.netcdf_var_selector.setCurrentText(previous_var)
+            self.ui.netcdf_var_selector.setEnabled(True)
+            self.ui.plot_netcdf_button.setEnabled(True)
+            # Current variable first, then previews for the rest of the list
+            current = self.ui.netcdf_var_selector.currentText()
+            self.queue_thumbnails([current] + [name for name in numeric_vars if name != current])
+            self.ui.status_bar.showMessage(f"NetCDF loaded successfully: {filename}")
+        else:
+            self.ui.status_bar.showMessage("No plottable numeric data found in NetCDF file.")
+            self.ui.plot_netcdf_button.setEnabled(False)
+
+
 
+    def show_thumbnails(self, var_name):
+        """Show the cached previews of a variable; missing ones are rendered in the background."""
+        for caption, image in self.ui.thumbnail_labels:
+            caption.clear()
+            image.clear()
+        if not var_name or not self.ui.netcdf_path:
+            return
+        try:
+            paths = thumbnail_paths(self.ui.derived_variables, self.ui.netcdf_path, var_name)
+        except Exception:
+            return  # e.g. a derived variable whose sources are missing
+
+        missing = False
+        for (caption, image), (view, png) in zip(self.ui.thumbnail_labels, paths.items()):
+            caption.setText(view)
+            if os.path.exists(png):
+                image.setPixmap(QPixmap(png).scaled(
+                    THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio
+                ))
+            else:
+                image.setText("...")
+                missing = True
+        if missing:
+            self.queue_thumbnails([var_name])
+
+    def queue_thumbnails(self, var_names):
+        """Render previews of the active dataset's variables in a background process."""
+        if self.thumbnail_pool is None:
+            # Spawned rather than forked, so workers don't inherit Qt state or open HDF5 handles
+            self.thumbnail_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        path = self.ui.netcdf_path
+        spec = self.ui.derived_variables.spec()
+        queued = set(self.thumbnail_jobs.values())
+        for var_name in var_names:
+            if (path, var_name) not in queued:
+                future = self.thumbnail_pool.submit(render_thumbnails, path, var_name, spec)
+                self.thumbnail_jobs[future] = (path, var_name)
+        if not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start(250)
+
+    def poll_thumbnails(self):
+        for future in [future for future in self.thumbnail_jobs if future.done()]:
+            path, var_name = self.thumbnail_jobs.pop(future)
+            if path != self.ui.netcdf_path or var_name != self.ui.netcdf_var_selector.currentText():
+                continue
+            if future.exception() is None:
+                self.show_thumbnails(var_name)
+            else:
+                for caption, image in self.ui.thumbnail_labels:
+                    image.clear()
+                self.ui.status_bar.showMessage(f"Could not render previews of {var_name}: {future.exception()}")
+        self.poll_sketches()
+        if not self.thumbnail_jobs and not self.sketch_jobs:
+            self.thumbnail_timer.stop()
+
+    def queue_sketch(self, var_name):
+        """Scan a variable for its statistics sketch in a background process."""
+        path = self.ui.netcdf_path
+        if (path, var_name) in self.sketch_jobs.values():
+            return
+        if self.sketch_pool is None:
+            self.sketch_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        future = self.sketch_pool.submit(sketch_variable, path, var_name, self.ui.derived_variables.spec())
+        self.sketch_jobs[future] = (path, var_name)
+        if not self.thumbnail_timer.isActive():
+            self.thumbnail_timer.start(250)
+
+    def poll_sketches(self):
+        for future in [future for future in self.sketch_jobs if future.done()]:
+            path, var_name = self.sketch_jobs.pop(future)
+            if path != self.ui.netcdf_path:
+                continue
+            if future.exception() is not None:
+                self.ui.status_bar.showMessage(f"Could not scan {var_name} for colour limits: {future.exception()}")
+                continue
+            # The worker wrote the sketch to the stats cache; the plot and summary read it from there
+            self.ui.plotter.apply_colour_limits(path, var_name)
+            if var_name == self.ui.netcdf_var_selector.currentText():
+                self.show_variable_summary(var_name)
+
+    def show_variable_summary(self, var_name):
+        """Show the cached whole-variable statistics, if that variable has been scanned."""
+        self.ui.variable_summary_label.clear()
+        if not var_name or not self.ui.netcdf_path:
+            return
+        try:
+            sketch = cached_sketch(self.ui.derived_variables, self.ui.netcdf_path, var_name)
+        except Exception:
+            return
+        if sketch is None:
+            self.ui.variable_summary_label.setText("Not summarised yet.")
+            return
+        summary = sketch.summary()
+        if summary["count"] == 0:
+            self.ui.variable_summary_label.setText(f"No valid values ({summary['missing']} missing).")
+            return
+        self.ui.variable_summary_label.setText(
+            "min {min:.4g} | max {max:.4g} | mean {mean:.4g} | std {std:.4g} | "
+            "p2 {p2:.4g} | median {median:.4g} | p98 {p98:.4g} | "
+            "{count} values, {missing} missing".format(**summary)
+        )
+
+    def summarise_variable(self):
+        var_name = self.ui.netcdf_var_selector.currentText()
+        if not self.ui.netcdf_path or not var_name:
+            self.ui.status_bar.showMessage("Load a NetCDF file and select a variable first.")
+            return
+        self.ui.show_loading(f"Summarising {var_name}...")
+        QTimer.singleShot(100, lambda: self.process_variable_summary_with_loading(var_name))
+
+    def process_variable_summary_with_loading(self, var_name):
+        def progress(fraction):
+            self.ui.status_bar.showMessage(f"Summarising {var_name}: {fraction:.0%}")
+            QApplication.processEvents()
+
+        try:
+            variable_sketch(self.ui.derived_variables, self.ui.netcdf_path, var_name, progress)
+            self.show_variable_summary(var_name)
+            self.ui.status_bar.showMessage(f"Summarised {var_name}")
         except Exception as e:
-            self.ui.status_bar.showMessage(f"Error loading NetCDF file: {e}")
+            self.ui.status_bar.showMessage(f"Error summarising {var_name}: {e}")
         finally:
             self.ui.hide_loading()
 
+    def compute_summary_map(self):
+        var_name = self.ui.netcdf_var_selector.currentText()
+        if not self.ui.netcdf_path or not var_name:
+            self.ui.status_bar.showMessage("Load a NetCDF file and select a variable first.")
+            return
+        statistic = self.ui.summary_statistic.currentText()
+        self.ui.show_loading(f"Computing {statistic.lower()} map of {var_name}...")
+        QTimer.singleShot(100, lambda: self.process_summary_map_with_loading(var_name, statistic))
+
+    @traced("app:summary map")
+    def process_summary_map_with_loading(self, var_name, statistic):
+        try:
+            variable = self.ui.derived_variables.open(self.ui.netcdf_path, var_name)
+            if variable.ndim != 3:
+                self.ui.status_bar.showMessage(f"{var_name} has no time axis to summarise.")
+                return
+
+            parameter = self.ui.summary_parameter.text().strip()
+            value = float(parameter) if parameter else None
+            data, lat, lon, (first, stop) = compute_cell_statistic(
+                self.ui.netcdf_path, var_name, self.ui.derived_variables.spec(), statistic,
+                start=self.ui.summary_start.text().strip() or None,
+                end=self.ui.summary_end.text().strip() or None,
+                threshold=value, percentile=value,
+                workers=self.ui.summary_workers.value(),
+            )
+            data, extent = north_up(data, lat, lon)
+            label = f"{statistic} {value:g}" if value is not None else statistic
+            title = f"{label} of {var_name} ({stop - first} time steps)"
+            self.ui.summary_map = (data, extent, title)
+
+            # The map becomes the raster layer, so it can be overlaid like a loaded raster
+            self.ui.raster_data = (data, extent)
+            self.ui.raster_crs = dataset_crs(self.ui.dataset_manager.get(self.ui.netcdf_path))
+            self.ui.raster_file_label.setText(f"Summary: {label} of {var_name}")
+            self.ui.raster_checkbox.setEnabled(True)
+            self.ui.final_plot_button.setEnabled(True)
+            self.ui.export_summary_button.setEnabled(True)
 
+            self.ui.plotter.plot_summary_map()
+            self.ui.status_bar.showMessage(f"Computed {title}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error computing summary map: {e}")
+        finally:
+            self.ui.hide_loading()
+
+    def export_summary_map(self):
+        if self.ui.summary_map is None:
+            self.ui.status_bar.showMessage("Compute a summary map first.")
+            return
+        out_path, _ = QFileDialog.getSaveFileName(self.ui, "Export Summary Map", "", "ASCII Files (*.asc)")
+        if not out_path:
+            return
+        try:
+            data, extent, _ = self.ui.summary_map
+            write_ascii_grid(out_path, data, extent)
+            self.ui.status_bar.showMessage(f"Summary map saved to: {out_path}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error exporting summary map: {e}")
+
+    def batch_render_maps(self):
+        if not self.ui.netcdf_path:
+            self.ui.status_bar.showMessage("Load a NetCDF file first.")
+            return
+        folder = QFileDialog.getExistingDirectory(self.ui, "Folder for the Rendered Maps")
+        if not folder:
+            return
+        variables = self.extraction_variables()
+        paths = self.ui.source_paths
+        derived = self.ui.derived_variables.spec()
+        spec = dict(
+            DEFAULT_SPEC,
+            netcdf=self.ui.netcdf_path,
+            variables=variables,
+            derived=dict(derived, subsets=encode_subsets(derived["subsets"])),
+            start=self.ui.batch_start.text().strip() or None,
+            end=self.ui.batch_end.text().strip() or None,
+            every=self.ui.batch_every.value(),
+            shapefile=paths.get("shapefile") if self.ui.shapefile_checkbox.isChecked() else None,
+            xy=paths.get("xy") if self.ui.xy_checkbox.isChecked() else None,
+            xy_labels=self.ui.xy_labels if self.ui.xy_checkbox.isChecked() else None,
+            display_crs=self.ui.display_crs_input.text().strip(),
+            output=folder,
+            workers=self.ui.batch_workers.value(),
+        )
+        try:
+            # Saved with the maps, so the same frames can be re-rendered headless
+            spec_path = os.path.join(folder, SPEC_NAME)
+            write_spec(spec_path, spec)
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error writing render spec: {e}")
+            return
+        job_id = self.ui.job_queue.submit("render", f"Maps of {', '.join(variables)}", spec)
+        self.ui.status_bar.showMessage(
+            f"Map rendering queued as job {job_id}; headless: python main.py --render-maps {spec_path}"
+        )
+
+    def regrid_variable(self):
+        var_name = self.ui.netcdf_var_selector.currentText()
+        if not self.ui.netcdf_path or not var_name:
+            self.ui.status_bar.showMessage("Load a NetCDF file and select a variable first.")
+            return
+        try:
+            if self.ui.regrid_target.currentText() == "Resolution":
+                resolution = float(self.ui.regrid_resolution.text())
+                if resolution <= 0:
+                    raise ValueError
+                target = (resolution, parse_crs(self.ui.regrid_crs.text()))
+            else:
+                target, _ = QFileDialog.getOpenFileName(self.ui, "NetCDF File with the Target Grid", "",
+                                                        "NetCDF Files (*.nc)")
+                if not target:
+                    return
+        except ValueError:
+            self.ui.status_bar.showMessage("Enter a positive cell size for the target grid.")
+            return
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error reading target CRS: {e}")
+            return
+        out_path, _ = QFileDialog.getSaveFileName(self.ui, "Save Regridded Variable", f"{var_name}_regridded.nc",
+                                                  "NetCDF Files (*.nc)")
+        if not out_path:
+            return
+        method = self.ui.regrid_method.currentText()
+        self.ui.show_loading(f"Regridding {var_name} ({method.lower()})...")
+        QTimer.singleShot(100, lambda: self.regrid_with_loading(var_name, method, target, out_path))
+
+    @traced("app:regrid")
+    def regrid_with_loading(self, var_name, method, target, out_path):
+        def progress(fraction):
+            self.ui.status_bar.showMessage(f"Regridding {var_name}: {fraction:.0%}")
+            QApplication.processEvents()
+
+        try:
+            variable = self.ui.derived_variables.open(self.ui.netcdf_path, var_name)
+            if variable.ndim != 3:
+                self.ui.status_bar.showMessage(f"{var_name} is not a (time, lat, lon) variable.")
+                return
+            src_crs = dataset_crs(self.ui.dataset_manager.get(self.ui.netcdf_path))
+            src_x, src_y = variable["lon"].values, variable["lat"].values
+            if isinstance(target, str):
+                # The target file is only read for its coordinates, not added to the open datasets
+                grid = self.ui.dataset_manager.get(target)
+                dst_x, dst_y = grid_coordinates(grid)
+                dst_crs = dataset_crs(grid)
+            else:
+                resolution, dst_crs = target
+                dst_crs = dst_crs or src_crs
+                dst_x, dst_y = target_grid(grid_bounds(src_x, src_y, src_crs, dst_crs), resolution)
+            weights = regrid_weights(method, src_x, src_y, dst_x, dst_y, src_crs, dst_crs)
+            write_regridded(variable, weights, out_path, var_name, dst_x, dst_y, dst_crs, progress=progress)
+            self.ui.status_bar.showMessage(
+                f"Regridded {var_name} onto {len(dst_y)} x {len(dst_x)} cells: {out_path}"
+            )
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error regridding {var_name}: {e}")
+        finally:
+            self.ui.hide_loading()
+
+    def save_session(self):
+        filename, _ = QFileDialog.getSaveFileName(self.ui, "Save Session", "", SESSION_FILTER)
+        if not filename:
+            return
+        if not filename.endswith(".cuwalid.json"):
+            filename += ".cuwalid.json"
+        try:
+            write_session(filename, self.session_state())
+            self.ui.status_bar.showMessage(f"Session saved: {filename}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error saving session: {e}")
+
+    def session_state(self):
+        """Loaded files, selections and view extents; the data itself stays in the source caches."""
+        manager = self.ui.dataset_manager
+        spec = self.ui.derived_variables.spec()
+        return {
+            "sources": {
+                key: {"path": path, "cache": source_cache_path(path)}
+                for key, path in self.ui.source_paths.items()
+            },
+            "raster_crs": self.ui.raster_crs.to_wkt() if self.ui.raster_crs is not None else None,
+            "xy_labels": getattr(self.ui, "xy_labels", None),
+            "json_input": self.json_input,
+            "netcdf": {
+                "paths": list(manager.paths),
+                "active": self.ui.netcdf_path,
+                "variable": self.ui.netcdf_var_selector.currentText(),
+                "layouts": {path: manager.layouts.get(path, {}) for path in manager.paths},
+                "subsets": encode_subsets(manager.subsets),
+            },
+            "derived": {"definitions": spec["definitions"], "aliases": spec["aliases"]},
+            "widgets": {name: widget_state(getattr(self.ui, name)) for name in SESSION_WIDGETS},
+            "views": {"limits": self.ui.plot_workspace.limits()},
+            "tabs": {"main": self.ui.tabs.currentIndex(), "toolbox": self.ui.visual_toolbox.currentIndex()},
+        }
+
+    def open_session(self):
+        filename, _ = QFileDialog.getOpenFileName(self.ui, "Open Session", "", SESSION_FILTER)
+        if filename:
+            self.ui.show_loading("Restoring session...")
+            QTimer.singleShot(100, lambda: self.restore_session_with_loading(filename))
+
+    def restore_session_with_loading(self, filename):
+        try:
+            missing = self.restore_session(read_session(filename))
+            message = f"Session restored: {filename}"
+            if missing:
+                message += f" (missing files skipped: {', '.join(missing)})"
+            self.ui.status_bar.showMessage(message)
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error restoring session: {e}")
+            print(traceback.format_exc())
+        finally:
+            self.ui.hide_loading()
+
+    def restore_session(self, state):
+        """Restore a saved session without reading any data.
+
+        Sources become LazySources, read (from their binary cache while the files are
+        unchanged) the first time a plot or extraction uses them; NetCDF datasets are
+        opened for metadata only, and saved view extents apply when a view is drawn.
+        """
+        missing = []
+        self.ui.source_paths = {}
+        labels = {
+            "raster": (self.ui.raster_file_label, self.ui.raster_checkbox),
+            "shapefile": (self.ui.shapefile_file_label, self.ui.shapefile_checkbox),
+            "xy": (self.ui.xy_file_label, self.ui.xy_checkbox),
+            "csv_1": (self.ui.csv_file_label_1, None),
+            "csv_2": (self.ui.csv_file_label_2, None),
+            "points": (None, None),
+        }
+        for key, source in state["sources"].items():
+            attribute, read = SOURCES[key]
+            if not os.path.exists(source["path"]):
+                missing.append(os.path.basename(source["path"]))
+                continue
+            if key == "raster":
+                # Read after the precision widgets below are restored, so it loads compacted
+                read = lambda path, read=read: self.compact_raster(read(path))
+            setattr(self.ui, attribute, LazySource(source["path"], read))
+            self.ui.source_paths[key] = source["path"]
+            label, checkbox = labels[key]
+            if key.startswith("csv"):
+                label.setText(os.path.basename(source["path"]))
+            elif label is not None:
+                label.setText(f"Loaded: {os.path.basename(source['path'])}")
+                checkbox.setEnabled(True)
+                self.ui.final_plot_button.setEnabled(True)
+        self.ui.raster_crs = parse_crs(state.get("raster_crs"))
+        self.ui.xy_labels = state.get("xy_labels")
+        self.json_input = state.get("json_input")
+
+        for name, value in state["widgets"].items():
+            if name in SESSION_WIDGETS and value is not None:
+                set_widget_state(getattr(self.ui, name), value)
+        # Widgets are restored with signals blocked, so apply what their handlers would have done
+        self.set_grid_precision()
+        self.ui.job_queue.max_running = self.ui.job_concurrency.value()
+        resolution = self.ui.regrid_target.currentText() == "Resolution"
+        self.ui.regrid_resolution.setEnabled(resolution)
+        self.ui.regrid_crs.setEnabled(resolution)
+        self.ui.subset_bbox.setEnabled(self.ui.subset_source.currentText() == "Manual box")
+        self.ui.upload_shapefile_button.setEnabled(self.ui.region_source.currentText() == "Shapefile polygons")
+        if "points" in self.ui.source_paths and "point_selector_list" in state["widgets"]:
+            # Attribute queries read the points table only when one is run
+            self.ui.point_selector_list.set_state(
+                state["widgets"]["point_selector_list"], frame_source=lambda: self.ui.points_csv_data
+            )
+        for key, number in (("csv_1", "1"), ("csv_2", "2")):
+            loaded = key in self.ui.source_paths
+            getattr(self.ui, f"csv_var_selector_{number}").setEnabled(loaded)
+            getattr(self.ui, f"y_axis_label_{number}").setEnabled(loaded)
+            getattr(self.ui, f"select_all_csv{number}_checkbox").setEnabled(loaded)
+        self.ui.plot_csv_button.setEnabled("csv_1" in self.ui.source_paths or "csv_2" in self.ui.source_paths)
+        self.ui.score_skill_button.setEnabled("csv_1" in self.ui.source_paths and "csv_2" in self.ui.source_paths)
+        self.ui.select_all_points_checkbox.setEnabled("points" in self.ui.source_paths)
+
+        registry = self.ui.derived_variables
+        for alias, path in state["derived"]["aliases"].items():
+            registry.add_alias(alias, path)
+        for name, (expression, units) in state["derived"]["definitions"].items():
+            registry.define(name, expression, units)
+
+        netcdf = state["netcdf"]
+        manager = self.ui.dataset_manager
+        for path in netcdf["paths"]:
+            if os.path.exists(path):
+                manager.open(path)  # Metadata only; re-chunked copies are picked up again here
+            else:
+                missing.append(os.path.basename(path))
+        for path, indexers in decode_subsets(netcdf["subsets"]).items():
+            manager.set_subset(path, indexers)
+        active = netcdf["active"] if netcdf["active"] in manager.paths else next(iter(manager.paths), None)
+        if active:
+            self.refresh_dataset_selector(active)
+            self.activate_netcdf_dataset(active)
+            if self.ui.netcdf_var_selector.findText(netcdf["variable"]) >= 0:
+                self.ui.netcdf_var_selector.setCurrentText(netcdf["variable"])
+
+        self.ui.plot_workspace.restore_limits(state["views"]["limits"])
+        self.ui.tabs.setCurrentIndex(state["tabs"]["main"])
+        self.ui.visual_toolbox.setCurrentIndex(state["tabs"]["toolbox"])
+        return missing
 
     def load_json(self):
         filename, _ = QFileDialog.getOpenFileName(self.ui, "Open Model Input JSON", "", "JSON Files (*.json)")
@@ -145,34 +860,154 @@ class DataProcessor:
         self.ui.status_bar.showMessage(f"JSON file loaded successfully: {filename}")
         self.ui.hide_loading()
 
+    def preflight_inputs(self):
+        """Run the pre-flight check of the loaded JSON and print its report; True if the run may start."""
+        report = preflight(self.json_input)
+        self.ui.model_output.append(report.text())
+        if report.ok:
+            self.ui.status_bar.showMessage(f"Inputs checked: {len(report.files)} files, no problems found")
+        else:
+            self.ui.status_bar.showMessage(f"Input check found {len(report.errors)} problem(s); "
+                                           f"see the Model tab output")
+        return report.ok
+
+    def check_model_inputs(self):
+        if not self.json_input:
+            self.ui.status_bar.showMessage("Choose an input file first")
+            return
+        self.ui.show_loading("Checking model inputs...")
+        QTimer.singleShot(100, self.check_model_inputs_with_loading)
+
+    @traced("app:check model inputs")
+    def check_model_inputs_with_loading(self):
+        try:
+            self.preflight_inputs()
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error checking inputs: {e}")
+        finally:
+            self.ui.hide_loading()
+
     def run_model(self):
         if self.json_input:
-            self.ui.show_loading("Running model...")
-            self.ui.status_bar.showMessage("Running model simulation...")
+            self.ui.show_loading("Checking model inputs...")
+            QTimer.singleShot(100, self.run_model_with_loading)
+        else:
+            self.ui.status_bar.showMessage("Choose an input file first")
+
+    def run_model_with_loading(self):
+        try:
+            ready = self.preflight_inputs()
+        except Exception as e:
+            ready = False
+            self.ui.status_bar.showMessage(f"Error checking inputs: {e}")
+        if not ready:
+            self.ui.hide_loading()
+            return
+        self.ui.show_loading("Running model...")
+        self.ui.status_bar.showMessage("Running model simulation...")
 
-            # Create the logger (only one instance)
-            self.logger = QTextEditLogger(self.ui.model_output)
+        # Create the logger (only one instance)
+        self.logger = QTextEditLogger(self.ui.model_output)
 
-            # Create and start the model thread, passing the logger
-            self.model_thread = ModelRunnerThread(self.json_input)
-            self.model_thread.output_signal.connect(self.logger.log)  # Log progress and other output
-            self.model_thread.error_signal.connect(self.logger.log)  # Log errors as well
-            self.model_thread.finished.connect(self.finish_model_run)
-            self.model_thread.start()  # Start the model thread
+        # Create and start the model thread, passing the logger
+        self.model_thread = ModelRunnerThread(self.json_input)
+        self.model_thread.output_signal.connect(self.logger.log)  # Log progress and other output
+        self.model_thread.error_signal.connect(self.logger.log)  # Log errors as well
+        self.model_thread.finished.connect(self.finish_model_run)
+        self.model_thread.start()  # Start the model thread
 
-        else:
+    def queue_model_run(self):
+        if not self.json_input:
             self.ui.status_bar.showMessage("Choose an input file first")
+            return
+        try:
+            if not self.preflight_inputs():
+                return
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error checking inputs: {e}")
+            return
+        job_id = self.ui.job_queue.submit("model", f"DRYP run: {os.path.basename(self.json_input)}",
+                                          {"json_path": self.json_input})
+        self.ui.status_bar.showMessage(f"Model run queued as job {job_id}; see the Jobs tab.")
+
+    def refresh_jobs(self):
+        jobs = self.ui.job_queue.store.jobs()
+        self.job_rows = [job["id"] for job in jobs]
+        table = self.ui.job_table
+        table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            progress = f"{job['done']}/{job['total']} ({100 * job['done'] // job['total']}%)" if job["total"] else ""
+            eta = format_eta(self.ui.job_queue.eta(job)) if job["state"] == "running" else ""
+            cells = [f"#{job['id']} {job['title']}", str(job["priority"]), job["state"], progress, eta, job["message"]]
+            for column, text in enumerate(cells):
+                item = table.item(row, column)
+                if item is None:
+                    table.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+
+    def toggle_tracing(self, enabled):
+        if enabled:
+            tracer.start()
+            self.ui.trace_status_label.setText("Recording (new worker processes record too)")
+        else:
+            tracer.stop()
+            self.ui.trace_status_label.setText("Not recording")
+        self.refresh_trace_summary()
+
+    def refresh_trace_summary(self):
+        summary = tracer.summary()
+        table = self.ui.trace_table
+        table.setRowCount(len(summary))
+        for row, values in enumerate(summary.itertuples(index=False)):
+            for column, value in enumerate(values):
+                text = f"{value:,.1f}" if isinstance(value, float) else str(value)
+                table.setItem(row, column, QTableWidgetItem(text))
+
+    def clear_trace(self):
+        tracer.clear()
+        self.refresh_trace_summary()
+
+    def export_trace(self):
+        out_path, _ = QFileDialog.getSaveFileName(self.ui, "Export Timeline", "cuwalid_trace.json",
+                                                  "Chrome Trace (*.json)")
+        if not out_path:
+            return
+        try:
+            count = tracer.export(out_path)
+            self.ui.status_bar.showMessage(f"Exported {count} spans to {out_path}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error exporting timeline: {e}")
 
+    def selected_job(self):
+        row = self.ui.job_table.currentRow()
+        if row < 0 or row >= len(self.job_rows):
+            self.ui.status_bar.showMessage("Select a job first.")
+            return None
+        return self.job_rows[row]
+
+    def cancel_selected_job(self):
+        job_id = self.selected_job()
+        if job_id is not None:
+            self.ui.job_queue.cancel(job_id)
+
+    def change_job_priority(self, step):
+        job_id = self.selected_job()
+        if job_id is not None:
+            self.ui.job_queue.set_priority(job_id, self.ui.job_queue.store.get(job_id)["priority"] + step)
 
     def finish_model_run(self):
         self.ui.status_bar.showMessage("Model simulation completed")
         self.ui.hide_loading()
 
     def load_csv(self, dataset_num):
-        file_path, _ = QFileDialog.getOpenFileName(self.ui, "Load CSV File", "", "CSV Files (*.csv)")
+        file_path, _ = QFileDialog.getOpenFileName(
+            self.ui, "Load CSV File", "", "Timeseries Files (*.csv *.parquet)"
+        )
 
         if file_path:
-            data = pd.read_csv(file_path)
+            data = load_source(file_path, read_table)
+            self.ui.source_paths[f"csv_{dataset_num}"] = file_path
             
             # Remove 'Date' column if present
             columns = [col for col in data.columns if col.lower() != "date"]
@@ -180,17 +1015,9 @@ class DataProcessor:
             
             if dataset_num == 1:
                 self.ui.csv_file_label_1.setText(file_name)  # Store file path
-                self.ui.csv_var_selector_1.clear()
-                
-                # Add items with checkboxes
-                for i, column in enumerate(columns):
-                    item = QListWidgetItem(column)
-                    if i > 3:
-                        item.setCheckState(Qt.CheckState.Unchecked)  # unchecked
-                    else:
-                        item.setCheckState(Qt.CheckState.Checked)  # checked
-                    self.ui.csv_var_selector_1.addItem(item)
-                
+                # The first four columns start checked
+                self.ui.csv_var_selector_1.set_rows(columns, checked=np.arange(len(columns)) < 4)
+
                 self.ui.csv_var_selector_1.setEnabled(True)
                 self.ui.y_axis_label_1.setEnabled(True)  # Enable Y-axis title input
                 self.ui.select_all_csv1_checkbox.setEnabled(True)
@@ -199,17 +1026,8 @@ class DataProcessor:
                 self.ui.csv_dataframe_1 = data
             else:
                 self.ui.csv_file_label_2.setText(file_name)  # Store file path
-                self.ui.csv_var_selector_2.clear()
-                
-                # Add items with checkboxes
-                for i, column in enumerate(columns):
-                    item = QListWidgetItem(column)
-                    if i > 3:
-                        item.setCheckState(Qt.CheckState.Unchecked)  # unchecked
-                    else:
-                        item.setCheckState(Qt.CheckState.Checked)  # checked
-                    self.ui.csv_var_selector_2.addItem(item)
-                
+                self.ui.csv_var_selector_2.set_rows(columns, checked=np.arange(len(columns)) < 4)
+
                 self.ui.csv_var_selector_2.setEnabled(True)
                 self.ui.y_axis_label_2.setEnabled(True)  # Enable Y-axis title input
                 self.ui.select_all_csv2_checkbox.setEnabled(True)
@@ -220,31 +1038,59 @@ class DataProcessor:
             # Enable plot button if at least one dataset is loaded
             if self.ui.csv_file_label_1.text() != "No file loaded" or self.ui.csv_file_label_2.text() != "No file loaded":
                 self.ui.plot_csv_button.setEnabled(True)
+            self.ui.score_skill_button.setEnabled(
+                self.ui.csv_file_label_1.text() != "No file loaded" and self.ui.csv_file_label_2.text() != "No file loaded"
+            )
+
+    def score_skill(self):
+        out_path, selected_filter = QFileDialog.getSaveFileName(self.ui, "Save Skill Scores", "", TABLE_FILTERS)
+        if out_path:
+            self.ui.show_loading("Scoring simulated against observed series...")
+            QTimer.singleShot(100, lambda: self.score_skill_with_loading(with_export_extension(out_path, selected_filter)))
+
+    @traced("app:skill scores")
+    def score_skill_with_loading(self, out_path):
+        """Score ticked (or all) dataset 2 columns against dataset 1 and save the ranked table."""
+        try:
+            observed, simulated = self.ui.csv_dataframe_1, self.ui.csv_dataframe_2
+            columns = []
+            for selector, df in ((self.ui.csv_var_selector_1, observed), (self.ui.csv_var_selector_2, simulated)):
+                columns.append(
+                    selector.checked_labels() or [column for column in df.columns if column.lower() != "date"]
+                )
+            pairs = pair_columns(*columns, self.ui.skill_pairing.currentText())
+            if not pairs:
+                self.ui.status_bar.showMessage("No column pairs to score; try 'All pairs'.")
+                return
+            rank_by = self.ui.skill_rank_by.currentText()
+            table = score_pairs(observed, simulated, pairs, self.ui.skill_breakdown.currentText(), rank_by)
+            write_table(table, out_path)
+            best = table.iloc[0]
+            self.ui.status_bar.showMessage(
+                f"Scored {len(pairs)} pairs, saved to {out_path}. "
+                f"Best by {rank_by} ({best['Group']}): {best['Simulated']} vs {best['Observed']} = {best[rank_by]:.3f}"
+            )
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error scoring skill: {e}")
+        finally:
+            self.ui.hide_loading()
 
     def extract_point_data(self):
         try:
             self.ui.show_loading("Extracting point data from NetCDF...")
 
             points_df = self.ui.points_csv_data
-            selected_indices = [
-                i for i in range(self.ui.point_selector_list.count())
-                if self.ui.point_selector_list.item(i).checkState() == Qt.CheckState.Checked
-            ]
+            selected_indices = self.ui.point_selector_list.checked_rows()
 
-            if not selected_indices:
+            if not len(selected_indices):
                 self.ui.status_bar.showMessage("No points selected.")
                 return
 
-            selected_points = []
-            for idx in selected_indices:
-                row = points_df.iloc[idx]
-                x = row['East']
-                y = row['North']
-                label = row.get('Label', f"P{idx}")
-                selected_points.append((x, y, label))
+            chosen = points_df.iloc[selected_indices]
+            labels = chosen["Label"] if "Label" in chosen.columns else [f"P{idx}" for idx in selected_indices]
+            selected_points = list(zip(chosen["East"], chosen["North"], labels))
 
-            variable_name = self.ui.netcdf_var_selector.currentText()
-            self.extract_netcdf_points(variable_name, selected_points)
+            self.extract_netcdf_points(self.extraction_variables(), selected_points)
 
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error extracting point data: {e}")
@@ -253,103 +1099,109 @@ class DataProcessor:
 
 
 
-    def extract_netcdf_points(self, variable_name, selected_points):
+    def extraction_variables(self):
+        """Variables ticked in the extraction list, or the selected variable if none are ticked."""
+        names = [
+            self.ui.extract_variables_list.item(i).text()
+            for i in range(self.ui.extract_variables_list.count())
+            if self.ui.extract_variables_list.item(i).checkState() == Qt.CheckState.Checked
+        ]
+        return names or [self.ui.netcdf_var_selector.currentText()]
+
+    def refresh_extraction_variables(self, names):
+        """List the active dataset's variables for extraction, keeping ticks across datasets."""
+        checked = {
+            self.ui.extract_variables_list.item(i).text()
+            for i in range(self.ui.extract_variables_list.count())
+            if self.ui.extract_variables_list.item(i).checkState() == Qt.CheckState.Checked
+        }
+        self.ui.extract_variables_list.clear()
+        for name in names:
+            item = QListWidgetItem(name)
+            item.setCheckState(Qt.CheckState.Checked if name in checked else Qt.CheckState.Unchecked)
+            self.ui.extract_variables_list.addItem(item)
+        self.ui.extract_variables_list.setEnabled(bool(names))
+
+    def open_extraction_variables(self, variable_names):
+        """{name: variable} for an extraction; all must share the grid the index is built on."""
+        variables = {
+            name: self.ui.derived_variables.open(self.ui.netcdf_path, name) for name in variable_names
+        }
+        template = next(iter(variables.values()))
+        for name, variable in variables.items():
+            if dict(variable.sizes) != dict(template.sizes):
+                raise ValueError(f"{name} is not on the same grid/time axis as {variable_names[0]}")
+        return variables
+
+    def extract_netcdf_points(self, variable_names, selected_points):
         try:
             self.ui.show_loading("Extracting point data from NetCDF...")
-            dataset = self.ui.netcdf_dataset  # Assumes it's already loaded
-            df = pd.DataFrame()
-            df['Date'] = dataset['time'].values
-
-            lon = dataset['lon'].values
-            lat = dataset['lat'].values
-            var = dataset[variable_name]
-
-            for i, (x, y, label) in enumerate(selected_points):  # (East, North, OptionalLabel)
-                ds_point = var.sel(lon=x, lat=y, method='nearest')
-                column_name = f"{variable_name}_{label or i}"
-                df[column_name] = ds_point.values
-
-            # Save or update UI
-            out_path, _ = QFileDialog.getSaveFileName(self.ui, "Save Extracted Data", "", "CSV Files (*.csv)")
-            if out_path:
-                df.to_csv(out_path, index=False)
-                self.ui.status_bar.showMessage(f"Point data saved to: {out_path}")
-            else:
+            variables = self.open_extraction_variables(variable_names)
+            template = next(iter(variables.values()))
+
+            xs = [x for x, _, _ in selected_points]  # (East, North, OptionalLabel)
+            ys = [y for _, y, _ in selected_points]
+            rows, cols = point_indices(template, xs, ys)
+            zone_ids = [label or i for i, (_, _, label) in enumerate(selected_points)]
+
+            # Ask for the output first so results can be written while the extraction streams
+            out_path, selected_filter = QFileDialog.getSaveFileName(
+                self.ui, "Save Extracted Data", "", EXPORT_FILTERS
+            )
+            if not out_path:
                 self.ui.status_bar.showMessage("Point extraction canceled by user.")
+                return
+            out_path = with_export_extension(out_path, selected_filter)
+
+            cache_key = ("points", tuple(rows), tuple(cols))
+            queued = self.save_extraction(
+                out_path, cache_key, variables, zone_ids, zone_ids,
+                lambda variable: iter_point_blocks(variable, rows, cols), ("points", (rows, cols)),
+            )
+            self.ui.status_bar.showMessage(queued or f"Point data saved to: {out_path}")
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error extracting NetCDF point data: {e}")
         finally:
             self.ui.hide_loading()
 
-    def extract_netcdf_region(self, variable_name):
-        # Define the custom projection (same as used in your working script)
-        custom_crs = "+proj=laea +lat_0=5 +lon_0=20 +x_0=0 +y_0=0 +datum=WGS84 +units=m +no_defs"
-
+    def extract_netcdf_region(self, variable_names):
         try:
             self.ui.show_loading("Extracting region data from NetCDF...")
 
-            # Get the shapefile data from the UI. Force the CRS to be custom_crs without reprojecting.
             gdf = self.ui.shapefile_data
             if gdf is None or gdf.empty:
                 self.ui.status_bar.showMessage("No shapefile loaded or shapefile is empty.")
                 return
 
-            # FORCE the shapefile's CRS to your custom projection (just like your working script)
-            gdf = gdf.set_crs(custom_crs, allow_override=True)
-
-            # Define a helper to read the correct variable from NetCDF
-            def read_dataset(fname, var_name='tht'):
-                if var_name == 'fch':
-                    fname_rp = fname.split('.')[0] + "rp.nc"
-                    data = xr.open_dataset(fname_rp)[var_name]
-                elif var_name == 'dch':
-                    fname_rp = fname.split('.')[0] + "rp.nc"
-                    data = xr.open_dataset(fname)['rch'] - xr.open_dataset(fname_rp)['fch']
-                else:
-                    data = xr.open_dataset(fname)[var_name]
-                return data
-
-            # Define a helper to extract average time series over a polygon
-            def extract_TS_dataset(data, gdf_geom, crs):
-                # Set the spatial dimensions for rioxarray
-                data = data.rio.set_spatial_dims(x_dim="lon", y_dim="lat", inplace=False)
-                # Write the CRS (forcing it to use our custom projection)
-                data = data.rio.write_crs(crs, inplace=False)
-                
-                # --- Optional Debug Print ---
-                # print("Dataset bounds:", data.rio.bounds())
-                # print("Polygon bounds:", gdf_geom.bounds)
-                # -------------------------------
-
-                # Clip to the polygon
-                zone_data = data.rio.clip([mapping(gdf_geom)], crs=crs, drop=True)
-                # Return the average value over the clipped zone
-                return zone_data.mean(dim=("lat", "lon"), skipna=True).squeeze().values
-
-            # Get the NetCDF file path and the pre-loaded dataset
-            nc_path = self.ui.netcdf_path
-            base_ds = self.ui.netcdf_dataset 
-            df = pd.DataFrame()
-            df['Date'] = base_ds['time'].values
-
-            # Loop through each polygon in the shapefile
-            for idx, geom in enumerate(gdf.geometry):
-                print(f"Processing region {idx}...")
-                # Read the dataset for the variable of interest
-                data = read_dataset(nc_path, var_name=variable_name)
-                # Extract the time series using the polygon and custom CRS
-                ts = extract_TS_dataset(data, geom, custom_crs)
-                df[f"{variable_name}_region_{idx}"] = ts
-
-            # Save the results
-            out_path, _ = QFileDialog.getSaveFileName(
-                self.ui, "Save Region-Averaged Data", "", "CSV Files (*.csv)"
+            # Polygons are reprojected onto the NetCDF grid's CRS; a shapefile without a
+            # .prj is taken to be on the grid already
+            grid_crs = dataset_crs(self.ui.dataset_manager.get(self.ui.netcdf_path))
+            gdf = reproject_gdf(gdf, grid_crs)
+
+            # Plain, companion (*rp.nc) and derived variables resolve lazily through the registry
+            variables = self.open_extraction_variables(variable_names)
+            template = next(iter(variables.values()))
+            zone_ids = list(gdf.index)
+            suffixes = [f"region_{idx}" for idx in range(len(gdf))]
+            geometry_hash = hashlib.sha1(b"".join(geom.wkb for geom in gdf.geometry)).hexdigest()
+            # Masks are built once on a 2-D template and shared by every variable (and
+            # worker); each time chunk reads only the polygons' bounding window
+            regions = [polygon_mask(template, geom, grid_crs) for geom in gdf.geometry]
+
+            # Choose the output first so results are written while the extraction streams
+            out_path, selected_filter = QFileDialog.getSaveFileName(
+                self.ui, "Save Region-Averaged Data", "", EXPORT_FILTERS
             )
-            if out_path:
-                df.to_csv(out_path, index=False)
-                self.ui.status_bar.showMessage(f"Region data saved to: {out_path}")
-            else:
+            if not out_path:
                 self.ui.status_bar.showMessage("Region extraction canceled.")
+                return
+            out_path = with_export_extension(out_path, selected_filter)
+
+            queued = self.save_extraction(
+                out_path, ("regions", geometry_hash), variables, zone_ids, suffixes,
+                lambda variable: iter_region_blocks(variable, regions), ("regions", regions),
+            )
+            self.ui.status_bar.showMessage(queued or f"Region data saved to: {out_path}")
 
         except Exception as e:
             tb = traceback.format_exc()
@@ -358,16 +1210,191 @@ class DataProcessor:
         finally:
             self.ui.hide_loading()
 
+    def extract_netcdf_zones(self, variable_names):
+        """Zone means for every ID of the loaded zone raster, one column per zone."""
+        try:
+            self.ui.show_loading("Extracting zone data from NetCDF...")
+            zones, extent = self.ui.raster_data
+            variables = self.open_extraction_variables(variable_names)
+            grid_crs = dataset_crs(self.ui.dataset_manager.get(self.ui.netcdf_path))
+            index = zone_index(next(iter(variables.values())), zones, extent, self.ui.raster_crs, grid_crs)
+            if index is None:
+                self.ui.status_bar.showMessage("The zone raster has no zones (values > 0) on the NetCDF grid.")
+                return
+            zone_ids = index[3].tolist()
+            zones_hash = hashlib.sha1(np.ascontiguousarray(index[2]).tobytes() + index[3].tobytes()).hexdigest()
+
+            out_path, selected_filter = QFileDialog.getSaveFileName(
+                self.ui, "Save Zone-Averaged Data", "", EXPORT_FILTERS
+            )
+            if not out_path:
+                self.ui.status_bar.showMessage("Zone extraction canceled.")
+                return
+            out_path = with_export_extension(out_path, selected_filter)
+
+            queued = self.save_extraction(
+                out_path, ("zones", index[0].start, index[1].start, zones_hash), variables, zone_ids,
+                [f"zone_{zone}" for zone in zone_ids], lambda variable: iter_zone_blocks(variable, index),
+                ("zones", index),
+            )
+            self.ui.status_bar.showMessage(queued or f"Zone data for {len(zone_ids)} zones saved to: {out_path}")
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error extracting zone data: {e}")
+            print(traceback.format_exc())
+        finally:
+            self.ui.hide_loading()
+
+    def aggregation_settings(self):
+        return (
+            self.ui.aggregation_frequency.currentText(),
+            self.ui.aggregation_statistic.currentText(),
+            self.ui.aggregation_output.currentText(),
+        )
+
+    @traced("app:extraction")
+    def save_extraction(self, out_path, selection_key, variables, zone_ids, suffixes, make_blocks, shared_index):
+        """One variable goes to a wide table (a column per zone); several to one long-format table.
+
+        ``shared_index`` is (method, index) for the extraction; with more than one
+        worker the time chunks are spread over a process pool that reads it from
+        shared memory, otherwise ``make_blocks(variable)`` runs here. Returns a status
+        message if the extraction was queued as a background job instead.
+        """
+        if self.ui.queue_extraction_checkbox.isChecked():
+            return self.queue_extraction(out_path, variables, zone_ids, suffixes, shared_index)
+
+        workers = self.ui.extraction_workers.value()
+        n_time = next(iter(variables.values())).sizes["time"]
+
+        def iterate(names):
+            if workers > 1:
+                return iter_parallel_blocks(
+                    self.ui.netcdf_path, self.ui.derived_variables.spec(), names, *shared_index, n_time, workers
+                )
+            return iter_variable_blocks({name: variables[name] for name in names}, make_blocks)
+
+        if len(variables) == 1:
+            ((variable_name, variable),) = variables.items()
+            columns = [f"{variable_name}_{suffix}" for suffix in suffixes]
+            self.write_extraction(
+                out_path, selection_key, variable, variable_name, columns, zone_ids,
+                lambda: ((times, blocks[variable_name]) for times, blocks in iterate([variable_name])),
+            )
+        else:
+            self.write_tidy_extraction(out_path, selection_key, variables, zone_ids, iterate)
+
+    def queue_extraction(self, out_path, variables, zone_ids, suffixes, shared_index):
+        method, index = shared_index
+        params = {
+            "path": self.ui.netcdf_path,
+            "registry_spec": self.ui.derived_variables.spec(),
+            "variables": list(variables),
+            "method": method,
+            "index": index,
+            "out_path": out_path,
+            "zone_ids": zone_ids,
+            "suffixes": suffixes,
+            "settings": self.aggregation_settings(),
+            "units": {name: variable.attrs.get("units", "") for name, variable in variables.items()},
+            "workers": self.ui.extraction_workers.value(),
+        }
+        title = f"Extract {', '.join(variables)} ({method}) to {os.path.basename(out_path)}"
+        job_id = self.ui.job_queue.submit("extraction", title, params)
+        return f"Extraction queued as job {job_id}; see the Jobs tab."
+
+    def write_extraction(self, out_path, selection_key, variable, variable_name, columns, zone_ids, make_blocks):
+        """Write an extraction to CSV/Parquet/NetCDF; native series go to disk chunk by chunk."""
+        units = variable.attrs.get("units")
+        frequency, _, output = self.aggregation_settings()
+        if frequency == "Native" and output == "Values":
+            with open_writer(out_path, variable_name, zone_ids, columns, units) as writer:
+                for times, block in make_blocks():
+                    writer.write(times, block)
+                    QApplication.processEvents()
+            return
+
+        # Aggregated tables are small, so they are built (and cached) before writing
+        df = self.aggregate_extraction(selection_key, variable_name, columns, make_blocks)
+        with open_writer(out_path, variable_name, zone_ids, columns, units, index_name=df.columns[0]) as writer:
+            writer.write(df.iloc[:, 0].values, df.iloc[:, 1:].to_numpy())
+
+    def write_tidy_extraction(self, out_path, selection_key, variables, zone_ids, iterate):
+        """Several variables in one pass over the time chunks, written as (Date, variable, zone, value) rows.
+
+        Each chunk is read once per variable and reduced through the shared point/zone index.
+        """
+        units = {name: variable.attrs.get("units", "") for name, variable in variables.items()}
+        frequency, _, output = self.aggregation_settings()
+        if frequency == "Native" and output == "Values":
+            with open_tidy_writer(out_path, list(variables), zone_ids, units) as writer:
+                for times, blocks in iterate(list(variables)):
+                    writer.write(times, blocks)
+                    QApplication.processEvents()
+            return
+
+        columns = [str(zone) for zone in zone_ids]
+        tables = {}
+        pending = {}
+        for name, variable in variables.items():
+            df = self.results_cache.get(self.extraction_key(name, selection_key, columns))
+            if df is None:
+                pending[name] = variable
+            else:
+                tables[name] = df
+        if pending:
+            settings = self.aggregation_settings()
+            aggregators = {name: StreamingAggregator(columns, *settings) for name in pending}
+            for times, blocks in iterate(list(pending)):
+                for name, block in blocks.items():
+                    aggregators[name].update(times, block)
+                QApplication.processEvents()
+            for name, aggregator in aggregators.items():
+                tables[name] = aggregator.result()
+                self.results_cache.put(self.extraction_key(name, selection_key, columns), tables[name])
+
+        first = tables[next(iter(variables))]
+        with open_tidy_writer(out_path, list(variables), zone_ids, units, index_name=first.columns[0]) as writer:
+            writer.write(first.iloc[:, 0].values, {name: tables[name].iloc[:, 1:].to_numpy() for name in variables})
+
+    def extraction_key(self, variable_name, selection_key, columns):
+        """Results-cache key: the variable's identity (files, expression, subset), selection and settings."""
+        return (
+            tuple(self.ui.derived_variables.identity(self.ui.netcdf_path, variable_name)),
+            selection_key,
+            tuple(columns),
+            self.aggregation_settings(),
+        )
+
+    def aggregate_extraction(self, selection_key, variable_name, columns, make_blocks):
+        """Stream extracted blocks through the temporal aggregator, caching the result table."""
+        key = self.extraction_key(variable_name, selection_key, columns)
+        df = self.results_cache.get(key)
+        if df is not None:
+            return df.copy()
+
+        aggregator = StreamingAggregator(columns, *self.aggregation_settings())
+        for times, block in make_blocks():
+            aggregator.update(times, block)
+            QApplication.processEvents()
+        df = aggregator.result()
+        self.results_cache.put(key, df)
+        return df.copy()
 
 
     def extract_region_data(self):
         try:
+            if self.ui.region_source.currentText() == "Zone raster":
+                if getattr(self.ui, "raster_data", None) is None:
+                    self.ui.status_bar.showMessage("Load a zone-ID raster (Load Raster File) first.")
+                    return
+                self.extract_netcdf_zones(self.extraction_variables())
+                return
+
             if self.ui.shapefile_data is None:
                 self.ui.status_bar.showMessage("No shapefile loaded.")
                 return
 
-            variable_name = self.ui.netcdf_var_selector.currentText()
-            self.extract_netcdf_region(variable_name)
+            self.extract_netcdf_region(self.extraction_variables())
 
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error extracting region data: {e}")
@@ -379,7 +1406,7 @@ class DataProcessor:
             return
 
         try:
-            points_df = pd.read_csv(file_path)
+            points_df = load_source(file_path, pd.read_csv)
 
             if 'East' not in points_df.columns or 'North' not in points_df.columns:
                 self.ui.status_bar.showMessage("CSV must contain 'East' and 'North' columns.")
@@ -387,14 +1414,14 @@ class DataProcessor:
 
             # Store loaded CSV in UI
             self.ui.points_csv_data = points_df
+            self.ui.source_paths["points"] = file_path
 
-            # Populate the list widget for point selection
-            self.ui.point_selector_list.clear()
-            for i, row in points_df.iterrows():
-                label = row.get('Label', f"Point {i}")
-                item = QListWidgetItem(str(label))
-                item.setCheckState(Qt.CheckState.Unchecked)
-                self.ui.point_selector_list.addItem(item)
+            # The selector reads rows from the DataFrame only as they scroll into view
+            labels = (
+                points_df["Label"] if "Label" in points_df.columns
+                else [f"Point {i}" for i in points_df.index]
+            )
+            self.ui.point_selector_list.set_rows(labels, frame=points_df)
 
             self.ui.point_selector_list.setEnabled(True)
             self.ui.select_all_points_checkbox.setEnabled(True)
@@ -409,8 +1436,9 @@ class DataProcessor:
             return
 
         try:
-            gdf = gpd.read_file(file_path)
+            gdf = load_source(file_path, gpd.read_file)
             self.ui.shapefile_data = gdf
+            self.ui.source_paths["shapefile"] = file_path
             self.ui.status_bar.showMessage("Shapefile loaded. Ready to extract.")
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error loading shapefile: {e}")
@@ -434,7 +1462,8 @@ class ModelRunnerThread(QThread):
             sys.stderr = self
 
             # Run the model
-            run_DRYP(self.input_json)
+            with span("model:run"):
+                run_DRYP(self.input_json)
 
         except Exception as e:
             error_message = f"Error running model: {e}\n{traceback.format_exc()}"
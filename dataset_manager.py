@@ -0,0 +1,373 @@
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from cache_utils import LRUCache
+from precision import PRECISIONS, pack_block, unpack_block
+from rechunk import find_layouts, open_store
+from tracing import span
+
+# Where the subset-on-load bounding box comes from
+SUBSET_SOURCES = ["Full domain", "Shapefile extent", "Points extent", "Manual box"]
+
+
+def _indexer_key(indexers):
+    """Turn isel-style indexers into a hashable cache key."""
+    key = []
+    for dim in sorted(indexers):
+        value = indexers[dim]
+        if isinstance(value, slice):
+            value = ("slice", value.start, value.stop, value.step)
+        elif isinstance(value, (list, tuple, np.ndarray)):
+            value = ("list",) + tuple(np.asarray(value).tolist())
+        else:
+            value = int(value)
+        key.append((dim, value))
+    return tuple(key)
+
+
+def _touched_range(indexer, size):
+    """(first, stop) positions an isel indexer touches along one dimension."""
+    if indexer is None:
+        return 0, size
+    if isinstance(indexer, slice):
+        start, stop, _ = indexer.indices(size)
+        return start, max(start + 1, stop)
+    if isinstance(indexer, (list, tuple, np.ndarray)):
+        positions = np.asarray(indexer)
+        return int(positions.min()), int(positions.max()) + 1
+    position = int(indexer) % size
+    return position, position + 1
+
+
+def read_cost(chunks, sizes, indexers, itemsize=8):
+    """Approximate bytes read for an isel on a store with the given chunk shape."""
+    cost = itemsize
+    for dim, chunk in zip(sizes, chunks):
+        first, stop = _touched_range(indexers.get(dim), sizes[dim])
+        cost *= ((stop - 1) // chunk - first // chunk + 1) * chunk
+    return cost
+
+
+def coord_slice(values, low=None, high=None):
+    """Positions of the coordinate values within [low, high], found by binary search.
+
+    Works for ascending and descending coordinates (DRYP latitudes can run either way).
+    """
+    index = pd.Index(values)
+    descending = len(index) > 1 and index[0] > index[-1]
+    if descending:
+        index = index[::-1]
+    first = index.searchsorted(low, side="left") if low is not None else 0
+    stop = index.searchsorted(high, side="right") if high is not None else len(index)
+    if descending:
+        first, stop = len(index) - stop, len(index) - first
+    return slice(int(first), int(stop))
+
+
+def subset_indexers(dataset, bbox=None, start=None, end=None, pad=1):
+    """isel windows covering a (xmin, ymin, xmax, ymax) box and a time range of a dataset.
+
+    The box is padded by ``pad`` cells so cells whose centres fall just outside a
+    polygon or point extent are kept.
+    """
+    indexers = {}
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = bbox
+        for dim, low, high in (("lat", ymin, ymax), ("lon", xmin, xmax)):
+            size = dataset.sizes[dim]
+            window = coord_slice(dataset[dim].values, low, high)
+            window = slice(max(0, window.start - pad), min(size, window.stop + pad))
+            if window.stop <= window.start:
+                raise ValueError("The bounding box does not overlap the grid.")
+            indexers[dim] = window
+    if (start or end) and "time" in dataset.dims:
+        window = coord_slice(
+            dataset["time"].values,
+            np.datetime64(pd.Timestamp(start)) if start else None,
+            np.datetime64(pd.Timestamp(end)) if end else None,
+        )
+        if window.stop <= window.start:
+            raise ValueError("The time range contains no time steps.")
+        indexers["time"] = window
+    return indexers
+
+
+def compose_indexers(windows, indexers):
+    """Translate indexers relative to subset windows into positions in the full file."""
+    composed = dict(indexers)
+    for dim, window in windows.items():
+        size = window.stop - window.start
+        indexer = indexers.get(dim)
+        if indexer is None:
+            composed[dim] = window
+        elif isinstance(indexer, slice) and (indexer.step or 1) > 0:
+            start, stop, step = indexer.indices(size)
+            composed[dim] = slice(window.start + start, window.start + stop, indexer.step)
+        elif isinstance(indexer, (slice, list, tuple, np.ndarray)):
+            composed[dim] = np.arange(window.start, window.stop)[indexer]
+        else:
+            composed[dim] = window.start + range(size)[int(indexer)]
+    return composed
+
+
+class LazyVariable:
+    """DataArray-like view over a lazily opened variable; subclasses decide how blocks are read.
+
+    ``template`` is a lazily opened DataArray that supplies dims, sizes and coordinates.
+    """
+
+    template = None
+    name = None
+    attrs = {}
+
+    @property
+    def dims(self):
+        return self.template.dims
+
+    @property
+    def sizes(self):
+        return self.template.sizes
+
+    @property
+    def shape(self):
+        return self.template.shape
+
+    @property
+    def ndim(self):
+        return self.template.ndim
+
+    @property
+    def coords(self):
+        return self.template.coords
+
+    @property
+    def dtype(self):
+        return self.template.dtype
+
+    def __getitem__(self, name):
+        return self.template[name]
+
+    def read(self, **indexers):
+        raise NotImplementedError
+
+    def isel(self, **indexers):
+        block = self.read(**indexers)
+        subset = self.template.isel(**indexers)
+        return xr.DataArray(block, coords=subset.coords, dims=subset.dims, name=self.name, attrs=self.attrs)
+
+    def sel(self, method=None, **labels):
+        """Label-based selection, translated to positions so only those cells are read."""
+        indexers = {}
+        for dim, label in labels.items():
+            index = self.template.indexes[dim]
+            if isinstance(label, slice):
+                indexers[dim] = index.slice_indexer(label.start, label.stop, label.step)
+            else:
+                position = index.get_indexer([label], method=method)[0]
+                if position < 0:
+                    raise KeyError(f"{label} not found along '{dim}'")
+                indexers[dim] = int(position)
+        return self.isel(**indexers)
+
+    @property
+    def values(self):
+        return self.isel().values
+
+
+class StoredVariable(LazyVariable):
+    """A variable stored in a file, read through the manager so reads use the best layout."""
+
+    def __init__(self, manager, path, name):
+        self.manager = manager
+        self.path = path
+        self.name = name
+        self.template = manager.get(path)[name].isel(**manager.window(path, name))
+        self.attrs = dict(self.template.attrs)
+
+    def read(self, **indexers):
+        return self.manager.read(self.path, self.name, **indexers)
+
+
+class DatasetManager:
+    """Keeps several NetCDF files open lazily behind an LRU of file handles and decoded chunks.
+
+    Files that have been re-chunked (see rechunk.py) also have a time-contiguous
+    'series' copy (and a space-contiguous 'frames' copy when the original isn't
+    stored a time slice per chunk); every read goes to whichever
+    of those and the original touches the fewest bytes.
+
+    A dataset can also be restricted to a subset window (bounding box and time
+    range); variables then expose only that window and reads are offset into it.
+    """
+
+    def __init__(self, max_open_files=8, chunk_cache_bytes=512 * 1024 ** 2):
+        self.paths = []  # Every dataset the user has opened, in picker order
+        self.handles = LRUCache(max_items=max_open_files, on_evict=self._close_handle)
+        self.chunks = LRUCache(max_bytes=chunk_cache_bytes)
+        self.layouts = {}  # path -> {'series': store[, 'frames': store]}
+        self.subsets = {}  # path -> {dim: slice} windows applied to every read
+        # Opt-in reduced precision for cached blocks (see precision.py)
+        self.precision = PRECISIONS[0]
+        self.tolerance = None
+        self.max_errors = {}  # (path, variable) -> largest absolute error of any cached block
+
+    @staticmethod
+    def _close_handle(path, dataset):
+        # xarray reopens closed files on demand, so evicting only releases the OS handle
+        dataset.close()
+
+    def open(self, path):
+        """Register a dataset (if new) and return its lazily opened handle."""
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+        self.register_layouts(path)
+        return self.get(path)
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        dataset = self.handles.get(path)
+        if dataset is None:
+            # No .load(): only metadata is read here, data is pulled per chunk when needed
+            with span("io:open file", file=os.path.basename(path)):
+                dataset = open_store(path) if path.endswith(".zarr") else xr.open_dataset(path)
+            self.handles.put(path, dataset)
+        return dataset
+
+    def variable(self, path, name):
+        return StoredVariable(self, os.path.abspath(path), name)
+
+    def set_subset(self, path, indexers=None):
+        """Restrict a dataset to isel windows (from subset_indexers); None clears the subset."""
+        path = os.path.abspath(path)
+        if indexers:
+            self.subsets[path] = dict(indexers)
+        else:
+            self.subsets.pop(path, None)
+
+    def window(self, path, var_name):
+        """Subset windows that apply to the dimensions of one variable."""
+        dims = self.get(path)[var_name].dims
+        return {dim: window for dim, window in self.subsets.get(os.path.abspath(path), {}).items() if dim in dims}
+
+    def subset_key(self, path):
+        """Hashable description of a dataset's subset, for keying cached results."""
+        return _indexer_key(self.subsets.get(os.path.abspath(path), {}))
+
+    def register_layouts(self, path):
+        """Pick up up-to-date re-chunked copies of a file, if any."""
+        path = os.path.abspath(path)
+        layouts = find_layouts(path)
+        if layouts:
+            self.layouts[path] = layouts
+        else:
+            self.layouts.pop(path, None)
+        return layouts
+
+    def unregister_layouts(self, path):
+        """Stop routing reads to a file's re-chunked copies and close their handles (before rewriting them)."""
+        for store in self.layouts.pop(os.path.abspath(path), {}).values():
+            self.handles.pop(store)
+
+    def set_precision(self, precision, tolerance=None):
+        """Store cached blocks at full precision, as float32 or as scaled int16 (within ``tolerance``)."""
+        if (precision, tolerance) != (self.precision, self.tolerance):
+            self.precision, self.tolerance = precision, tolerance
+            self.chunks.clear()
+            self.max_errors.clear()
+
+    def cache_block(self, key, block, name=None):
+        """Cache a block (reduced if a precision is set) and return the array readers should use.
+
+        Errors are tracked per (path, ``name``); ``name`` defaults to the variable in ``key``.
+        """
+        stored, error = pack_block(block, self.precision, self.tolerance)
+        if self.chunks.max_bytes is None or stored.nbytes <= self.chunks.max_bytes // 16:
+            self.chunks.put(key, stored)
+        if error:
+            name = (key[0], name or key[1])
+            self.max_errors[name] = max(error, self.max_errors.get(name, 0.0))
+        return unpack_block(stored)
+
+    def cached_block(self, key):
+        stored = self.chunks.get(key)
+        return None if stored is None else unpack_block(stored)
+
+    def precision_note(self, path, var_name):
+        """' (float32, max error 1.2e-07)' once reduced blocks of a variable have been read, else ''."""
+        error = self.max_errors.get((os.path.abspath(path), var_name))
+        if self.precision == PRECISIONS[0] or error is None:
+            return ""
+        return f" ({self.precision}, max error {error:.3g})"
+
+    def close(self, path):
+        path = os.path.abspath(path)
+        if path in self.paths:
+            self.paths.remove(path)
+        self.handles.pop(path)
+        self.subsets.pop(path, None)
+        self.unregister_layouts(path)
+        for key in self.chunks.keys():
+            if key[0] == path:
+                self.chunks.pop(key)
+
+    def close_all(self):
+        for path in list(self.paths):
+            self.close(path)
+
+    def route(self, path, var_name, indexers):
+        """Store (original or re-chunked copy) that reads ``indexers`` with the least I/O."""
+        source = self.get(path)[var_name]
+        layouts = self.layouts.get(path)
+        if not layouts:
+            return path
+        itemsize = source.dtype.itemsize
+        # Original DRYP files are written one time slice at a time
+        original_chunks = source.encoding.get("chunksizes") or (1,) + tuple(source.shape[1:])
+        best, best_cost = path, read_cost(original_chunks, source.sizes, indexers, itemsize)
+        for store in layouts.values():
+            stored = self.get(store)
+            if var_name not in stored:
+                continue
+            encoding = stored[var_name].encoding
+            chunks = encoding.get("chunks") or encoding.get("preferred_chunks") or encoding.get("chunksizes")
+            if isinstance(chunks, dict):
+                chunks = tuple(chunks[dim] for dim in source.dims)
+            if not chunks:
+                continue
+            cost = read_cost(chunks, source.sizes, indexers, itemsize)
+            if cost < best_cost:
+                best, best_cost = store, cost
+        return best
+
+    def read(self, path, var_name, cache=True, **indexers):
+        """Return the decoded numpy block for ``var_name[indexers]``, cached across calls.
+
+        Indexers are relative to the dataset's subset window, if it has one. Only
+        blocks up to 1/16 of the cache budget are kept, so streaming extraction
+        blocks don't push out frames and series that are revisited. With a reduced
+        precision set, blocks come back as float32. ``cache=False`` reads around the
+        cache, for callers that keep blocks themselves.
+        """
+        path = os.path.abspath(path)
+        indexers = compose_indexers(self.window(path, var_name), indexers)
+        key = (path, var_name, _indexer_key(indexers))
+        block = self.cached_block(key) if cache else None
+        if block is None:
+            data = self.get(self.route(path, var_name, indexers))[var_name]
+            with span("io:read", variable=var_name):
+                block = np.asarray(data.isel(**indexers).values)
+            if cache:
+                block = self.cache_block(key, block)
+        return block
+
+    @staticmethod
+    def numeric_variables(dataset):
+        """Names of the 2-D/3-D numeric variables that can be plotted or extracted."""
+        return [
+            var for var in dataset.data_vars
+            if dataset[var].ndim in [2, 3]
+            and np.issubdtype(dataset[var].dtype, np.number)
+        ]
@@ -0,0 +1,309 @@
+import ast
+import os
+import numpy as np
+
+from cache_utils import file_fingerprint
+from dataset_manager import LazyVariable, _indexer_key
+
+
+# Factors for convert(x, "from", "to"); DRYP writes depths in mm and rates per model step
+UNIT_FACTORS = {
+    ("m", "mm"): 1000.0,
+    ("mm", "m"): 0.001,
+    ("m", "cm"): 100.0,
+    ("cm", "m"): 0.01,
+    ("mm/h", "mm/day"): 24.0,
+    ("mm/day", "mm/h"): 1.0 / 24.0,
+    ("m/s", "mm/day"): 86400000.0,
+    ("mm/day", "m/s"): 1.0 / 86400000.0,
+    ("m3", "Mm3"): 1e-6,
+    ("Mm3", "m3"): 1e6,
+}
+
+
+def convert(values, from_units, to_units):
+    if from_units == to_units:
+        return values
+    try:
+        return values * UNIT_FACTORS[(from_units, to_units)]
+    except KeyError:
+        raise ValueError(f"Unknown unit conversion: {from_units} -> {to_units}")
+
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Pow: np.power,
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+}
+_UNARY_OPS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+    ast.Invert: np.logical_not,
+}
+_COMPARE_OPS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+_FUNCTIONS = {
+    "where": np.where,
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "minimum": np.fmin,
+    "maximum": np.fmax,
+    "clip": np.clip,
+    "convert": convert,
+}
+_CONSTANTS = {"nan": np.nan, "pi": np.pi}
+
+# Hard-coded in the old read_dataset helpers: fch lives in the *rp.nc companion file
+BUILTIN_DEFINITIONS = {
+    "fch": "rp.fch",
+    "dch": "rch - rp.fch",
+}
+
+
+def companion_path(path):
+    """The DRYP '*rp.nc' companion of an output file."""
+    root, ext = os.path.splitext(path)
+    return root + "rp" + (ext or ".nc")
+
+
+class DerivedDefinition:
+    """A named expression over variables of one or more aligned files, e.g. 'rch - rp.fch'."""
+
+    def __init__(self, name, expression, units=None):
+        self.name = name
+        self.expression = expression
+        self.units = units
+        self.tree = ast.parse(expression, mode="eval")
+        self._validate(self.tree.body)
+
+    def _validate(self, node):
+        allowed = (
+            ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Attribute,
+            ast.Constant, ast.operator, ast.unaryop, ast.cmpop, ast.Load,
+        )
+        for child in ast.walk(node):
+            if not isinstance(child, allowed):
+                raise ValueError(f"Unsupported syntax in '{self.expression}': {type(child).__name__}")
+            if isinstance(child, ast.BinOp) and type(child.op) not in _BINARY_OPS:
+                raise ValueError(f"Unsupported operator in '{self.expression}'")
+            if isinstance(child, ast.UnaryOp) and type(child.op) not in _UNARY_OPS:
+                raise ValueError(f"Unsupported operator in '{self.expression}'")
+            if isinstance(child, ast.Compare) and any(type(op) not in _COMPARE_OPS for op in child.ops):
+                raise ValueError(f"Unsupported comparison in '{self.expression}'")
+            if isinstance(child, ast.Call) and (
+                not isinstance(child.func, ast.Name) or child.func.id not in _FUNCTIONS
+            ):
+                raise ValueError(f"Unknown function in '{self.expression}'")
+            if isinstance(child, ast.Attribute) and not isinstance(child.value, ast.Name):
+                raise ValueError(f"Only 'alias.variable' references are allowed in '{self.expression}'")
+
+    def references(self):
+        """(alias, variable) pairs read by the expression; alias is None for the base file."""
+        refs = []
+        for node in ast.walk(self.tree.body):
+            if isinstance(node, ast.Attribute):
+                refs.append((node.value.id, node.attr))
+            elif isinstance(node, ast.Name) and node.id not in _FUNCTIONS and node.id not in _CONSTANTS:
+                refs.append((None, node.id))
+        # Names used as attribute bases are aliases, not variables
+        aliases = {alias for alias, _ in refs if alias is not None}
+        return [(alias, var) for alias, var in refs if not (alias is None and var in aliases)]
+
+
+class DerivedVariable(LazyVariable):
+    """DataArray-like view that evaluates its expression only for the requested hyperslab."""
+
+    def __init__(self, registry, path, definition, depth=0, cache=True):
+        self.registry = registry
+        self.cache = cache
+        self.path = path
+        self.definition = definition
+        self.name = definition.name
+        self.attrs = {"units": definition.units} if definition.units else {}
+        self.depth = depth
+
+        self.template = None
+        for alias, var_name in definition.references():
+            source = registry.open(registry.source_path(path, alias), var_name, depth + 1)
+            if self.template is None:
+                self.template = source.template
+            elif dict(source.sizes) != dict(self.template.sizes):
+                raise ValueError(f"'{self.name}' combines variables on different grids: {var_name}")
+        if self.template is None:
+            raise ValueError(f"'{self.name}' does not reference any variable")
+
+    @property
+    def dtype(self):
+        return np.dtype("float64")
+
+    def read(self, **indexers):
+        return self.registry.read(self.path, self.name, **indexers)
+
+    def evaluate(self, **indexers):
+        return np.asarray(self._evaluate(self.definition.tree.body, indexers))
+
+    def _evaluate(self, node, indexers):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in _CONSTANTS:
+                return _CONSTANTS[node.id]
+            return self.registry.read(self.path, node.id, _depth=self.depth + 1, cache=self.cache, **indexers)
+        if isinstance(node, ast.Attribute):
+            source = self.registry.source_path(self.path, node.value.id)
+            return self.registry.read(source, node.attr, _depth=self.depth + 1, cache=self.cache, **indexers)
+        if isinstance(node, ast.BinOp):
+            return _BINARY_OPS[type(node.op)](
+                self._evaluate(node.left, indexers), self._evaluate(node.right, indexers)
+            )
+        if isinstance(node, ast.UnaryOp):
+            return _UNARY_OPS[type(node.op)](self._evaluate(node.operand, indexers))
+        if isinstance(node, ast.Compare):
+            result = None
+            left = self._evaluate(node.left, indexers)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._evaluate(comparator, indexers)
+                step = _COMPARE_OPS[type(op)](left, right)
+                result = step if result is None else np.logical_and(result, step)
+                left = right
+            return result
+        if isinstance(node, ast.Call):
+            args = [self._evaluate(arg, indexers) for arg in node.args]
+            return _FUNCTIONS[node.func.id](*args)
+        raise ValueError(f"Unsupported expression node: {type(node).__name__}")
+
+
+class DerivedVariableRegistry:
+    """Resolves variable names (plain or derived) against the datasets in a DatasetManager."""
+
+    MAX_DEPTH = 16
+
+    def __init__(self, dataset_manager):
+        self.dataset_manager = dataset_manager
+        self.definitions = {}
+        self.aliases = {}  # alias -> fixed path of another aligned file
+        for name, expression in BUILTIN_DEFINITIONS.items():
+            self.define(name, expression)
+
+    def spec(self):
+        """Picklable description of the definitions, aliases and subsets, for worker processes."""
+        return {
+            "definitions": {
+                name: (definition.expression, definition.units)
+                for name, definition in self.definitions.items()
+            },
+            "aliases": dict(self.aliases),
+            "subsets": dict(self.dataset_manager.subsets),
+        }
+
+    @classmethod
+    def from_spec(cls, dataset_manager, spec):
+        registry = cls(dataset_manager)
+        for name, (expression, units) in spec["definitions"].items():
+            registry.define(name, expression, units)
+        for alias, path in spec["aliases"].items():
+            registry.add_alias(alias, path)
+        for path, indexers in spec.get("subsets", {}).items():
+            dataset_manager.set_subset(path, indexers)
+        return registry
+
+    def define(self, name, expression, units=None):
+        if not name.isidentifier():
+            raise ValueError(f"Invalid variable name: {name}")
+        definition = DerivedDefinition(name, expression, units)
+        self.definitions[name] = definition
+        return definition
+
+    def remove(self, name):
+        self.definitions.pop(name, None)
+
+    def add_alias(self, alias, path):
+        """Make variables of another aligned file available as 'alias.variable'."""
+        if not alias.isidentifier():
+            raise ValueError(f"Invalid alias: {alias}")
+        self.aliases[alias] = os.path.abspath(path)
+
+    def source_path(self, path, alias):
+        if alias is None:
+            return path
+        if alias == "rp":
+            return companion_path(path)
+        if alias in self.aliases:
+            return self.aliases[alias]
+        raise KeyError(f"Unknown file alias: {alias}")
+
+    def is_derived(self, path, name):
+        # A variable stored in the file always wins over a definition of the same name
+        return name in self.definitions and name not in self.dataset_manager.get(path).data_vars
+
+    def identity(self, path, name, _depth=0):
+        """Strings that change whenever the values of ``name`` could change, for cache keys.
+
+        Covers the fingerprints and subsets of every file read and the expressions of
+        derived variables, recursively.
+        """
+        if _depth > self.MAX_DEPTH:
+            raise ValueError(f"Derived variable '{name}' is defined recursively")
+        identity = [file_fingerprint(path), name, str(self.dataset_manager.subset_key(path))]
+        if self.is_derived(path, name):
+            definition = self.definitions[name]
+            identity.append(definition.expression)
+            for alias, var_name in definition.references():
+                identity += self.identity(self.source_path(path, alias), var_name, _depth + 1)
+        return identity
+
+    def open(self, path, name, depth=0):
+        """Return a StoredVariable (plain variable) or DerivedVariable for ``name``."""
+        if depth > self.MAX_DEPTH:
+            raise ValueError(f"Derived variable '{name}' is defined recursively")
+        if self.is_derived(path, name):
+            return DerivedVariable(self, path, self.definitions[name], depth)
+        return self.dataset_manager.variable(path, name)
+
+    def read(self, path, name, _depth=0, cache=True, **indexers):
+        """Numpy block of ``name[indexers]``; plain and derived blocks share the chunk cache.
+
+        ``cache=False`` reads (and evaluates) around the chunk cache.
+        """
+        if not self.is_derived(path, name):
+            return self.dataset_manager.read(path, name, cache=cache, **indexers)
+        if _depth > self.MAX_DEPTH:
+            raise ValueError(f"Derived variable '{name}' is defined recursively")
+
+        definition = self.definitions[name]
+        if not cache:
+            return DerivedVariable(self, path, definition, _depth, cache=False).evaluate(**indexers)
+        # Indexers are relative to the subset window, so the window is part of the key
+        key = (os.path.abspath(path), f"={definition.expression}", _indexer_key(indexers),
+               self.dataset_manager.subset_key(path))
+        block = self.dataset_manager.cached_block(key)
+        if block is None:
+            variable = DerivedVariable(self, path, definition, _depth)
+            block = self.dataset_manager.cache_block(key, variable.evaluate(**indexers), name=name)
+        return block
+
+    def available(self, path):
+        """Derived variables whose source files and variables exist for this dataset."""
+        names = []
+        for name in self.definitions:
+            try:
+                if not self.is_derived(path, name):
+                    continue
+                variable = self.open(path, name)
+                if variable.ndim in [2, 3]:
+                    names.append(name)
+            except Exception:
+                continue
+        return names
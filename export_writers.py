@@ -0,0 +1,299 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from tracing import span, traced
+
+EXPORT_FILTERS = "CSV Files (*.csv);;Parquet Files (*.parquet);;NetCDF Files (*.nc)"
+TABLE_FILTERS = "CSV Files (*.csv);;Parquet Files (*.parquet)"
+_FILTER_EXTENSIONS = {"CSV": ".csv", "Parquet": ".parquet", "NetCDF": ".nc"}
+
+
+TIME_UNITS = "seconds since 1970-01-01 00:00:00"
+# Columns after the index in long-format (multi-variable) extractions
+TIDY_COLUMNS = ["variable", "zone", "value"]
+
+
+def encode_times(times, calendar="standard"):
+    """Numeric CF time values (in TIME_UNITS) for numpy datetimes or cftime objects."""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return (times - np.datetime64("1970-01-01")) / np.timedelta64(1, "s")
+    import netCDF4
+    return netCDF4.date2num(list(times), TIME_UNITS, calendar)
+
+
+def with_export_extension(path, selected_filter):
+    """Append the extension of the chosen file-dialog filter if the user left it off."""
+    if os.path.splitext(path)[1].lower() in _FILTER_EXTENSIONS.values():
+        return path
+    for name, extension in _FILTER_EXTENSIONS.items():
+        if selected_filter.startswith(name):
+            return path + extension
+    return path + ".csv"
+
+
+class ExtractionWriter:
+    """Writes (index, block[row, zone]) chunks of one extracted variable as they stream in.
+
+    ``index_name`` is 'Date' for time series, or e.g. 'Month'/'Season' for climatologies.
+    """
+
+    def __init__(self, path, variable, zone_ids, columns, units=None, index_name="Date"):
+        self.path = path
+        self.variable = variable
+        self.zone_ids = [str(zone) for zone in zone_ids]
+        self.columns = list(columns)
+        self.units = units or ""
+        self.index_name = index_name
+        self.rows_written = 0
+
+    def metadata(self):
+        return {
+            "variable": self.variable,
+            "units": self.units,
+            "zone_ids": self.zone_ids,
+            "columns": self.columns,
+            "index": self.index_name,
+        }
+
+    def write(self, index, block):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvWriter(ExtractionWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file = open(self.path, "w", newline="")
+        pd.DataFrame(columns=[self.index_name] + self.columns).to_csv(self.file, index=False)
+
+    def write(self, index, block):
+        with span("table:build", rows=len(block)):
+            df = pd.DataFrame(np.asarray(block), columns=self.columns)
+            df.insert(0, self.index_name, index)
+        with span("write:csv", rows=len(df)):
+            df.to_csv(self.file, index=False, header=False)
+        self.rows_written += len(df)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter(ExtractionWriter):
+    """One zstd-compressed row group per chunk; metadata lives in the schema."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.writer = None
+
+    @traced("write:parquet")
+    def write(self, index, block):
+        df = pd.DataFrame(np.asarray(block, dtype=np.float64), columns=self.columns)
+        df.insert(0, self.index_name, index)
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            schema = table.schema.with_metadata({
+                **(table.schema.metadata or {}),
+                b"cuwalid": json.dumps(self.metadata()).encode(),
+            })
+            self.writer = self.pq.ParquetWriter(self.path, schema, compression="zstd")
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.rows_written += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class NetCDFWriter(ExtractionWriter):
+    """(index, zone) variable with an unlimited index dimension, zlib compressed and chunked."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import netCDF4
+        self.dim = self.index_name.lower() if self.index_name != "Date" else "time"
+        self.dataset = netCDF4.Dataset(self.path, "w")
+        self.dataset.createDimension(self.dim, None)
+        self.dataset.createDimension("zone", len(self.zone_ids))
+        zone = self.dataset.createVariable("zone", str, ("zone",))
+        zone[:] = np.array(self.zone_ids, dtype=object)
+        zone.long_name = "zone / point identifier"
+        self.index_var = None
+        self.data_vars = {}
+        self._create_data(self.variable, self.units)
+        self.dataset.source = "CUWALID App extraction"
+        self.dataset.cuwalid_metadata = json.dumps(self.metadata())
+
+    def _create_data(self, name, units):
+        data = self.dataset.createVariable(
+            name, "f8", (self.dim, "zone"), zlib=True, complevel=4,
+            fill_value=np.nan, chunksizes=(256, max(1, min(len(self.zone_ids), 1024))),
+        )
+        data.units = units or ""
+        data.long_name = name
+        self.data_vars[name] = data
+
+    def _encode_index(self, index):
+        index = np.asarray(index)
+        if self.dim != "time":
+            if self.index_var is None:
+                kind = str if index.dtype.kind in "OUS" else "i8"
+                self.index_var = self.dataset.createVariable(self.dim, kind, (self.dim,))
+            return index.astype(object) if index.dtype.kind in "OUS" else index
+        if self.index_var is None:
+            self.index_var = self.dataset.createVariable("time", "f8", ("time",))
+            self.index_var.units = TIME_UNITS
+            self.index_var.calendar = getattr(index.flat[0], "calendar", None) or "standard"
+        return encode_times(index, self.index_var.calendar)
+
+    @traced("write:netcdf")
+    def write(self, index, block):
+        block = np.asarray(block, dtype=np.float64)
+        start, stop = self.rows_written, self.rows_written + block.shape[0]
+        self.index_var[start:stop] = self._encode_index(index)
+        self.data_vars[self.variable][start:stop, :] = block
+        self.rows_written = stop
+
+    def close(self):
+        self.dataset.close()
+
+
+def tidy_frame(index, blocks, zone_ids, index_name="Date"):
+    """Long-format rows (index, variable, zone, value) from {variable: block[row, zone]}.
+
+    Rows are ordered by index, then variable, then zone, so a file is the same
+    however the extraction was split into chunks.
+    """
+    names = list(blocks)
+    values = np.stack([np.asarray(blocks[name], dtype=np.float64) for name in names], axis=1)
+    n_rows, n_variables, n_zones = values.shape
+    return pd.DataFrame({
+        index_name: np.repeat(np.asarray(index), n_variables * n_zones),
+        "variable": np.tile(np.repeat(np.asarray(names, dtype=object), n_zones), n_rows),
+        "zone": np.tile(np.asarray(zone_ids, dtype=object), n_rows * n_variables),
+        "value": values.ravel(),
+    })
+
+
+class TidyWriter(ExtractionWriter):
+    """Writes chunks of several variables extracted together as {variable: block[row, zone]}."""
+
+    def __init__(self, path, variables, zone_ids, units=None, index_name="Date"):
+        self.variables = list(variables)
+        self.units_by_variable = dict(units or {})
+        super().__init__(path, ",".join(self.variables), zone_ids, TIDY_COLUMNS, index_name=index_name)
+
+    def metadata(self):
+        metadata = super().metadata()
+        metadata.update(variables=self.variables, units=self.units_by_variable)
+        return metadata
+
+    def write(self, index, blocks):
+        with span("table:build", rows=len(index)):
+            df = tidy_frame(index, blocks, self.zone_ids, self.index_name)
+        self.write_frame(df)
+        self.rows_written += len(df)
+
+    def write_frame(self, df):
+        raise NotImplementedError
+
+
+class TidyCsvWriter(TidyWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file = open(self.path, "w", newline="")
+        pd.DataFrame(columns=[self.index_name] + TIDY_COLUMNS).to_csv(self.file, index=False)
+
+    @traced("write:csv")
+    def write_frame(self, df):
+        df.to_csv(self.file, index=False, header=False)
+
+    def close(self):
+        self.file.close()
+
+
+class TidyParquetWriter(TidyWriter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.writer = None
+
+    @traced("write:parquet")
+    def write_frame(self, df):
+        table = self.pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            schema = table.schema.with_metadata({
+                **(table.schema.metadata or {}),
+                b"cuwalid": json.dumps(self.metadata()).encode(),
+            })
+            self.writer = self.pq.ParquetWriter(self.path, schema, compression="zstd")
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class TidyNetCDFWriter(NetCDFWriter):
+    """NetCDF stays array-shaped: one (index, zone) variable per extracted variable in one file."""
+
+    def __init__(self, path, variables, zone_ids, units=None, index_name="Date"):
+        units = dict(units or {})
+        variables = list(variables)
+        super().__init__(path, variables[0], zone_ids, [], units=units.get(variables[0]), index_name=index_name)
+        for name in variables[1:]:
+            self._create_data(name, units.get(name))
+
+    def write(self, index, blocks):
+        start = self.rows_written
+        stop = start + len(index)
+        self.index_var[start:stop] = self._encode_index(index)
+        for name, block in blocks.items():
+            self.data_vars[name][start:stop, :] = np.asarray(block, dtype=np.float64)
+        self.rows_written = stop
+
+
+def open_tidy_writer(path, variables, zone_ids, units=None, index_name="Date"):
+    """Long-format writer for several variables, picked from the output extension."""
+    extension = os.path.splitext(path)[1].lower()
+    writer_class = {".parquet": TidyParquetWriter, ".nc": TidyNetCDFWriter}.get(extension, TidyCsvWriter)
+    return writer_class(path, variables, zone_ids, units=units, index_name=index_name)
+
+
+def open_writer(path, variable, zone_ids, columns, units=None, index_name="Date"):
+    """Pick the writer from the output extension (.csv, .parquet or .nc)."""
+    extension = os.path.splitext(path)[1].lower()
+    writer_class = {".parquet": ParquetWriter, ".nc": NetCDFWriter}.get(extension, CsvWriter)
+    return writer_class(path, variable, zone_ids, columns, units=units, index_name=index_name)
+
+
+def read_table(path):
+    """Load a CSV or Parquet extraction result as a DataFrame."""
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def write_table(df, path):
+    """Save a DataFrame as CSV or Parquet, by extension."""
+    if path.lower().endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+import rioxarray  # noqa: F401  (registers the .rio accessor)
+from rioxarray.exceptions import NoDataInBounds
+from shapely.geometry import mapping
+
+from projection import transform_xy
+from tracing import span, traced
+
+# Time steps read per block; a daily 1000x1000 float64 grid is ~8 MB per step
+DEFAULT_TIME_CHUNK = 64
+# Upper bound on the size of one (time, lat, lon) block read from disk
+DEFAULT_BLOCK_BYTES = 256 * 1024 ** 2
+MAX_TIME_CHUNK = 4096
+# Where the Extract Region tab takes its regions from
+REGION_SOURCES = ["Shapefile polygons", "Zone raster"]
+
+
+def time_chunk_for(n_cells, itemsize=8, budget=DEFAULT_BLOCK_BYTES):
+    """Number of time steps per block so a window of n_cells stays within the byte budget."""
+    return int(min(MAX_TIME_CHUNK, max(1, budget // max(1, n_cells * itemsize))))
+
+
+def iter_time_chunks(variable, chunk_size=DEFAULT_TIME_CHUNK, first=0, stop=None):
+    """Yield (start, stop) slices covering the time axis of a variable (or steps first..stop)."""
+    n_time = variable.sizes["time"] if stop is None else stop
+    for start in range(first, n_time, chunk_size):
+        yield start, min(start + chunk_size, n_time)
+
+
+def point_indices(variable, xs, ys):
+    """Nearest (row, col) grid indices for East/North coordinates."""
+    rows = pd.Index(variable["lat"].values).get_indexer(np.asarray(ys), method="nearest")
+    cols = pd.Index(variable["lon"].values).get_indexer(np.asarray(xs), method="nearest")
+    return rows, cols
+
+
+def iter_point_blocks(variable, rows, cols, chunk_size=None, first=0, stop=None):
+    """Yield (times, block[time, point]) for the given cells, one time chunk at a time.
+
+    ``first``/``stop`` limit the pass to a range of time steps (as in the other iterators).
+    """
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    lat_slice = slice(int(rows.min()), int(rows.max()) + 1)
+    lon_slice = slice(int(cols.min()), int(cols.max()) + 1)
+    window_cells = (lat_slice.stop - lat_slice.start) * (lon_slice.stop - lon_slice.start)
+    chunk_size = chunk_size or time_chunk_for(window_cells)
+
+    times = variable["time"].values
+    for start, end in iter_time_chunks(variable, chunk_size, first, stop):
+        block = variable.isel(time=slice(start, end), lat=lat_slice, lon=lon_slice).values
+        with span("reduce:points", steps=end - start, points=len(rows)):
+            block = block[:, rows - lat_slice.start, cols - lon_slice.start]
+        yield times[start:end], block
+
+
+@traced("mask:polygon")
+def polygon_mask(variable, geom, crs):
+    """Return (lat_slice, lon_slice, mask) of the cells inside a polygon.
+
+    The clip runs on a 2-D template of the grid, so no NetCDF data is read; the
+    slices bound the polygon so extraction only reads that window of the grid.
+    """
+    lat = variable["lat"].values
+    lon = variable["lon"].values
+    template = xr.DataArray(
+        np.ones((lat.size, lon.size), dtype=np.float32),
+        coords={"lat": lat, "lon": lon}, dims=("lat", "lon"),
+    )
+    template = template.rio.set_spatial_dims(x_dim="lon", y_dim="lat", inplace=False)
+    template = template.rio.write_crs(crs, inplace=False)
+    try:
+        clipped = template.rio.clip([mapping(geom)], crs=crs, drop=True)
+    except NoDataInBounds:
+        return None
+
+    lat_pos = pd.Index(lat).get_indexer(clipped["lat"].values)
+    lon_pos = pd.Index(lon).get_indexer(clipped["lon"].values)
+    lat_slice = slice(int(lat_pos.min()), int(lat_pos.max()) + 1)
+    lon_slice = slice(int(lon_pos.min()), int(lon_pos.max()) + 1)
+
+    # Re-expand the clip onto the bounding window (clip may reorder/drop rows)
+    mask = np.zeros((lat_slice.stop - lat_slice.start, lon_slice.stop - lon_slice.start), dtype=bool)
+    inside = clipped.notnull().values
+    mask[np.ix_(lat_pos - lat_slice.start, lon_pos - lon_slice.start)] = inside
+    return lat_slice, lon_slice, mask
+
+
+def masked_mean(block, mask):
+    """Mean over the masked cells of a (time, lat, lon) block, skipping NaNs."""
+    values = block[:, mask]
+    valid = ~np.isnan(values)
+    total = np.where(valid, values, 0.0).sum(axis=1, dtype=np.float64)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def iter_region_blocks(variable, regions, chunk_size=None, first=0, stop=None):
+    """Yield (times, block[time, region]) of area means for masks from polygon_mask.
+
+    The union window of all regions is read once per time chunk and every region
+    is reduced from it, so overlapping or neighbouring polygons share the I/O.
+    """
+    present = [region for region in regions if region is not None]
+    times = variable["time"].values
+    if not present:
+        for start, end in iter_time_chunks(variable, chunk_size or DEFAULT_TIME_CHUNK, first, stop):
+            yield times[start:end], np.full((end - start, len(regions)), np.nan)
+        return
+
+    lat_start = min(region[0].start for region in present)
+    lat_stop = max(region[0].stop for region in present)
+    lon_start = min(region[1].start for region in present)
+    lon_stop = max(region[1].stop for region in present)
+    chunk_size = chunk_size or time_chunk_for((lat_stop - lat_start) * (lon_stop - lon_start))
+
+    for start, end in iter_time_chunks(variable, chunk_size, first, stop):
+        window = variable.isel(
+            time=slice(start, end), lat=slice(lat_start, lat_stop), lon=slice(lon_start, lon_stop)
+        ).values
+        block = np.full((end - start, len(regions)), np.nan)
+        with span("reduce:regions", steps=end - start, regions=len(regions)):
+            for j, region in enumerate(regions):
+                if region is None:
+                    continue
+                lat_slice, lon_slice, mask = region
+                sub = window[
+                    :,
+                    lat_slice.start - lat_start:lat_slice.stop - lat_start,
+                    lon_slice.start - lon_start:lon_slice.stop - lon_start,
+                ]
+                block[:, j] = masked_mean(sub, mask)
+        yield times[start:end], block
+
+
+@traced("mask:zones")
+def zone_index(variable, zones, extent, zones_crs=None, grid_crs=None):
+    """Return (lat_slice, lon_slice, codes, zone_ids) for an integer zone-ID raster.
+
+    Each grid cell takes the zone of the raster cell under its centre; zones <= 0,
+    NaN and cells outside the raster belong to no zone. ``codes`` numbers the zones
+    0..n-1 over the bounding window of all zones (-1 elsewhere), or None is
+    returned when no grid cell falls in a zone.
+    """
+    xs, ys = np.meshgrid(variable["lon"].values, variable["lat"].values)
+    xs, ys = transform_xy(xs, ys, grid_crs, zones_crs)
+
+    zones = np.asarray(zones, dtype=np.float64)
+    n_rows, n_cols = zones.shape
+    left, right, bottom, top = extent
+    with np.errstate(invalid="ignore"):
+        rows = np.floor((top - ys) / (top - bottom) * n_rows)
+        cols = np.floor((xs - left) / (right - left) * n_cols)
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+    values = np.full(xs.shape, np.nan)
+    values[inside] = zones[rows[inside].astype(np.int64), cols[inside].astype(np.int64)]
+    with np.errstate(invalid="ignore"):
+        in_zone = values > 0
+    if not in_zone.any():
+        return None
+
+    zone_rows, zone_cols = np.nonzero(in_zone)
+    lat_slice = slice(int(zone_rows.min()), int(zone_rows.max()) + 1)
+    lon_slice = slice(int(zone_cols.min()), int(zone_cols.max()) + 1)
+    window = values[lat_slice, lon_slice]
+    member = in_zone[lat_slice, lon_slice]
+    zone_ids, inverse = np.unique(np.round(window[member]).astype(np.int64), return_inverse=True)
+    codes = np.full(window.shape, -1, dtype=np.int64)
+    codes[member] = inverse
+    return lat_slice, lon_slice, codes, zone_ids
+
+
+def zone_groups(index, zones=None):
+    """(lat_slice, lon_slice, cells, starts) for reducing a range of zones from their own window.
+
+    ``cells`` index that window (flattened) sorted by zone and ``starts`` holds each
+    zone's first position in ``cells``, ready for np.add.reduceat.
+    """
+    lat_slice, lon_slice, codes, zone_ids = index
+    zones = zones or slice(0, len(zone_ids))
+    flat = codes.ravel()
+    cells = np.flatnonzero((flat >= zones.start) & (flat < zones.stop))
+    order = cells[np.argsort(flat[cells], kind="stable")]
+    starts = np.searchsorted(flat[order], np.arange(zones.start, zones.stop))
+
+    rows, cols = np.divmod(order, codes.shape[1])
+    row_start, row_stop = int(rows.min()), int(rows.max()) + 1
+    col_start, col_stop = int(cols.min()), int(cols.max()) + 1
+    local = (rows - row_start) * (col_stop - col_start) + (cols - col_start)
+    return (
+        slice(lat_slice.start + row_start, lat_slice.start + row_stop),
+        slice(lon_slice.start + col_start, lon_slice.start + col_stop),
+        local, starts,
+    )
+
+
+def iter_zone_blocks(variable, index, chunk_size=None, first=0, stop=None, zones=None, groups=None):
+    """Yield (times, block[time, zone]) of zone means for an index from zone_index.
+
+    Cells are sorted by zone once, so each time chunk is reduced for every zone in
+    one grouped np.add.reduceat rather than a mask and a mean per zone. ``zones``
+    limits the pass to a range of zone positions, read from just their window;
+    ``groups`` is a zone_groups result computed earlier for the same range.
+    """
+    lat_slice, lon_slice, cells, starts = groups or zone_groups(index, zones)
+    chunk_size = chunk_size or time_chunk_for(
+        (lat_slice.stop - lat_slice.start) * (lon_slice.stop - lon_slice.start)
+    )
+
+    times = variable["time"].values
+    for start, end in iter_time_chunks(variable, chunk_size, first, stop):
+        window = variable.isel(time=slice(start, end), lat=lat_slice, lon=lon_slice).values
+        with span("reduce:zones", steps=end - start, zones=len(starts)):
+            values = window.reshape(end - start, -1)[:, cells]
+            valid = ~np.isnan(values)
+            total = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=1, dtype=np.float64)
+            count = np.add.reduceat(valid.astype(np.int64), starts, axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                block = np.where(count > 0, total / count, np.nan)
+        yield times[start:end], block
+
+
+def iter_variable_blocks(variables, make_blocks):
+    """Yield (times, {name: block[time, zone]}) advancing all variables one time chunk at a time.
+
+    ``make_blocks(variable)`` is one of the iterators above bound to an index built
+    once (points, masks or zones), so every variable shares it. The window size and
+    therefore the time chunks are the same for all variables, so the blocks line up.
+    """
+    iterators = {name: make_blocks(variable) for name, variable in variables.items()}
+    for chunks in zip(*iterators.values()):
+        yield chunks[0][0], {name: block for name, (_, block) in zip(iterators, chunks)}
@@ -0,0 +1,391 @@
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import signal
+import sqlite3
+import traceback
+import multiprocessing
+import numpy as np
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from cache_utils import get_cache_dir
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from export_writers import open_tidy_writer, open_writer
+from extraction import time_chunk_for, zone_groups
+from parallel_extraction import extract_range, iter_parallel_blocks, window_cells
+from temporal_aggregation import StreamingAggregator
+from tracing import span
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT,
+    title TEXT,
+    priority INTEGER DEFAULT 0,
+    state TEXT DEFAULT 'queued',
+    done INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    checkpoint TEXT DEFAULT '{}',
+    message TEXT DEFAULT '',
+    cancel INTEGER DEFAULT 0,
+    created REAL,
+    started REAL,
+    finished REAL
+);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """Jobs, their progress and checkpoints in SQLite, shared by the app and the job processes.
+
+    Job parameters (which may hold index arrays) are pickled into each job's folder,
+    next to the partial results a job keeps until it finishes.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(get_cache_dir(), "jobs.sqlite")
+        self.connection = sqlite3.connect(self.db_path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def folder(self, job_id):
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "jobs", str(job_id))
+
+    def add(self, kind, title, params, priority=0):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO jobs (kind, title, priority, created) VALUES (?, ?, ?, ?)",
+                (kind, title, priority, time.time()),
+            )
+        job_id = cursor.lastrowid
+        os.makedirs(self.folder(job_id), exist_ok=True)
+        with open(os.path.join(self.folder(job_id), "params.pkl"), "wb") as f:
+            pickle.dump(params, f)
+        return job_id
+
+    def params(self, job_id):
+        with open(os.path.join(self.folder(job_id), "params.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def get(self, job_id):
+        return self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def jobs(self):
+        return self.connection.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+
+    def next_queued(self):
+        """Highest-priority queued job, oldest first among equals."""
+        return self.connection.execute(
+            "SELECT * FROM jobs WHERE state = 'queued' ORDER BY priority DESC, id LIMIT 1"
+        ).fetchone()
+
+    def update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.connection:
+            self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def checkpoint(self, job_id):
+        return json.loads(self.get(job_id)["checkpoint"] or "{}")
+
+    def report(self, job_id, done, total, checkpoint=None, message=None):
+        """Record progress (and the checkpoint to resume from); raises JobCancelled if cancel was requested."""
+        fields = {"done": done, "total": total}
+        if checkpoint is not None:
+            fields["checkpoint"] = json.dumps(checkpoint)
+        if message is not None:
+            fields["message"] = message
+        self.update(job_id, **fields)
+        if self.get(job_id)["cancel"]:
+            raise JobCancelled()
+
+    def requeue_interrupted(self):
+        """Queue jobs that were running when the app last closed; they resume from their checkpoint."""
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+
+    def remove(self, job_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self.folder(job_id), ignore_errors=True)
+
+
+def _part_path(folder, index):
+    return os.path.join(folder, f"part_{index:06d}.pkl")
+
+
+def write_extraction_output(params, parts):
+    """Write extracted (times, {name: block}) parts like DataProcessor.save_extraction does."""
+    names = params["variables"]
+    zone_ids = params["zone_ids"]
+    settings = params["settings"]
+    units = params["units"]
+    out_path = params["out_path"]
+    if len(names) == 1:
+        columns = [f"{names[0]}_{suffix}" for suffix in params["suffixes"]]
+
+        def open_output(index_name="Date"):
+            return open_writer(out_path, names[0], zone_ids, columns, units[names[0]], index_name=index_name)
+
+        def write(writer, index, blocks):
+            writer.write(index, blocks[names[0]])
+    else:
+        columns = [str(zone) for zone in zone_ids]
+
+        def open_output(index_name="Date"):
+            return open_tidy_writer(out_path, names, zone_ids, units, index_name=index_name)
+
+        def write(writer, index, blocks):
+            writer.write(index, blocks)
+
+    frequency, _, output = settings
+    if frequency == "Native" and output == "Values":
+        with open_output() as writer:
+            for times, blocks in parts:
+                write(writer, times, blocks)
+        return
+
+    aggregators = {name: StreamingAggregator(columns, *settings) for name in names}
+    for times, blocks in parts:
+        for name in names:
+            aggregators[name].update(times, blocks[name])
+    tables = {name: aggregator.result() for name, aggregator in aggregators.items()}
+    first = tables[names[0]]
+    with open_output(first.columns[0]) as writer:
+        write(writer, first.iloc[:, 0].values, {name: table.iloc[:, 1:].to_numpy() for name, table in tables.items()})
+
+
+def _regroup(blocks, ranges):
+    """Re-cut a time-ordered stream of (times, {name: block}) into one part per (first, stop) range."""
+    pending = []
+    for first, stop in ranges:
+        needed = stop - first
+        while sum(len(times) for times, _ in pending) < needed:
+            pending.append(next(blocks))
+        times = np.concatenate([part_times for part_times, _ in pending])
+        names = pending[0][1].keys()
+        joined = {name: np.concatenate([part[name] for _, part in pending]) for name in names}
+        yield times[:needed], {name: block[:needed] for name, block in joined.items()}
+        pending = [(times[needed:], {name: block[needed:] for name, block in joined.items()})] if len(times) > needed else []
+
+
+def run_extraction_job(store, job_id, params):
+    """Extract chunk by chunk into part files, then write the output from the parts.
+
+    Each finished chunk is the job's checkpoint, so an interrupted job carries on
+    from the next chunk after a restart instead of starting over. With more than one
+    worker the chunks are computed by the extraction process pool.
+    """
+    registry = DerivedVariableRegistry.from_spec(DatasetManager(chunk_cache_bytes=0), params["registry_spec"])
+    variables = {name: registry.open(params["path"], name) for name in params["variables"]}
+    method, index = params["method"], params["index"]
+    groups = zone_groups(index) if method == "zones" else None
+    n_time = next(iter(variables.values())).sizes["time"]
+    step = time_chunk_for(window_cells(method, index))
+    ranges = [(start, min(start + step, n_time)) for start in range(0, n_time, step)]
+    total = len(ranges) + 1  # Writing the output counts as the last step
+
+    folder = store.folder(job_id)
+    done = store.checkpoint(job_id).get("chunks", 0)
+    if done >= total:
+        return  # Interrupted after the output was written
+    store.report(job_id, done, total, message="Extracting")
+    workers = params.get("workers", 1)
+    if workers > 1 and done < len(ranges):
+        pooled = iter_parallel_blocks(params["path"], params["registry_spec"], params["variables"],
+                                      method, index, n_time, workers, first=ranges[done][0])
+        computed = _regroup(pooled, ranges[done:])
+    else:
+        computed = (extract_range(variables, method, index, *ranges[i], groups=groups)
+                    for i in range(done, len(ranges)))
+    for i, part in enumerate(computed, start=done):
+        with open(_part_path(folder, i) + ".tmp", "wb") as f:
+            pickle.dump(part, f)
+        os.replace(_part_path(folder, i) + ".tmp", _part_path(folder, i))
+        store.report(job_id, i + 1, total, checkpoint={"chunks": i + 1})
+
+    def parts():
+        for i in range(len(ranges)):
+            with open(_part_path(folder, i), "rb") as f:
+                yield pickle.load(f)
+
+    write_extraction_output(params, parts())
+    store.report(job_id, total, total, checkpoint={"chunks": total}, message=f"Saved {params['out_path']}")
+    for i in range(len(ranges)):
+        os.remove(_part_path(folder, i))
+
+
+def run_model_job(store, job_id, params):
+    """Run DRYP with its console output in the job's log (a model run restarts from the beginning)."""
+    from cuwalid.dryp.main_DRYP import run_DRYP
+    from preflight import preflight
+    log_path = os.path.join(store.folder(job_id), "run.log")
+    # Inputs may have changed since the run was queued; re-checking unchanged files is only a stat each
+    report = preflight(params["json_path"])
+    with open(log_path, "a") as log:
+        log.write(report.text() + "\n")
+    if not report.ok:
+        raise RuntimeError(f"Input check failed: {report.errors[0]} ({len(report.errors)} problem(s); see {log_path})")
+    store.report(job_id, 0, 0, message=f"Running; log: {log_path}")
+    with open(log_path, "a") as log:
+        sys.stdout = sys.stderr = log
+        try:
+            run_DRYP(params["json_path"])
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    store.report(job_id, 1, 1, message=f"Finished; log: {log_path}")
+
+
+def run_render_job(store, job_id, params):
+    """Render the frames of a batch map spec; frames already rendered are skipped on a resume."""
+    from batch_render import render_maps
+
+    def progress(done, total):
+        store.report(job_id, done, total, message="Rendering")
+
+    rendered, skipped = render_maps(params, progress)
+    store.report(job_id, 1, 1, message=f"Rendered {rendered} maps ({skipped} unchanged) in {params['output']}")
+
+
+JOB_RUNNERS = {"extraction": run_extraction_job, "model": run_model_job, "render": run_render_job}
+
+
+def _stop_with_workers(signum, frame):
+    """SIGTERM in a job process: stop its own worker processes (e.g. a render pool) with it."""
+    for child in multiprocessing.active_children():
+        child.terminate()
+    os._exit(128 + signum)
+
+
+def run_job(db_path, job_id):
+    """Entry point of a job's process: run the job and record how it ended."""
+    signal.signal(signal.SIGTERM, _stop_with_workers)
+    store = JobStore(db_path)
+    try:
+        kind = store.get(job_id)["kind"]
+        with span(f"job:{kind}", job=job_id):
+            JOB_RUNNERS[kind](store, job_id, store.params(job_id))
+        store.update(job_id, state="done", finished=time.time())
+    except JobCancelled:
+        store.update(job_id, state="cancelled", finished=time.time(), message="Cancelled")
+    except Exception as e:
+        store.update(job_id, state="failed", finished=time.time(), message=str(e))
+        traceback.print_exc()
+    finally:
+        store.close()
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m {seconds % 60:02d}s" if seconds >= 60 else f"{seconds}s"
+
+
+class JobQueue(QObject):
+    """Runs queued jobs by priority, each in its own process, at most ``max_running`` at a time.
+
+    State lives in the JobStore, so jobs left unfinished when the app closed are
+    queued again when it next starts and resume from their checkpoint.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, store=None, max_running=1):
+        super().__init__()
+        self.store = store or JobStore()
+        self.max_running = max_running
+        self.processes = {}  # job id -> Process
+        self.started = {}  # job id -> (start time, steps done at start) for the ETA
+        # Spawned, not forked: job processes open their own HDF5 handles
+        self.context = multiprocessing.get_context("spawn")
+        self.store.requeue_interrupted()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(500)
+
+    def submit(self, kind, title, params, priority=0):
+        job_id = self.store.add(kind, title, params, priority)
+        self.poll()
+        return job_id
+
+    def set_priority(self, job_id, priority):
+        self.store.update(job_id, priority=priority)
+        self.changed.emit()
+
+    def cancel(self, job_id):
+        job = self.store.get(job_id)
+        if job["state"] == "queued":
+            self.store.update(job_id, state="cancelled", finished=time.time(), message="Cancelled")
+        elif job["state"] == "running":
+            # Chunked jobs stop after their current chunk; a model run can only be stopped outright
+            self.store.update(job_id, cancel=1)
+            if job["kind"] == "model" and job_id in self.processes:
+                self.processes[job_id].terminate()
+        self.changed.emit()
+
+    def remove_finished(self):
+        for job in self.store.jobs():
+            if job["state"] in FINISHED_STATES:
+                self.store.remove(job["id"])
+        self.changed.emit()
+
+    def eta(self, job):
+        """Seconds left for a running job from its progress this session, or None if unknown."""
+        if job["id"] not in self.started or job["total"] <= 0:
+            return None
+        start_time, start_done = self.started[job["id"]]
+        if job["done"] <= start_done:
+            return None
+        rate = (job["done"] - start_done) / max(1e-6, time.time() - start_time)
+        return (job["total"] - job["done"]) / rate
+
+    def poll(self):
+        for job_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.processes[job_id]
+            self.started.pop(job_id, None)
+            job = self.store.get(job_id)
+            if job is not None and job["state"] == "running":
+                # The process ended without recording an outcome: terminated or crashed
+                state = "cancelled" if job["cancel"] else "failed"
+                self.store.update(job_id, state=state, finished=time.time(),
+                                  message="Cancelled" if job["cancel"] else f"Exited with code {process.exitcode}")
+
+        while len(self.processes) < self.max_running:
+            job = self.store.next_queued()
+            if job is None:
+                break
+            self.store.update(job["id"], state="running", started=time.time(), cancel=0)
+            # Not daemonic, so a job can run its own worker pool (render jobs with several workers);
+            # cancel() and shutdown() stop job processes explicitly instead
+            process = self.context.Process(target=run_job, args=(self.store.db_path, job["id"]), daemon=False)
+            process.start()
+            self.processes[job["id"]] = process
+            self.started[job["id"]] = (time.time(), job["done"])
+        self.changed.emit()
+
+    def shutdown(self):
+        """Stop running jobs and leave them queued; they resume from their checkpoint next time."""
+        self.timer.stop()
+        for job_id, process in self.processes.items():
+            process.terminate()
+            process.join()
+            self.store.update(job_id, state="queued")
+        self.processes.clear()
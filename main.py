@@ -1,9 +1,7 @@
 import os
 import sys
+import multiprocessing
 import traceback
-from PyQt6.QtWidgets import QApplication, QMessageBox
-from PyQt6.QtGui import QIcon
-from ui.main_window import CuwalidAPP
 
 # Get the correct log path for error logging
 def get_log_path():
@@ -24,6 +22,7 @@ def log_error(error_message):
 
 def show_critical_error(message):
     """Show an error message box with a detailed error."""
+    from PyQt6.QtWidgets import QMessageBox
     msg_box = QMessageBox()
     msg_box.setWindowTitle("Fatal Error")
     msg_box.setText("The application encountered a critical error.")
@@ -32,6 +31,16 @@ def show_critical_error(message):
 
 # Main app logic
 def main():
+    # Summary maps and extractions can use worker processes; needed for the compiled exe
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == "--render-maps":
+        # Headless batch rendering from a saved render spec, no window
+        from batch_render import main as render_main
+        sys.exit(render_main(sys.argv[2:]))
+    # Qt and the UI are imported only for the window, so batch rendering runs without a GUI install
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtGui import QIcon
+    from ui.main_window import CuwalidAPP
     app = QApplication(sys.argv)
 
     try:
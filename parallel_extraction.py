@@ -0,0 +1,192 @@
+import math
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from extraction import iter_point_blocks, iter_region_blocks, iter_zone_blocks, time_chunk_for, zone_groups
+from tracing import span
+
+# Zone sets larger than this are split across tasks by zone as well as by time
+ZONES_PER_TASK = 1024
+# Time tasks per worker, so a slow task doesn't leave the other workers idle at the end
+TASKS_PER_WORKER = 4
+
+
+class SharedArray:
+    """A numpy array in a named shared-memory block; workers attach by name instead of unpickling a copy."""
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.owner = owner
+        self.array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def publish(cls, array):
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        shared = cls(shm, array.shape, array.dtype, owner=True)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def spec(self):
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def pack_index(method, index):
+    """Split an extraction index into ({name: array} for shared memory, small picklable metadata)."""
+    if method == "points":
+        rows, cols = index
+        return {"rows": np.asarray(rows), "cols": np.asarray(cols)}, None
+    if method == "zones":
+        lat_slice, lon_slice, codes, zone_ids = index
+        return {"codes": codes, "zone_ids": zone_ids}, (lat_slice, lon_slice)
+    if method == "regions":
+        present = [region for region in index if region is not None]
+        masks = np.concatenate([mask.ravel() for _, _, mask in present]) if present else np.zeros(1, dtype=bool)
+        meta = [None if region is None else (region[0], region[1], region[2].shape) for region in index]
+        return {"masks": masks}, meta
+    raise ValueError(f"Unknown extraction method: {method}")
+
+
+def unpack_index(method, arrays, meta):
+    if method == "points":
+        return arrays["rows"], arrays["cols"]
+    if method == "zones":
+        return meta[0], meta[1], arrays["codes"], arrays["zone_ids"]
+    regions = []
+    offset = 0
+    for region in meta:
+        if region is None:
+            regions.append(None)
+            continue
+        lat_slice, lon_slice, shape = region
+        size = shape[0] * shape[1]
+        regions.append((lat_slice, lon_slice, arrays["masks"][offset:offset + size].reshape(shape)))
+        offset += size
+    return regions
+
+
+def window_cells(method, index):
+    """Cells in the window one time chunk reads, which sets the time-chunk length."""
+    if method == "points":
+        rows, cols = (np.asarray(values) for values in index)
+        return int((rows.max() - rows.min() + 1) * (cols.max() - cols.min() + 1))
+    if method == "zones":
+        return int(index[2].size)
+    present = [region for region in index if region is not None]
+    if not present:
+        return 1
+    rows = max(r[0].stop for r in present) - min(r[0].start for r in present)
+    cols = max(r[1].stop for r in present) - min(r[1].start for r in present)
+    return int(rows * cols)
+
+
+_worker = {}
+
+
+def _init_worker(path, registry_spec, method, specs, meta):
+    shared = {name: SharedArray.attach(spec) for name, spec in specs.items()}
+    _worker.update(
+        path=path,
+        method=method,
+        shared=shared,  # Keeps the mappings open for the worker's lifetime
+        index=unpack_index(method, {name: array.array for name, array in shared.items()}, meta),
+        registry=DerivedVariableRegistry.from_spec(DatasetManager(chunk_cache_bytes=0), registry_spec),
+        groups={},
+    )
+
+
+def index_blocks(variable, method, index, first, stop, zones=None, groups=None):
+    """The extraction iterator for ``method`` over time steps first..stop of one variable."""
+    if method == "points":
+        return iter_point_blocks(variable, *index, first=first, stop=stop)
+    if method == "regions":
+        return iter_region_blocks(variable, index, first=first, stop=stop)
+    return iter_zone_blocks(variable, index, first=first, stop=stop, zones=zones, groups=groups)
+
+
+def extract_range(variables, method, index, first, stop, zones=None, groups=None):
+    """(times, {name: block[time, zone]}) for time steps first..stop of every variable."""
+    times = None
+    blocks = {}
+    for name, variable in variables.items():
+        parts = list(index_blocks(variable, method, index, first, stop, zones, groups))
+        times = np.concatenate([part_times for part_times, _ in parts])
+        blocks[name] = np.concatenate([block for _, block in parts])
+    return times, blocks
+
+
+def extract_task(var_names, first, stop, zones=None):
+    """Extract time steps first..stop (and a range of zones) of every variable (runs in a worker)."""
+    method, index = _worker["method"], _worker["index"]
+    groups = None
+    if method == "zones":
+        key = (zones.start, zones.stop) if zones else None
+        if key not in _worker["groups"]:
+            _worker["groups"][key] = zone_groups(index, zones)  # Sorting cells by zone happens once per worker
+        groups = _worker["groups"][key]
+    variables = {name: _worker["registry"].open(_worker["path"], name) for name in var_names}
+    with span("worker:extract task", first=first, stop=stop):
+        return extract_range(variables, method, index, first, stop, zones, groups)
+
+
+def iter_parallel_blocks(path, registry_spec, var_names, method, index, n_time, workers, first=0):
+    """Yield (times, {name: block[time, zone]}) like iter_variable_blocks, computed by a process pool.
+
+    ``first`` skips the time steps before it (a resumed job).
+
+    The index lives in shared memory for the duration of the job. The time axis is
+    split into ranges (and large zone sets into groups of ZONES_PER_TASK); the pool
+    returns results in task order, so blocks come out in time order and zone
+    groups are joined side by side.
+    """
+    arrays, meta = pack_index(method, index)
+    shared = {name: SharedArray.publish(array) for name, array in arrays.items()}
+    try:
+        step = min(time_chunk_for(window_cells(method, index)),
+                   math.ceil((n_time - first) / (workers * TASKS_PER_WORKER)))
+        time_ranges = [(start, min(start + step, n_time)) for start in range(first, n_time, max(1, step))]
+        zone_ranges = [None]
+        if method == "zones" and len(index[3]) > ZONES_PER_TASK:
+            n_zones = len(index[3])
+            zone_ranges = [
+                slice(start, min(start + ZONES_PER_TASK, n_zones)) for start in range(0, n_zones, ZONES_PER_TASK)
+            ]
+        tasks = [(first, stop, zones) for first, stop in time_ranges for zones in zone_ranges]
+
+        # Spawned workers open their own file handles (HDF5 handles don't survive a fork)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(path, registry_spec, method, {name: array.spec for name, array in shared.items()}, meta),
+        ) as pool:
+            results = pool.map(extract_task, itertools.repeat(var_names), *zip(*tasks))
+            try:
+                for _ in time_ranges:
+                    parts = [next(results) for _ in zone_ranges]
+                    yield parts[0][0], {
+                        name: np.concatenate([blocks[name] for _, blocks in parts], axis=1) for name in var_names
+                    }
+            except BaseException:
+                # Closed early (e.g. a cancelled job): drop the tasks not yet started
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        for array in shared.values():
+            array.close()
@@ -0,0 +1,200 @@
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import Collection
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTabWidget
+
+from tracing import span, tracer
+
+
+def _artists(value):
+    return value if isinstance(value, list) else [value]
+
+
+class PlotView:
+    """One persistent embedded figure whose artists are kept by key and updated in place.
+
+    Re-plotting with new data calls set_data/set_offsets/set_clim on the existing
+    artists instead of rebuilding the figure, so a redraw only costs what changed.
+    """
+
+    def __init__(self, figsize=None, toolbar=True):
+        self.figure = Figure(figsize=figsize)
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.widget = QWidget()
+        self.layout = QVBoxLayout(self.widget)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        if toolbar:
+            self.layout.addWidget(NavigationToolbar2QT(self.canvas, self.widget))
+        self.layout.addWidget(self.canvas, 1)
+        self.saved_limits = None  # (xlim, ylim) from a restored session, applied on the first draw
+        self.reset()
+
+    def reset(self):
+        """Drop every artist and start from an empty axes (e.g. when the x-axis type changes)."""
+        self.figure.clear()
+        self.ax = self.figure.add_subplot()
+        self.twin_ax = None
+        self.artists = {}
+        self.layers = {}  # key -> token of the inputs the layer was built from
+        self.colorbar = None
+
+    def twin(self):
+        """Right-hand y axis sharing the x axis, created on first use."""
+        if self.twin_ax is None:
+            self.twin_ax = self.ax.twinx()
+        self.twin_ax.set_visible(True)
+        return self.twin_ax
+
+    def image(self, key, data, extent=None, cmap="viridis", origin="upper", vmin=None, vmax=None):
+        artist = self.artists.get(key)
+        if artist is not None and artist.origin != origin:
+            self.remove(key)  # An image's origin is fixed when it is created
+            artist = None
+        if artist is None:
+            artist = self.ax.imshow(data, cmap=cmap, extent=extent, origin=origin, vmin=vmin, vmax=vmax)
+            self.artists[key] = artist
+        else:
+            artist.set_data(data)
+            artist.set_cmap(cmap)
+            rows, cols = np.shape(data)[:2]
+            if extent is None:
+                # imshow's default extent: cell centres on integer positions
+                top, bottom = (rows - 0.5, -0.5) if origin == "lower" else (-0.5, rows - 0.5)
+                extent = (-0.5, cols - 0.5, bottom, top)
+            artist.set_extent(extent)
+            if vmin is None or vmax is None:
+                artist.autoscale()
+            else:
+                artist.set_clim(vmin, vmax)
+        artist.set_visible(True)
+        return artist
+
+    def colorbar_for(self, artist, label=None):
+        if self.colorbar is None:
+            self.colorbar = self.figure.colorbar(artist, ax=self.ax)
+        elif self.colorbar.mappable is not artist:
+            self.colorbar.update_normal(artist)
+        self.colorbar.ax.set_visible(True)
+        self.colorbar.set_label(label or "")
+        return self.colorbar
+
+    def line(self, key, x, y, ax=None, **style):
+        artist = self.artists.get(key)
+        if artist is None:
+            (artist,) = (ax or self.ax).plot(x, y, **style)
+            self.artists[key] = artist
+        else:
+            artist.set_data(x, y)
+            artist.set(**style)
+        artist.set_visible(True)
+        return artist
+
+    def scatter(self, key, x, y, **style):
+        artist = self.artists.get(key)
+        offsets = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+        if artist is None:
+            artist = self.ax.scatter(offsets[:, 0], offsets[:, 1], **style)
+            self.artists[key] = artist
+        else:
+            artist.set_offsets(offsets)
+        artist.set_visible(True)
+        return artist
+
+    def layer(self, key, token, build):
+        """Static layer drawn by ``build(ax)``; rebuilt only when ``token`` (its inputs) changes."""
+        if key in self.artists and self.layers.get(key) != token:
+            self.remove(key)
+        if key not in self.artists:
+            before = set(self.ax.get_children())
+            build(self.ax)
+            self.artists[key] = [child for child in self.ax.get_children() if child not in before]
+            self.layers[key] = token
+        for artist in self.artists[key]:
+            artist.set_visible(True)
+        return self.artists[key]
+
+    def remove(self, key):
+        for artist in _artists(self.artists.pop(key, [])):
+            artist.remove()
+        self.layers.pop(key, None)
+
+    def show_only(self, keys):
+        """Hide every artist whose key isn't in ``keys`` (hidden artists stay ready for reuse)."""
+        for key, value in self.artists.items():
+            for artist in _artists(value):
+                artist.set_visible(key in keys)
+
+    def legend(self, ax=None, **kwargs):
+        ax = ax or self.ax
+        # Layers (lists, e.g. shapefile outlines or text labels) never get legend entries
+        handles = [
+            artist for artist in self.artists.values()
+            if not isinstance(artist, list) and artist.axes is ax and artist.get_visible()
+            and isinstance(artist.get_label(), str) and not artist.get_label().startswith("_")
+        ]
+        if handles:
+            ax.legend(handles=handles, **kwargs)
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
+
+    def rescale(self, ax=None):
+        """Fit the axes to the visible artists (collections included, which relim skips)."""
+        ax = ax or self.ax
+        ax.relim(visible_only=True)
+        for artist in ax.collections:
+            if artist.get_visible() and isinstance(artist, Collection):
+                ax.update_datalim(artist.get_datalim(ax.transData))
+        ax.autoscale_view()
+
+    def limits(self):
+        return list(self.ax.get_xlim()), list(self.ax.get_ylim())
+
+    def draw(self):
+        if self.saved_limits is not None:
+            xlim, ylim = self.saved_limits
+            self.ax.set_xlim(xlim)
+            self.ax.set_ylim(ylim)
+            self.saved_limits = None
+        if tracer.enabled:
+            # Render now rather than on the next event loop pass, so the span times the drawing
+            with span("render:figure", title=self.ax.get_title()):
+                self.canvas.draw()
+        else:
+            self.canvas.draw_idle()
+
+
+class PlotWorkspace(QTabWidget):
+    """Tabbed set of persistent PlotViews, created on first use and reused afterwards."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setDocumentMode(True)
+        self.views = {}
+        self.saved_limits = {}  # name -> (xlim, ylim) for views not created yet
+
+    def view(self, name, **kwargs):
+        if name not in self.views:
+            self.views[name] = PlotView(**kwargs)
+            self.views[name].saved_limits = self.saved_limits.pop(name, None)
+            self.addTab(self.views[name].widget, name)
+        return self.views[name]
+
+    def limits(self):
+        """(xlim, ylim) of every view that has something drawn, by name."""
+        return {name: view.limits() for name, view in self.views.items() if view.artists}
+
+    def restore_limits(self, limits):
+        """Apply saved axis limits now to open views, or on their first draw to views opened later."""
+        self.saved_limits = {}
+        for name, value in limits.items():
+            if name in self.views and self.views[name].artists:
+                self.views[name].saved_limits = value
+                self.views[name].draw()
+            else:
+                self.saved_limits[name] = value
+
+    def show_view(self, name):
+        view = self.view(name)
+        self.setCurrentWidget(view.widget)
+        return view
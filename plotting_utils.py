@@ -1,30 +1,59 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from PyQt6.QtWidgets import QSlider, QVBoxLayout
+import numpy as np
+from PyQt6.QtWidgets import QSlider, QLabel
 from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtWidgets import QDialog
 import matplotlib.patheffects as path_effects
 import pandas as pd
 import itertools
 
+from plot_workspace import PlotView
+from probe import CellProbe
+from projection import dataset_crs, parse_crs, raster_centres, reproject_gdf, same_crs, warp_index
+from stats_sketch import StatsSketch, cached_sketch, robust_limits
+from temporal_aggregation import aggregate_dataframe
+from tracing import traced
+
 class Plotter:
+    """Draws into the persistent views of the embedded plot workspace (ui.plot_workspace).
+
+    Each view keeps its figure and artists, so re-plotting updates data in place
+    rather than rebuilding figures from scratch.
+    """
+
     def __init__(self, ui):
         self.ui = ui
+        self.probe = None
+        self.netcdf_state = None  # (path, variable) shown in the NetCDF view
+        self.netcdf_warp = None  # WarpIndex when NetCDF frames are shown in another CRS
+        self.timeseries_x = None  # x column of the timeseries view; a new kind resets the axes
+
+    def show_view(self, name):
+        self.ui.tabs.setCurrentWidget(self.ui.plots_tab)
+        return self.ui.plot_workspace.show_view(name)
+
+    def display_crs(self):
+        """CRS typed in the display CRS box, or None (blank or not understood)."""
+        try:
+            return parse_crs(self.ui.display_crs_input.text())
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Unknown display CRS, drawing layers in their own CRS: {e}")
+            return None
+
+    @staticmethod
+    def axis_labels(ax, crs):
+        geographic = crs is not None and crs.is_geographic
+        ax.set_xlabel("Longitude" if geographic else "East (m)")
+        ax.set_ylabel("Latitude" if geographic else "North (m)")
 
     def plot_raster(self):
         try:
-            fig, ax = plt.subplots()
-            cax = ax.imshow(self.ui.raster_data[0], cmap='terrain', extent=self.ui.raster_data[1], origin="upper")
-            plt.colorbar(cax)
-            plt.show()
+            self.update_map_view(raster=True)
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error plotting DEM: {e}")
             print(f"Error plotting DEM: {e}")
 
     def plot_shapefile(self, gdf):
         try:
-            gdf.plot()
-            plt.show()
+            self.update_map_view(shapefile=True, shapefile_data=gdf)
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error plotting shapefile: {e}")
 
@@ -32,27 +61,85 @@ class Plotter:
         if df is None or df.empty:
             self.ui.status_bar.showMessage("No XY data to plot.")
             return
-        
-        try:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.scatter(df["East"], df["North"], color='red', marker='o', label="XY Data Points")
 
-            # If a third column exists, use it for labels
-            if label_column:
-                for i, row in df.iterrows():
-                    ax.text(row["East"], row["North"], str(row[label_column]), fontsize=9, ha='right', va='bottom')
-
-            ax.set_xlabel("East (m)")
-            ax.set_ylabel("North (m)")
-            ax.set_title("Scatter Plot of XY Data")
-            ax.legend()
-            ax.grid(True)
-
-            plt.show()
+        try:
+            self.update_map_view(xy=True, xy_data=df, label_column=label_column)
             self.ui.status_bar.showMessage("XY data plotted successfully.")
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error plotting XY data: {e}")
 
+    def plot_selected_files(self):
+        self.update_map_view(
+            raster=self.ui.raster_checkbox.isChecked(),
+            shapefile=self.ui.shapefile_checkbox.isChecked(),
+            xy=self.ui.xy_checkbox.isChecked(),
+        )
+        self.ui.status_bar.showMessage("Plotted selected files together.")
+
+    @traced("app:plot map")
+    def update_map_view(self, raster=False, shapefile=False, xy=False,
+                        shapefile_data=None, xy_data=None, label_column=None):
+        """Show the chosen raster/shapefile/XY layers on the map view.
+
+        Layers are built once per input and afterwards only shown or hidden, so
+        toggling a layer doesn't re-render the raster or the shapefile. Everything is
+        drawn in one display CRS: the one typed by the user, else the raster's, else
+        the shapefile's; the raster is warped through a cached index when it differs.
+        """
+        view = self.show_view("Map")
+        visible = []
+        has_raster = raster and getattr(self.ui, "raster_data", None)
+        gdf = shapefile_data if shapefile_data is not None else self.ui.shapefile_data
+        display = self.display_crs() or (self.ui.raster_crs if has_raster else None)
+        if display is None and shapefile and gdf is not None and gdf.crs is not None:
+            display = parse_crs(gdf.crs)
+
+        if has_raster:
+            raster_data, extent = self.ui.raster_data
+            if not same_crs(self.ui.raster_crs, display):
+                xs, ys = raster_centres(raster_data, extent)
+                index = warp_index(xs, ys, self.ui.raster_crs, display, shape=np.shape(raster_data))
+                raster_data, extent = index.warp(raster_data), index.extent
+            image = view.image("raster", raster_data, extent=extent, cmap="terrain", origin="upper")
+            view.colorbar_for(image, "Elevation")
+            visible.append("raster")
+
+        if shapefile and gdf is not None:
+            # A shapefile without a .prj is taken to be in the display CRS already
+            token = (id(gdf), display.to_wkt() if display is not None else None)
+            view.layer("shapefile", token, lambda ax: reproject_gdf(gdf, display).plot(
+                ax=ax, edgecolor="black", facecolor="none"))
+            visible.append("shapefile")
+
+        # XY tables carry no CRS, so their East/North are drawn as given
+        df = xy_data if xy_data is not None else self.ui.xy_data
+        labels = label_column or getattr(self.ui, "xy_labels", None)
+        if xy and df is not None:
+            view.scatter("xy", df["East"], df["North"], color='red', marker='o', label="XY Data Points")
+            visible.append("xy")
+            if labels:
+                view.layer("xy_labels", (id(df), labels), lambda ax: self._label_points(ax, df, labels))
+                visible.append("xy_labels")
+
+        view.show_only(visible)
+        if view.colorbar is not None:
+            view.colorbar.ax.set_visible("raster" in visible)
+        self.axis_labels(view.ax, display)
+        view.ax.set_title("Combined Hydrological Data Visualization")
+        view.ax.grid(True)
+        view.legend()
+        view.rescale()
+        view.draw()
+
+    @staticmethod
+    def _label_points(ax, df, label_column):
+        for _, row in df.iterrows():
+            txt = ax.text(row["East"], row["North"], str(row[label_column]),
+                          fontsize=10, ha='right', va='bottom', color='white')
+            # Add a black outline around the text
+            txt.set_path_effects([path_effects.Stroke(linewidth=2, foreground='black'),
+                                  path_effects.Normal()])
+
     def plot_netcdf_variable(self):
         if self.ui.netcdf_dataset is not None:
             var_name = self.ui.netcdf_var_selector.currentText()
@@ -60,72 +147,212 @@ class Plotter:
                 self.ui.show_loading(f"Plotting {var_name}...")
                 QTimer.singleShot(100, lambda: self.process_netcdf_plot_with_loading(var_name))
 
+    def netcdf_view(self):
+        """The NetCDF map view, with its time slider, probe readout and linked series panel."""
+        view = self.show_view("NetCDF")
+        if not hasattr(view, "time_slider"):
+            view.time_slider = QSlider(Qt.Orientation.Horizontal)
+            view.time_slider.setTickPosition(QSlider.TickPosition.TicksBelow)
+            view.time_slider.setTickInterval(1)
+            view.time_slider.valueChanged.connect(self.update_netcdf_plot)
+            view.layout.addWidget(view.time_slider)
+            # Probe: hover shows the value under the cursor, click plots that cell's series
+            view.probe_label = QLabel("Hover for values, click a cell for its time series")
+            view.layout.addWidget(view.probe_label)
+            view.series = PlotView(figsize=(8, 2.5), toolbar=False)
+            view.series.widget.setMaximumHeight(220)
+            view.layout.addWidget(view.series.widget)
+            view.canvas.mpl_connect("motion_notify_event", self.hover_probe)
+            view.canvas.mpl_connect("button_press_event", self.click_probe)
+        return view
+
+    @traced("app:plot netcdf")
     def process_netcdf_plot_with_loading(self, var_name):
         try:
-            data = self.ui.netcdf_dataset[var_name]
-            if data.ndim == 2:
-                plt.figure()
-                data.plot()
-                plt.show()
-                self.ui.status_bar.showMessage(f"Plotted variable: {var_name}")
-            elif data.ndim == 3:
-                plt.clf()
-                plt.close('all')
-                self.slider_window = QDialog(self.ui)
-                self.slider_window.setWindowTitle("Time Step Selector")
-                self.slider_window.setGeometry(100, 100, 800, 600)
-                layout = QVBoxLayout()
-                self.fig, self.ax = plt.subplots()
-                self.canvas = FigureCanvasQTAgg(self.fig)
-                self.img = self.ax.imshow(data.isel(time=0), cmap="viridis", origin="lower")
-                self.colorbar = self.fig.colorbar(self.img, ax=self.ax)
-                self.time_slider = QSlider(Qt.Orientation.Horizontal)
-                self.time_slider.setMinimum(0)
-                self.time_slider.setMaximum(data.sizes["time"] - 1)
-                self.time_slider.setValue(0)
-                self.time_slider.setTickPosition(QSlider.TickPosition.TicksBelow)
-                self.time_slider.setTickInterval(1)
-                self.time_slider.valueChanged.connect(lambda: self.update_netcdf_plot(data))
-                layout.addWidget(self.canvas)
-                layout.addWidget(self.time_slider)
-                self.slider_window.setLayout(layout)
-                self.slider_window.show()
-                self.ui.status_bar.showMessage(f"Plotted variable: {var_name}")
+            nc_path = self.ui.netcdf_path
+            data = self.ui.derived_variables.open(nc_path, var_name)
+            view = self.netcdf_view()
+            self.netcdf_state = (nc_path, var_name)
+            self.probe_lat = data["lat"].values if "lat" in data.dims else np.arange(data.shape[0])
+            self.probe_lon = data["lon"].values if "lon" in data.dims else np.arange(data.shape[1])
+
+            self.netcdf_warp = self.netcdf_warp_for(nc_path, data)
+
+            has_time = data.ndim == 3
+            self.probe = CellProbe(self.ui.derived_variables, nc_path, var_name) if has_time else None
+            slow = self.probe is not None and not self.probe.has_series
+            view.probe_label.setText("Hover for values, click a cell for its time series"
+                                     + (" (Optimise Layout makes clicks much faster)" if slow else ""))
+            view.probe_label.setToolTip(
+                "Each new area clicked reads every time step of the original file; "
+                "Optimise Layout writes a time-contiguous copy so series load in milliseconds" if slow else ""
+            )
+            view.time_slider.blockSignals(True)
+            view.time_slider.setRange(0, data.sizes["time"] - 1 if has_time else 0)
+            view.time_slider.setValue(0)
+            view.time_slider.blockSignals(False)
+            view.time_slider.setVisible(has_time)
+            view.series.widget.setVisible(has_time)
+            view.series.show_only([])
+            view.series.draw()
+
+            frame = data.isel(time=0).values if has_time else data.isel().values
+            # Colour limits from the whole variable once it has been scanned; until then the
+            # first frame's, while the scan runs in the background
+            limits = self.colour_limits(var_name)
+            if limits is None:
+                sketch = StatsSketch()
+                sketch.update(frame)
+                limits = robust_limits(sketch)
+                self.ui.data_processor.queue_sketch(var_name)
+            self.ui.data_processor.show_variable_summary(var_name)
+            vmin, vmax = limits or (None, None)
+            if self.netcdf_warp is None:
+                image = view.image("frame", frame, origin="lower", vmin=vmin, vmax=vmax)
+                view.ax.set_xlabel("Column")
+                view.ax.set_ylabel("Row")
+            else:
+                image = view.image("frame", self.netcdf_warp.warp(frame), extent=self.netcdf_warp.extent,
+                                   origin="upper", vmin=vmin, vmax=vmax)
+                self.axis_labels(view.ax, self.display_crs())
+            view.colorbar_for(image, data.attrs.get("units"))
+            view.ax.set_title(f"{var_name} - Time Step: 0" if has_time else var_name)
+            view.draw()
+            self.ui.status_bar.showMessage(
+                f"Plotted variable: {var_name}{self.ui.dataset_manager.precision_note(nc_path, var_name)}"
+            )
         except Exception as e:
             self.ui.status_bar.showMessage(f"Error plotting NetCDF variable: {e}")
         finally:
             self.ui.hide_loading()
 
-    def update_netcdf_plot(self, data):
-        time_index = self.time_slider.value()
-        self.img.set_data(data.isel(time=time_index))
-        self.ax.set_title(f"Time Step: {time_index}")
-        self.canvas.draw()
+    def netcdf_warp_for(self, nc_path, data):
+        """WarpIndex from the NetCDF grid to the display CRS, or None to draw the grid as stored."""
+        display = self.display_crs()
+        if display is None or "lat" not in data.dims or "lon" not in data.dims:
+            return None
+        grid_crs = dataset_crs(self.ui.dataset_manager.get(nc_path))
+        if same_crs(grid_crs, display):
+            return None
+        return warp_index(data["lon"].values, data["lat"].values, grid_crs, display)
+
+    def colour_limits(self, var_name):
+        """Robust (2nd-98th percentile) limits of a variable from its cached statistics sketch, or None."""
+        return robust_limits(cached_sketch(self.ui.derived_variables, self.ui.netcdf_path, var_name))
+
+    def apply_colour_limits(self, nc_path, var_name):
+        """Switch the plotted variable to its whole-variable limits once the background scan is done."""
+        if self.netcdf_state != (nc_path, var_name):
+            return
+        limits = self.colour_limits(var_name)
+        view = self.ui.plot_workspace.view("NetCDF")
+        if limits is None or "frame" not in view.artists:
+            return
+        view.artists["frame"].set_clim(*limits)
+        view.draw()
+
+    @traced("app:netcdf frame")
+    def update_netcdf_plot(self):
+        if self.netcdf_state is None or self.probe is None:
+            return
+        nc_path, var_name = self.netcdf_state
+        view = self.ui.plot_workspace.view("NetCDF")
+        time_index = view.time_slider.value()
+        # Frames come from the dataset manager's chunk cache, so revisiting a step is free
+        frame = self.ui.derived_variables.read(nc_path, var_name, time=time_index)
+        if self.netcdf_warp is not None:
+            frame = self.netcdf_warp.warp(frame)  # One gather; the projection maths was done once
+        view.artists["frame"].set_data(frame)
+        view.ax.set_title(f"{var_name} - Time Step: {time_index}")
+        view.draw()
+        if "marker" in view.series.artists:
+            view.series.artists["marker"].set_xdata([self.probe.times[time_index]] * 2)
+            view.series.draw()
+
+    def _cell_under(self, event):
+        """((row, col) of the drawn image, (row, col) of the NetCDF grid) under the cursor, or None."""
+        view = self.ui.plot_workspace.view("NetCDF")
+        if self.netcdf_state is None or event.inaxes is not view.ax or event.xdata is None:
+            return None
+        if self.netcdf_warp is not None:
+            shown = self.netcdf_warp.display_cell(event.xdata, event.ydata)
+            source = self.netcdf_warp.source_cell(*shown) if shown is not None else None
+            return (shown, source) if source is not None else None
+        row, col = int(round(event.ydata)), int(round(event.xdata))
+        if 0 <= row < self.probe_lat.size and 0 <= col < self.probe_lon.size:
+            return (row, col), (row, col)
+        return None
+
+    def hover_probe(self, event):
+        cell = self._cell_under(event)
+        if cell is None:
+            return
+        shown, (row, col) = cell
+        view = self.ui.plot_workspace.view("NetCDF")
+        value = view.artists["frame"].get_array()[shown]
+        view.probe_label.setText(
+            f"East {self.probe_lon[col]:g}, North {self.probe_lat[row]:g} "
+            f"(row {row}, col {col}): {value:.4g}"
+        )
+
+    def click_probe(self, event):
+        cell = self._cell_under(event) if self.probe is not None else None
+        if cell is None:
+            return
+        row, col = cell[1]
+        series_view = self.ui.plot_workspace.view("NetCDF").series
+        series_view.line("series", self.probe.times, self.probe.series(row, col), linewidth=1)
+        time_index = self.ui.plot_workspace.view("NetCDF").time_slider.value()
+        marker = series_view.artists.get("marker")
+        if marker is None:
+            series_view.artists["marker"] = series_view.ax.axvline(self.probe.times[time_index], color="red", linewidth=1)
+        else:
+            marker.set_xdata([self.probe.times[time_index]] * 2)
+            marker.set_visible(True)
+        series_view.ax.set_title(
+            f"{self.probe.var_name} at East {self.probe_lon[col]:g}, North {self.probe_lat[row]:g}", fontsize=9
+        )
+        series_view.rescale()
+        series_view.draw()
+
+    def plot_summary_map(self):
+        try:
+            data, extent, title = self.ui.summary_map
+            sketch = StatsSketch()
+            sketch.update(data)
+            vmin, vmax = robust_limits(sketch) or (None, None)
+            view = self.show_view("Summary Map")
+            image = view.image("summary", data, extent=extent, origin="upper", vmin=vmin, vmax=vmax)
+            view.colorbar_for(image)
+            view.ax.set_title(title)
+            view.ax.set_xlabel("East (m)")
+            view.ax.set_ylabel("North (m)")
+            view.draw()
+        except Exception as e:
+            self.ui.status_bar.showMessage(f"Error plotting summary map: {e}")
 
     def visualize_output(self, file_path):
-        plt.clf()
-        plt.close('all')
         df = pd.read_csv(file_path)
         if 'Date' not in df.columns:
             self.ui.status_bar.showMessage("Error: 'Date' column missing from the CSV file.")
             return
         df['Date'] = pd.to_datetime(df['Date'])
-        plt.figure(figsize=(10, 6))
-        for column in df.columns:
-            if column != 'Date':
-                plt.plot(df['Date'], df[column], label=column)
-        plt.xlabel('Date')
-        plt.ylabel('Value')
-        plt.title('Time Series Plot')
-        plt.legend()
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
+        view = self.show_view("Model Output")
+        columns = [column for column in df.columns if column != 'Date']
+        for column in columns:
+            view.line(column, df['Date'], df[column], label=column)
+        view.show_only(columns)
+        view.ax.set_xlabel('Date')
+        view.ax.set_ylabel('Value')
+        view.ax.set_title('Time Series Plot')
+        view.ax.tick_params(axis='x', labelrotation=45)
+        view.legend()
+        view.rescale()
+        view.draw()
         self.ui.status_bar.showMessage(f"Loaded and plotted data from: {file_path}")
 
+    @traced("app:plot csv")
     def plot_csv_variable(self):
-        plt.clf()
-        plt.close('all')
         if self.ui.csv_dataframe_1 is None:
             return
 
@@ -138,22 +365,14 @@ class Plotter:
         left_color_cycle = itertools.cycle(left_colors)
         right_color_cycle = itertools.cycle(right_colors)
 
-        selected_vars_1 = [
-            self.ui.csv_var_selector_1.item(i).text()
-            for i in range(self.ui.csv_var_selector_1.count())
-            if self.ui.csv_var_selector_1.item(i).checkState() == Qt.CheckState.Checked
-        ]
+        selected_vars_1 = self.ui.csv_var_selector_1.checked_labels()
 
         has_second_dataset = self.ui.csv_dataframe_2 is not None
         if has_second_dataset:
             df2 = self.ui.csv_dataframe_2
             df2['Date'] = pd.to_datetime(df2['Date'])
             
-            selected_vars_2 = [
-                self.ui.csv_var_selector_2.item(i).text()
-                for i in range(self.ui.csv_var_selector_2.count())
-                if self.ui.csv_var_selector_2.item(i).checkState() == Qt.CheckState.Checked
-            ]
+            selected_vars_2 = self.ui.csv_var_selector_2.checked_labels()
         else:
             selected_vars_2 = []
 
@@ -161,89 +380,72 @@ class Plotter:
             self.ui.status_bar.showMessage("Please select at least one variable.")
             return
 
-        fig, ax1 = plt.subplots(figsize=(10, 6))
+        # Optional monthly/seasonal/annual aggregation, climatology or anomalies
+        frequency = self.ui.csv_aggregation_frequency.currentText()
+        statistic = self.ui.csv_aggregation_statistic.currentText()
+        output = self.ui.csv_aggregation_output.currentText()
+        x_column = 'Date'
+        if frequency != "Native" or output != "Values":
+            df1 = aggregate_dataframe(
+                df1, [var for var in selected_vars_1 if var in df1.columns], frequency, statistic, output
+            )
+            if has_second_dataset:
+                df2 = aggregate_dataframe(
+                    df2, [var for var in selected_vars_2 if var in df2.columns], frequency, statistic, output
+                )
+            x_column = df1.columns[0]
+
+        view = self.show_view("Timeseries")
+        if x_column != self.timeseries_x:
+            view.reset()  # Dates and month/season labels can't share an x axis
+            self.timeseries_x = x_column
+        ax1 = view.ax
+        visible = []
 
         # Plot first dataset on left y-axis
         for var in selected_vars_1:
             if var in df1.columns:
                 color = next(left_color_cycle)
-                ax1.plot(df1['Date'], df1[var], label=f"1: {var}", linestyle='-', color=color)
+                view.line(("1", var), df1[x_column], df1[var], ax=ax1,
+                          label=f"1: {var}", linestyle='-', color=color)
+                visible.append(("1", var))
 
         y_label_1 = self.ui.y_axis_label_1.text() or "Dataset 1"
         ax1.set_ylabel(y_label_1)
         ax1.tick_params(axis='y', labelcolor='tab:blue')
 
-        ax2 = None  # Initialize ax2
+        ax2 = None
 
         # Plot second dataset on right y-axis
         if has_second_dataset and selected_vars_2:
-            ax2 = ax1.twinx()
+            ax2 = view.twin()
             for var in selected_vars_2:
                 if var in df2.columns:
                     color = next(right_color_cycle)
-                    ax2.plot(df2['Date'], df2[var], label=f"2: {var}", linestyle='--', color=color)
+                    view.line(("2", var), df2[x_column], df2[var], ax=ax2,
+                              label=f"2: {var}", linestyle='--', color=color)
+                    visible.append(("2", var))
 
             y_label_2 = self.ui.y_axis_label_2.text() or "Dataset 2"
             ax2.set_ylabel(y_label_2)
             ax2.tick_params(axis='y', labelcolor='tab:red')
+        elif view.twin_ax is not None:
+            view.twin_ax.set_visible(False)
 
-        ax1.set_xlabel("Date")
+        # Lines of deselected variables are hidden, not deleted, so re-selecting is instant
+        view.show_only(visible)
+        ax1.set_xlabel(x_column)
         ax1.set_title("Timeseries Plot")
+        ax1.tick_params(axis='x', labelrotation=45)
 
         # **Ensure legends are shown**
-        ax1.legend(loc='upper left')  # Legend for left y-axis variables
+        view.legend(ax1, loc='upper left')  # Legend for left y-axis variables
+        view.rescale(ax1)
         if ax2:
-            ax2.legend(loc='upper right')  # Legend for right y-axis variables
-
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
+            view.legend(ax2, loc='upper right')  # Legend for right y-axis variables
+            view.rescale(ax2)
+        view.draw()
 
         # Status update
         plotted_vars = ", ".join(selected_vars_1 + selected_vars_2)
         self.ui.status_bar.showMessage(f"Plotted Variables: {plotted_vars}")
-
-
-
-    def plot_selected_files(self):
-        plt.clf()
-        plt.close('all')
-        
-        fig, ax = plt.subplots(figsize=(10, 8))  # Create a single figure and axis
-
-        # Plot Raster if enabled
-        if self.ui.raster_checkbox.isChecked() and self.ui.raster_data:
-            raster_data, extent = self.ui.raster_data
-            cax = ax.imshow(raster_data, cmap='terrain', extent=extent, origin="upper")
-            plt.colorbar(cax, ax=ax, label="Elevation")  # Add a colorbar
-
-        # Plot Shapefile if enabled
-        if self.ui.shapefile_checkbox.isChecked() and self.ui.shapefile_data is not None:
-            self.ui.shapefile_data.plot(ax=ax, edgecolor="black", facecolor="none")  # Plot borders
-
-        # Plot XY Data if enabled
-        if self.ui.xy_checkbox.isChecked() and self.ui.xy_data is not None:
-            df = self.ui.xy_data
-            ax.scatter(df["East"], df["North"], color='red', marker='o', label="XY Data Points")
-
-            # If labels exist, add them to the points
-            if self.ui.xy_labels:
-                for i, row in df.iterrows():
-                    txt = ax.text(row["East"], row["North"], str(row[self.ui.xy_labels]), 
-                        fontsize=10, ha='right', va='bottom', color='white')
-
-                    # Add a black outline around the text
-                    txt.set_path_effects([path_effects.Stroke(linewidth=2, foreground='black'), 
-                                        path_effects.Normal()])
-
-        # Set Labels and Title
-        ax.set_xlabel("East (m)")
-        ax.set_ylabel("North (m)")
-        ax.set_title("Combined Hydrological Data Visualization")
-        ax.legend()
-        ax.grid(True)
-
-        plt.show()
-        self.ui.status_bar.showMessage("Plotted selected files together.")
-
-
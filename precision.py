@@ -0,0 +1,91 @@
+import numpy as np
+
+PRECISIONS = ["Full (float64)", "float32", "Scaled int16"]
+# Code marking missing cells in scaled int16 grids; valid codes use -32767..32767
+INT16_MISSING = -32768
+INT16_STEPS = 65534
+
+
+class ScaledGrid:
+    """A float grid stored as int16 codes: value = offset + (code + 32767) * scale.
+
+    Quantisation error is at most scale / 2, i.e. (max - min) / 131068 of the
+    block's range. Unpacking gives float32, a quarter of the float64 original.
+    """
+
+    def __init__(self, codes, offset, scale):
+        self.codes = codes
+        self.offset = offset
+        self.scale = scale
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def max_error(self):
+        return self.scale / 2
+
+    @classmethod
+    def pack(cls, block):
+        finite = np.isfinite(block)
+        if finite.any():
+            low, high = float(block[finite].min()), float(block[finite].max())
+        else:
+            low = high = 0.0
+        scale = (high - low) / INT16_STEPS if high > low else 1.0
+        codes = np.full(block.shape, INT16_MISSING, dtype=np.int16)
+        codes[finite] = np.rint((block[finite] - low) / scale - 32767).astype(np.int16)
+        return cls(codes, low, scale)
+
+    def unpack(self):
+        values = (self.codes.astype(np.float32) + np.float32(32767)) * np.float32(self.scale) + np.float32(self.offset)
+        values[self.codes == INT16_MISSING] = np.nan
+        return values
+
+
+def pack_block(block, precision, tolerance=None):
+    """(stored value, max absolute error) of a decoded block in the given precision.
+
+    Only floating blocks are reduced. A scaled int16 block whose unpacked values
+    would be off by more than ``tolerance`` is kept as float32 instead.
+    """
+    if precision == PRECISIONS[0] or not np.issubdtype(block.dtype, np.floating) or block.dtype.itemsize < 4:
+        return block, 0.0
+    if precision == "Scaled int16":
+        packed = ScaledGrid.pack(block)
+        # Measured, since float32 unpacking adds rounding on top of the scale / 2 step
+        error = _max_error(block, packed.unpack())
+        if tolerance is None or error <= tolerance:
+            return packed, error
+    if block.dtype == np.float32:
+        return block, 0.0
+    reduced = block.astype(np.float32)
+    return reduced, _max_error(block, reduced)
+
+
+def unpack_block(value):
+    """The array behind a pack_block() value (float32 for reduced grids)."""
+    return value.unpack() if isinstance(value, ScaledGrid) else value
+
+
+def _max_error(block, reduced):
+    finite = np.isfinite(block)
+    if not finite.any():
+        return 0.0
+    return float(np.max(np.abs(reduced[finite].astype(np.float64) - block[finite])))
+
+
+def compact_raster(data, precision):
+    """Loaded raster layer in the display precision (float32 for either reduced mode).
+
+    Raster layers are drawn and probed directly, so they are never scaled to int16;
+    integer rasters (zone IDs) are left untouched.
+    """
+    if precision != PRECISIONS[0] and np.issubdtype(data.dtype, np.floating) and data.dtype.itemsize > 4:
+        return data.astype(np.float32)
+    return data
@@ -0,0 +1,301 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import LRUCache, file_fingerprint, get_cache_dir
+
+RASTER_EXTENSIONS = (".asc", ".tif", ".tiff")
+NETCDF_EXTENSIONS = (".nc", ".nc4")
+TABLE_EXTENSIONS = (".csv", ".txt")
+INPUT_EXTENSIONS = RASTER_EXTENSIONS + NETCDF_EXTENSIONS + TABLE_EXTENSIONS
+# Keys whose (directory) value relative input paths are resolved against, before the JSON's folder
+INPUT_DIR_KEYS = ("path_input", "input_path", "input_dir", "path_in", "inputs")
+OUTPUT_DIR_KEYS = ("path_output", "output_path", "output_dir", "path_out", "outputs")
+# Cells may be off by this fraction of a cell before grids count as misaligned
+ALIGN_TOLERANCE = 0.01
+# Rough DRYP working set: float64 state grids held per cell while it runs
+STATE_GRIDS = 40
+
+_metadata = LRUCache(max_items=512)
+# HDF5 isn't thread-safe, so NetCDF headers are read one at a time (rasters in parallel)
+_netcdf_lock = threading.Lock()
+
+
+def find_paths(config, key=""):
+    """[(json key, path as written)] of every string in the config that names an input file."""
+    found = []
+    if isinstance(config, dict):
+        for name, value in config.items():
+            found += find_paths(value, f"{key}.{name}" if key else str(name))
+    elif isinstance(config, list):
+        for i, value in enumerate(config):
+            found += find_paths(value, f"{key}[{i}]")
+    elif isinstance(config, str) and config.lower().endswith(INPUT_EXTENSIONS):
+        found.append((key, config))
+    return found
+
+
+def _directory(config, keys, default):
+    for name, value in config.items() if isinstance(config, dict) else ():
+        if name.lower() in keys and isinstance(value, str):
+            return value
+        if isinstance(value, dict):
+            nested = _directory(value, keys, None)
+            if nested:
+                return nested
+    return default
+
+
+def simulation_period(config):
+    """(start, end) Timestamps from keys like t_start/start_date, or Nones."""
+    period = {"start": None, "end": None}
+
+    def visit(value, name=""):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                visit(item, key.lower())
+        elif isinstance(value, str) and name:
+            for bound in period:
+                if bound in name and period[bound] is None:
+                    try:
+                        period[bound] = pd.Timestamp(value)
+                    except ValueError:
+                        pass
+
+    visit(config)
+    return period["start"], period["end"]
+
+
+def raster_metadata(path):
+    import rasterio
+    with rasterio.open(path) as src:  # Header only; no band data is read
+        return {
+            "kind": "raster", "shape": [src.height, src.width], "bounds": list(src.bounds),
+            "res": list(src.res), "crs": src.crs.to_wkt() if src.crs else None, "dtype": src.dtypes[0],
+        }
+
+
+def netcdf_metadata(path):
+    import xarray as xr
+    from projection import CRS_ATTRIBUTES, dataset_crs
+    with _netcdf_lock, xr.open_dataset(path, decode_times=True) as dataset:
+        info = {"kind": "netcdf", "variables": list(dataset.data_vars), "crs": None, "time": None}
+        for y_name, x_name in (("lat", "lon"), ("y", "x"), ("latitude", "longitude")):
+            if y_name in dataset.sizes and x_name in dataset.sizes:
+                info["shape"] = [dataset.sizes[y_name], dataset.sizes[x_name]]
+                ys, xs = dataset[y_name].values, dataset[x_name].values
+                info["centres"] = [float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())]
+                break
+        if "time" in dataset.sizes:
+            times = pd.DatetimeIndex(dataset["time"].values) if np.issubdtype(
+                dataset["time"].dtype, np.datetime64) else None
+            info["time"] = {
+                "steps": dataset.sizes["time"],
+                "start": str(times[0]) if times is not None else None,
+                "end": str(times[-1]) if times is not None else None,
+            }
+        # dataset_crs falls back to DRYP_CRS; only a CRS the file actually declares is compared
+        if any(name in dataset.attrs for name in CRS_ATTRIBUTES) or any(
+                "grid_mapping" in variable.attrs for variable in dataset.data_vars.values()):
+            info["crs"] = dataset_crs(dataset).to_wkt()
+    return info
+
+
+def table_metadata(path):
+    columns = pd.read_csv(path, nrows=0, sep=None, engine="python").columns
+    return {"kind": "table", "columns": [str(column) for column in columns]}
+
+
+def file_metadata(path):
+    """(header metadata, reused) of one input, cached by the file's fingerprint (memory, then disk)."""
+    fingerprint = file_fingerprint(path)
+    info = _metadata.get(fingerprint)
+    if info is not None:
+        return info, True
+    cache_path = os.path.join(
+        get_cache_dir("preflight"), hashlib.sha1(fingerprint.encode()).hexdigest() + ".json"
+    )
+    reused = True
+    try:
+        with open(cache_path) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        reused = False
+        lower = path.lower()
+        if lower.endswith(RASTER_EXTENSIONS):
+            info = raster_metadata(path)
+        elif lower.endswith(NETCDF_EXTENSIONS):
+            info = netcdf_metadata(path)
+        else:
+            info = table_metadata(path)
+        info["bytes"] = os.path.getsize(path)
+        with open(cache_path + ".tmp", "w") as f:
+            json.dump(info, f)
+        os.replace(cache_path + ".tmp", cache_path)
+    _metadata.put(fingerprint, info)
+    return info, reused
+
+
+class PreflightReport:
+    """Problems found in a model input file and the size of the run it describes."""
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.errors = []
+        self.warnings = []
+        self.files = {}  # path -> (json key, metadata)
+        self.grid = None  # (rows, cols) of the reference grid
+        self.steps = None
+        self.output_bytes = None
+        self.memory_bytes = None
+        self.cached = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def text(self):
+        lines = [f"Pre-flight check of {os.path.basename(self.json_path)}: "
+                 f"{len(self.files)} input files ({self.cached} unchanged since last check)"]
+        if self.grid:
+            lines.append(f"Model grid: {self.grid[0]} x {self.grid[1]} cells")
+        if self.steps:
+            lines.append(f"Time steps: {self.steps}")
+        if self.output_bytes:
+            lines.append(f"Expected output: ~{self.output_bytes / 1024 ** 2:,.0f} MB per gridded output variable")
+        if self.memory_bytes:
+            lines.append(f"Expected memory: ~{self.memory_bytes / 1024 ** 2:,.0f} MB")
+        lines += [f"ERROR: {message}" for message in self.errors]
+        lines += [f"Warning: {message}" for message in self.warnings]
+        lines.append("Ready to run." if self.ok else "The run would fail; fix the errors above first.")
+        return "\n".join(lines)
+
+
+def _same_crs(a, b):
+    import pyproj
+    return pyproj.CRS.from_wkt(a) == pyproj.CRS.from_wkt(b)
+
+
+def _aligned(a, b, res):
+    return all(abs(x - y) <= ALIGN_TOLERANCE * r for x, y, r in zip(a, b, [res[0], res[1], res[0], res[1]]))
+
+
+def check_grids(report):
+    """Compare every raster and NetCDF grid against the reference grid (the DEM, else the most common)."""
+    rasters = {path: (key, info) for path, (key, info) in report.files.items() if info["kind"] == "raster"}
+    if rasters:
+        shapes = pd.Series({path: tuple(info["shape"]) for path, (_, info) in rasters.items()})
+        dem = [path for path, (key, _) in rasters.items() if "dem" in key.lower() or "terrain" in key.lower()]
+        if dem:
+            reference = dem[0]
+        else:
+            mode = shapes.value_counts().idxmax()
+            reference = next(path for path, shape in shapes.items() if shape == mode)
+        ref_key, ref = rasters[reference]
+        report.grid = tuple(ref["shape"])
+        crs_values = {info["crs"] for _, info in rasters.values() if info["crs"]}
+        if len(crs_values) > 1:
+            report.errors.append("Input rasters use different CRSs: "
+                                 + ", ".join(os.path.basename(p) for p, (_, i) in rasters.items() if i["crs"]))
+        for path, (key, info) in rasters.items():
+            name = f"{key} ({os.path.basename(path)})"
+            if tuple(info["shape"]) != report.grid:
+                report.errors.append(f"{name} is {info['shape'][0]} x {info['shape'][1]} cells; "
+                                     f"{ref_key} is {report.grid[0]} x {report.grid[1]}")
+            elif not _aligned(info["bounds"], ref["bounds"], ref["res"]):
+                report.errors.append(f"{name} does not line up with {ref_key}: extent {info['bounds']} "
+                                     f"vs {ref['bounds']}")
+        if crs_values and any(info["crs"] is None for _, info in rasters.values()):
+            report.warnings.append("Some rasters have no CRS (usual for ASCII grids); they are assumed to "
+                                   "match the others")
+    raster_crs = {info["crs"] for _, info in rasters.values() if info["crs"]}
+    for path, (key, info) in report.files.items():
+        if info["kind"] != "netcdf":
+            continue
+        name = f"{key} ({os.path.basename(path)})"
+        if report.grid and info.get("shape") and tuple(info["shape"]) != report.grid:
+            report.errors.append(f"{name} grid is {info['shape'][0]} x {info['shape'][1]}; "
+                                 f"the model grid is {report.grid[0]} x {report.grid[1]}")
+        if info["crs"] and len(raster_crs) == 1 and not _same_crs(info["crs"], next(iter(raster_crs))):
+            report.errors.append(f"{name} is in a different CRS from the input rasters")
+
+
+def check_period(report, start, end):
+    """Time steps of the run from the forcing files, and whether they cover the simulation period."""
+    forcing = [(key, path, info["time"]) for path, (key, info) in report.files.items()
+               if info["kind"] == "netcdf" and info.get("time")]
+    if not forcing:
+        return
+    steps = []
+    for key, path, time in forcing:
+        steps.append(time["steps"])
+        if time["start"] is None:
+            continue
+        first, last = pd.Timestamp(time["start"]), pd.Timestamp(time["end"])
+        if (start is not None and first > start) or (end is not None and last < end):
+            report.errors.append(f"{key} ({os.path.basename(path)}) covers {first.date()} to {last.date()}, "
+                                 f"not the whole simulation period")
+        if start is not None and end is not None:
+            # Steps over the simulation period at this file's time step; the finest forcing sets the run
+            span_days = max(1.0, (last - first) / pd.Timedelta(days=1))
+            steps[-1] = max(1, int(round(time["steps"] * ((end - start) / pd.Timedelta(days=1)) / span_days)))
+    report.steps = max(steps)
+
+
+def preflight(json_path, workers=8):
+    """Check a DRYP input JSON without reading any grid data.
+
+    Every referenced file's header is read in parallel (NetCDF headers one at a
+    time, as HDF5 isn't thread-safe) and cached by file fingerprint, so a re-check
+    of unchanged inputs only stats the files.
+    """
+    report = PreflightReport(json_path)
+    try:
+        with open(json_path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        report.errors.append(f"Cannot read the input JSON: {e}")
+        return report
+    json_dir = os.path.dirname(os.path.abspath(json_path))
+    bases = [os.path.join(json_dir, _directory(config, INPUT_DIR_KEYS, "")), json_dir]
+
+    present = []
+    for key, written in find_paths(config):
+        candidates = [os.path.normpath(os.path.join(base, written)) for base in bases]
+        path = next((candidate for candidate in candidates if os.path.exists(candidate)), None)
+        if path is None:
+            report.errors.append(f"{key}: file not found: {candidates[0]}")
+        else:
+            present.append((key, path))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(present) or 1))) as pool:
+        futures = {pool.submit(file_metadata, path): (key, path) for key, path in present}
+        for future, (key, path) in futures.items():
+            try:
+                info, reused = future.result()
+            except Exception as e:
+                report.errors.append(f"{key} ({os.path.basename(path)}) cannot be opened: {e}")
+                continue
+            report.files[path] = (key, info)
+            report.cached += reused
+
+    check_grids(report)
+    check_period(report, *simulation_period(config))
+    if report.grid:
+        cells = report.grid[0] * report.grid[1]
+        report.memory_bytes = cells * 8 * STATE_GRIDS
+        report.output_bytes = cells * 4 * (report.steps or 1)
+        output_dir = _directory(config, OUTPUT_DIR_KEYS, json_dir)
+        output_dir = output_dir if os.path.isabs(output_dir) else os.path.join(json_dir, output_dir)
+        existing = output_dir
+        while existing and not os.path.exists(existing):
+            existing = os.path.dirname(existing)
+        if existing and shutil.disk_usage(existing).free < report.output_bytes:
+            report.errors.append(f"Not enough free disk space in {existing} for even one output grid")
+    return report
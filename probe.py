@@ -0,0 +1,50 @@
+import os
+import math
+
+from cache_utils import LRUCache
+from rechunk import SERIES_TILE
+
+# Largest tile edge (cells) read per probe without a re-chunked copy; one read of a
+# per-time-step file costs about the same for a 64x64 tile as for a single cell
+PROBE_TILE = 64
+# Bytes per probe tile, so long series still give tiles the LRU can hold (30 years daily: 6x6)
+PROBE_TILE_BYTES = 4 * 1024 ** 2
+
+
+def tile_edge(n_time, itemsize=8, budget=PROBE_TILE_BYTES, largest=PROBE_TILE):
+    """Edge of a square tile whose full series fits in ``budget`` bytes (at least one cell)."""
+    return max(1, min(largest, math.isqrt(budget // max(1, n_time * itemsize))))
+
+
+class CellProbe:
+    """Full time series of single cells for click-to-inspect on map views.
+
+    Series are read a tile of neighbouring cells at a time and the tiles are kept in
+    an LRU (not the shared chunk cache, so a tile is held once), so clicking around one
+    area is answered from memory. When the dataset has a time-contiguous copy (see
+    rechunk.py) tiles match its chunks, so a probe reads only a few small chunks;
+    without one, every new tile decompresses every time slice.
+    """
+
+    def __init__(self, registry, path, var_name, max_bytes=256 * 1024 ** 2):
+        self.registry = registry
+        self.path = path
+        self.var_name = var_name
+        self.variable = registry.open(path, var_name)
+        self.lat = self.variable["lat"].values
+        self.lon = self.variable["lon"].values
+        self.times = self.variable["time"].values
+        self.has_series = "series" in registry.dataset_manager.layouts.get(os.path.abspath(path), {})
+        itemsize = getattr(self.variable.dtype, "itemsize", 8)
+        self.tile = SERIES_TILE if self.has_series else tile_edge(self.times.size, itemsize)
+        self.tiles = LRUCache(max_bytes=max_bytes)
+
+    def series(self, row, col):
+        key = (row // self.tile, col // self.tile)
+        block = self.tiles.get(key)
+        if block is None:
+            rows = slice(key[0] * self.tile, min((key[0] + 1) * self.tile, self.lat.size))
+            cols = slice(key[1] * self.tile, min((key[1] + 1) * self.tile, self.lon.size))
+            block = self.registry.read(self.path, self.var_name, cache=False, lat=rows, lon=cols)
+            self.tiles.put(key, block)
+        return block[:, row % self.tile, col % self.tile]
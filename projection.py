@@ -0,0 +1,179 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyproj
+import shapely
+
+from cache_utils import LRUCache
+
+# DRYP/CUWALID grids are written on this Lambert azimuthal equal-area projection,
+# so it is assumed for NetCDF files that carry no CRS metadata
+DRYP_CRS = "+proj=laea +lat_0=5 +lon_0=20 +x_0=0 +y_0=0 +datum=WGS84 +units=m +no_defs"
+# Attributes that may hold a CRS, on a CF grid-mapping variable or on the dataset
+CRS_ATTRIBUTES = ["crs_wkt", "spatial_ref", "proj4", "proj4text", "crs"]
+
+_warp_indices = LRUCache(max_bytes=256 * 1024 ** 2)
+
+
+def parse_crs(value):
+    """pyproj CRS from an EPSG code, PROJ string, WKT or rasterio/pyproj CRS; None if blank."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if hasattr(value, "to_wkt"):
+        value = value.to_wkt()
+    return pyproj.CRS.from_user_input(value)
+
+
+def dataset_crs(dataset):
+    """CRS of a NetCDF dataset from its CF grid mapping or global attributes (DRYP_CRS if none)."""
+    for variable in dataset.data_vars.values():
+        mapping = variable.attrs.get("grid_mapping") or variable.encoding.get("grid_mapping")
+        if mapping in dataset.variables:
+            attrs = dataset[mapping].attrs
+            for name in CRS_ATTRIBUTES:
+                if attrs.get(name):
+                    return parse_crs(attrs[name])
+            try:
+                return pyproj.CRS.from_cf(attrs)
+            except pyproj.exceptions.CRSError:
+                pass
+    for name in CRS_ATTRIBUTES:
+        if isinstance(dataset.attrs.get(name), str) and dataset.attrs[name].strip():
+            return parse_crs(dataset.attrs[name])
+    return parse_crs(DRYP_CRS)
+
+
+def same_crs(a, b):
+    """True when no reprojection is needed (a layer without a CRS is taken to match)."""
+    return a is None or b is None or a == b
+
+
+@lru_cache(maxsize=64)
+def _transformer(src_wkt, dst_wkt):
+    return pyproj.Transformer.from_crs(src_wkt, dst_wkt, always_xy=True)
+
+
+def transformer(src, dst):
+    """Cached x/y-ordered transformer; building one costs far more than using it."""
+    return _transformer(src.to_wkt(), dst.to_wkt())
+
+
+def transform_xy(xs, ys, src, dst):
+    """Reproject coordinate arrays in one vectorised call."""
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if same_crs(src, dst):
+        return xs, ys
+    return transformer(src, dst).transform(xs, ys)
+
+
+def reproject_gdf(gdf, dst, assume=None):
+    """GeoDataFrame in ``dst``; a layer without a CRS is taken to be in ``assume`` (default ``dst``).
+
+    All vertices of all geometries go through the cached transformer in one call.
+    """
+    if dst is None:
+        return gdf
+    src = parse_crs(gdf.crs) if gdf.crs is not None else (assume or dst)
+    if same_crs(src, dst):
+        return gdf.set_crs(dst, allow_override=True)
+    project = transformer(src, dst)
+    geometry = shapely.transform(
+        np.asarray(gdf.geometry.values),
+        lambda coords: np.column_stack(project.transform(coords[:, 0], coords[:, 1])),
+    )
+    out = gdf.copy()
+    out[gdf.geometry.name] = geometry
+    return out.set_geometry(gdf.geometry.name).set_crs(dst, allow_override=True)
+
+
+def _nearest(coords, values):
+    """Nearest index of each value along 1-D cell centres, -1 outside the outer cell edges."""
+    index = pd.Index(coords).get_indexer(values.ravel(), method="nearest").reshape(values.shape)
+    half = abs(coords[-1] - coords[0]) / max(1, coords.size - 1) / 2
+    low, high = min(coords[0], coords[-1]) - half, max(coords[0], coords[-1]) + half
+    index[(values < low) | (values > high) | ~np.isfinite(values)] = -1
+    return index
+
+
+class WarpIndex:
+    """Nearest-neighbour map from a north-up display grid back to the cells of a source grid.
+
+    Projection maths runs once, when the index is built; warping a frame is then a
+    single gather, so stepping through time steps or re-plotting costs no more than
+    drawing an unprojected frame.
+    """
+
+    def __init__(self, src_x, src_y, src_crs, dst_crs, shape=None):
+        src_x = np.asarray(src_x, dtype=np.float64)
+        src_y = np.asarray(src_y, dtype=np.float64)
+        rows, cols = shape or (src_y.size, src_x.size)
+
+        # Display bounds from points along the source's outer cell edges (corners alone miss curvature)
+        half_x = (src_x[-1] - src_x[0]) / max(1, src_x.size - 1) / 2
+        half_y = (src_y[-1] - src_y[0]) / max(1, src_y.size - 1) / 2
+        x0, x1, y0, y1 = src_x[0] - half_x, src_x[-1] + half_x, src_y[0] - half_y, src_y[-1] + half_y
+        t = np.linspace(0, 1, 64)
+        edge_x = np.concatenate([x0 + (x1 - x0) * t, np.full(64, x1), x0 + (x1 - x0) * t, np.full(64, x0)])
+        edge_y = np.concatenate([np.full(64, y0), y0 + (y1 - y0) * t, np.full(64, y1), y0 + (y1 - y0) * t])
+        ex, ey = transform_xy(edge_x, edge_y, src_crs, dst_crs)
+        xmin, xmax, ymin, ymax = np.nanmin(ex), np.nanmax(ex), np.nanmin(ey), np.nanmax(ey)
+        self.extent = [float(xmin), float(xmax), float(ymin), float(ymax)]
+        self.shape = (rows, cols)
+
+        # Display cell centres (row 0 at the top) mapped back into the source CRS
+        dx, dy = (xmax - xmin) / cols, (ymax - ymin) / rows
+        xs = xmin + dx * (np.arange(cols) + 0.5)
+        ys = ymax - dy * (np.arange(rows) + 0.5)
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        back_x, back_y = transform_xy(grid_x, grid_y, dst_crs, src_crs)
+        source_rows = _nearest(src_y, np.asarray(back_y))
+        source_cols = _nearest(src_x, np.asarray(back_x))
+        self.valid = (source_rows >= 0) & (source_cols >= 0)
+        self.rows = np.where(self.valid, source_rows, 0).astype(np.int32)
+        self.cols = np.where(self.valid, source_cols, 0).astype(np.int32)
+        self.nbytes = self.rows.nbytes + self.cols.nbytes + self.valid.nbytes
+
+    def warp(self, frame):
+        out = np.asarray(frame, dtype=np.float64)[self.rows, self.cols]
+        out[~self.valid] = np.nan
+        return out
+
+    def display_cell(self, x, y):
+        """(row, col) of the display grid under a point in display coordinates, or None."""
+        xmin, xmax, ymin, ymax = self.extent
+        row = int((ymax - y) / (ymax - ymin) * self.shape[0])
+        col = int((x - xmin) / (xmax - xmin) * self.shape[1])
+        if 0 <= row < self.shape[0] and 0 <= col < self.shape[1]:
+            return row, col
+        return None
+
+    def source_cell(self, row, col):
+        """Source (row, col) shown at a display cell, or None where the display has no data."""
+        if not self.valid[row, col]:
+            return None
+        return int(self.rows[row, col]), int(self.cols[row, col])
+
+
+def warp_index(src_x, src_y, src_crs, dst_crs, shape=None):
+    """WarpIndex between two grids, reused while the grids and CRSs stay the same."""
+    src_x = np.asarray(src_x)
+    src_y = np.asarray(src_y)
+    key = (
+        src_x[0], src_x[-1], src_x.size, src_y[0], src_y[-1], src_y.size,
+        src_crs.to_wkt(), dst_crs.to_wkt(), shape,
+    )
+    index = _warp_indices.get(key)
+    if index is None:
+        index = WarpIndex(src_x, src_y, src_crs, dst_crs, shape)
+        _warp_indices.put(key, index)
+    return index
+
+
+def raster_centres(data, extent):
+    """1-D x and y cell centres of a north-up raster with imshow ``extent``."""
+    rows, cols = np.shape(data)[:2]
+    left, right, bottom, top = extent
+    dx, dy = (right - left) / cols, (top - bottom) / rows
+    return left + dx * (np.arange(cols) + 0.5), top - dy * (np.arange(rows) + 0.5)
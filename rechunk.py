@@ -0,0 +1,203 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import xarray as xr
+import netCDF4
+
+from cache_utils import get_cache_dir, file_fingerprint
+from export_writers import TIME_UNITS, encode_times
+from extraction import time_chunk_for
+
+try:
+    import zarr
+except ImportError:  # Zarr is optional; NetCDF4 stores are used without it
+    zarr = None
+
+# Time-contiguous copy: long runs of time for small spatial tiles (point and zone series)
+SERIES_TIME_CHUNK = 1024
+SERIES_TILE = 8
+
+
+def layout_base(path):
+    """Cache location (without extension) of the re-chunked copies of a file."""
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(get_cache_dir("layouts"), f"{name}_{digest}")
+
+
+def find_layouts(path):
+    """{'series': store, 'frames': store} for up-to-date copies of ``path``, or {}."""
+    manifest_path = layout_base(path) + ".json"
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("fingerprint") != file_fingerprint(path):
+        return {}  # The source changed since it was re-chunked
+    stores = manifest.get("stores", {})
+    return {kind: store for kind, store in stores.items() if os.path.exists(store)}
+
+
+def open_store(store):
+    if store.endswith(".zarr"):
+        return xr.open_zarr(store, consolidated=None)
+    return xr.open_dataset(store)
+
+
+class _NetCDFStore:
+    def __init__(self, path, coords):
+        self.dataset = netCDF4.Dataset(path, "w")
+        for name, (values, attrs) in coords.items():
+            self.dataset.createDimension(name, len(values))
+            var = self.dataset.createVariable(name, values.dtype, (name,))
+            var[:] = values
+            var.setncatts(attrs)
+
+    def create(self, name, dims, shape, chunks, dtype, attrs):
+        var = self.dataset.createVariable(
+            name, dtype, dims, zlib=True, complevel=1, chunksizes=chunks, fill_value=np.nan,
+        )
+        var.setncatts(attrs)
+
+    def write(self, name, region, block):
+        self.dataset[name][region] = block
+
+    def close(self, attrs):
+        self.dataset.setncatts(attrs)
+        self.dataset.close()
+
+
+class _ZarrStore:
+    def __init__(self, path, coords):
+        self.path = path
+        self.group = zarr.open_group(path, mode="w")
+        for name, (values, attrs) in coords.items():
+            array = self._create(name, (name,), values.shape, values.shape, values.dtype, attrs)
+            array[:] = values
+
+    def _create(self, name, dims, shape, chunks, dtype, attrs, fill_value=None):
+        if hasattr(self.group, "create_array"):  # zarr 3
+            array = self.group.create_array(
+                name, shape=shape, chunks=chunks, dtype=dtype,
+                fill_value=fill_value, dimension_names=dims,
+            )
+        else:  # zarr 2 keeps xarray's dimension names in an attribute
+            array = self.group.create_dataset(name, shape=shape, chunks=chunks, dtype=dtype, fill_value=fill_value)
+            array.attrs["_ARRAY_DIMENSIONS"] = list(dims)
+        array.attrs.update(attrs)
+        return array
+
+    def create(self, name, dims, shape, chunks, dtype, attrs):
+        self._create(name, dims, shape, chunks, dtype, attrs, fill_value=np.nan)
+
+    def write(self, name, region, block):
+        self.group[name][region] = block
+
+    def close(self, attrs):
+        self.group.attrs.update(attrs)
+        zarr.consolidate_metadata(self.path)
+
+
+def _clean_attrs(attrs):
+    return {
+        key: value for key, value in attrs.items()
+        if isinstance(value, (str, int, float)) and not key.startswith("_")
+    }
+
+
+def _frames_needed(variable):
+    """True unless a variable is already stored one whole time slice per chunk (or contiguously).
+
+    DRYP writes outputs a slice at a time, so a 'frames' copy of those would tie with
+    the original in route() and never be read.
+    """
+    chunks = variable.encoding.get("chunksizes")
+    return chunks is not None and tuple(chunks) != (1,) + tuple(variable.shape[1:])
+
+
+def rechunk_dataset(path, variables=None, fmt=None, progress=None):
+    """Write a time-contiguous ('series') copy of a file, plus a space-contiguous
+    ('frames') copy when the source isn't already stored one time slice per chunk.
+
+    The source is read once per copy, in full-grid time slabs that stay within
+    DEFAULT_BLOCK_BYTES, and each slab covers whole target chunks, so nothing is
+    read twice or rewritten. On grids too large for a SERIES_TIME_CHUNK slab the
+    series chunks get shorter in time instead. Close the file's current copies
+    (DatasetManager.unregister_layouts) before re-running a conversion.
+    Returns the {kind: store} mapping.
+    """
+    fmt = fmt or ("zarr" if zarr is not None else "netcdf")
+    if fmt == "zarr" and zarr is None:
+        raise RuntimeError("Zarr is not installed; use the NetCDF4 layout instead.")
+    source = xr.open_dataset(path)
+    try:
+        variables = variables or [
+            var for var in source.data_vars
+            if source[var].dims == ("time", "lat", "lon")
+            and np.issubdtype(source[var].dtype, np.number)
+        ]
+        if not variables:
+            raise ValueError("No (time, lat, lon) variables to re-chunk.")
+        n_time, n_lat, n_lon = (source.sizes[dim] for dim in ("time", "lat", "lon"))
+
+        calendar = source["time"].encoding.get("calendar", "standard")
+        coords = {
+            "time": (np.asarray(encode_times(source["time"].values, calendar), dtype=np.float64),
+                     {"units": TIME_UNITS, "calendar": calendar}),
+            "lat": (source["lat"].values, _clean_attrs(source["lat"].attrs)),
+            "lon": (source["lon"].values, _clean_attrs(source["lon"].attrs)),
+        }
+        tile = (min(n_lat, SERIES_TILE), min(n_lon, SERIES_TILE))
+        kinds = ("series", "frames") if any(_frames_needed(source[var]) for var in variables) else ("series",)
+
+        base = layout_base(path)
+        # Invalidate the old copies before overwriting them, so an interrupted re-run is never used
+        if os.path.exists(base + ".json"):
+            os.remove(base + ".json")
+        extension = ".zarr" if fmt == "zarr" else ".nc"
+        stores = {kind: f"{base}.{kind}{extension}" for kind in kinds}
+        for stale in (f"{base}.frames.zarr", f"{base}.frames.nc"):  # e.g. from an earlier conversion
+            if stale not in stores.values() and os.path.exists(stale):
+                shutil.rmtree(stale) if os.path.isdir(stale) else os.remove(stale)
+        store_class = _ZarrStore if fmt == "zarr" else _NetCDFStore
+
+        total_steps = len(kinds) * len(variables)
+        done = 0
+        for kind, store_path in stores.items():
+            store = store_class(store_path, coords)
+            for var in variables:
+                dtype = source[var].dtype if source[var].dtype.kind == "f" else np.dtype("float64")
+                # Source files are written per time slice, so both copies read full-grid time slabs:
+                # every source chunk is decompressed once, however tall the grid is
+                step = time_chunk_for(n_lat * n_lon, dtype.itemsize)
+                if kind == "series":
+                    # One slab per series time chunk, so every tile of the slab is written whole
+                    step = min(n_time, SERIES_TIME_CHUNK, step)
+                    chunks = (step,) + tile
+                else:
+                    chunks = (1, n_lat, n_lon)
+                store.create(var, ("time", "lat", "lon"), (n_time, n_lat, n_lon), chunks,
+                             dtype, _clean_attrs(source[var].attrs))
+                for start in range(0, n_time, step):
+                    stop = min(start + step, n_time)
+                    block = source[var].isel(time=slice(start, stop)).values
+                    store.write(var, (slice(start, stop), slice(None), slice(None)), block)
+                done += 1
+                if progress is not None:
+                    progress(done / total_steps)
+            store.close({"source": os.path.abspath(path), "layout": kind})
+
+        # The manifest is written last (and atomically), so an interrupted conversion is never used
+        with open(base + ".json.tmp", "w") as f:
+            json.dump({"fingerprint": file_fingerprint(path), "format": fmt,
+                       "stores": stores, "variables": variables}, f, indent=2)
+        os.replace(base + ".json.tmp", base + ".json")
+        return stores
+    finally:
+        source.close()
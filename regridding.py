@@ -0,0 +1,258 @@
+import os
+import hashlib
+import numpy as np
+
+from cache_utils import LRUCache, get_cache_dir
+from export_writers import TIME_UNITS, encode_times
+from extraction import iter_time_chunks, time_chunk_for
+from projection import _nearest, same_crs, transform_xy
+
+REGRID_METHODS = ["Conservative", "Bilinear", "Nearest"]
+REGRID_TARGETS = ["Resolution", "Grid of another NetCDF"]
+# Sub-cells per source cell edge when conservative weights cross CRSs
+SUPERSAMPLE = 4
+
+_weights = LRUCache(max_bytes=512 * 1024 ** 2)
+
+
+def cell_edges(centres):
+    """Cell edges (n + 1) of 1-D cell centres, halfway between neighbours."""
+    centres = np.asarray(centres, dtype=np.float64)
+    if centres.size == 1:
+        return np.array([centres[0] - 0.5, centres[0] + 0.5])
+    middle = (centres[1:] + centres[:-1]) / 2
+    return np.concatenate([[2 * centres[0] - middle[0]], middle, [2 * centres[-1] - middle[-1]]])
+
+
+def target_grid(bounds, resolution):
+    """(x, y) cell centres of a north-up grid of ``resolution`` covering (xmin, ymin, xmax, ymax).
+
+    Edges snap to multiples of the resolution, so grids built for different inputs line up.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    x0, x1 = np.floor(xmin / resolution) * resolution, np.ceil(xmax / resolution) * resolution
+    y0, y1 = np.floor(ymin / resolution) * resolution, np.ceil(ymax / resolution) * resolution
+    xs = np.arange(x0, x1, resolution) + resolution / 2
+    ys = np.arange(y1, y0, -resolution) - resolution / 2
+    return xs, ys
+
+
+def grid_coordinates(dataset):
+    """(x, y) cell centres of a NetCDF dataset's grid, from lon/lat or x/y coordinates."""
+    for x_name, y_name in (("lon", "lat"), ("x", "y"), ("longitude", "latitude")):
+        if x_name in dataset.coords and y_name in dataset.coords:
+            return dataset[x_name].values, dataset[y_name].values
+    raise ValueError("The dataset has no lon/lat or x/y coordinates.")
+
+
+def grid_bounds(xs, ys, src_crs, dst_crs):
+    """Bounds in ``dst_crs`` of the grid with cell centres xs, ys in ``src_crs``."""
+    x_edges, y_edges = cell_edges(xs), cell_edges(ys)
+    outline_x = np.concatenate([x_edges, np.full(y_edges.size, x_edges[-1]), x_edges, np.full(y_edges.size, x_edges[0])])
+    outline_y = np.concatenate([np.full(x_edges.size, y_edges[0]), y_edges, np.full(x_edges.size, y_edges[-1]), y_edges])
+    bx, by = transform_xy(outline_x, outline_y, src_crs, dst_crs)
+    return float(np.nanmin(bx)), float(np.nanmin(by)), float(np.nanmax(bx)), float(np.nanmax(by))
+
+
+def _overlaps(src_edges, dst_edges):
+    """(dst index, src index, overlap length) of every overlapping pair of 1-D cells."""
+    src_lo, src_hi = np.minimum(src_edges[:-1], src_edges[1:]), np.maximum(src_edges[:-1], src_edges[1:])
+    dst_lo, dst_hi = np.minimum(dst_edges[:-1], dst_edges[1:]), np.maximum(dst_edges[:-1], dst_edges[1:])
+    overlap = np.minimum(dst_hi[:, None], src_hi[None, :]) - np.maximum(dst_lo[:, None], src_lo[None, :])
+    dst, src = np.nonzero(overlap > 0)
+    return dst, src, overlap[dst, src]
+
+
+def conservative_weights(src_x, src_y, dst_x, dst_y, src_crs=None, dst_crs=None):
+    """(target cell, source cell, weight) for area-weighted averaging.
+
+    On a shared CRS the overlap of two cells is the product of their x and y
+    overlaps, so weights come from two small 1-D overlap tables. Across CRSs each
+    source cell is split into SUPERSAMPLE x SUPERSAMPLE parts, which are projected
+    and counted towards the target cell they land in.
+    """
+    nx = len(src_x)
+    tx = len(dst_x)
+    if same_crs(src_crs, dst_crs):
+        ty_idx, sy_idx, wy = _overlaps(cell_edges(src_y), cell_edges(dst_y))
+        tx_idx, sx_idx, wx = _overlaps(cell_edges(src_x), cell_edges(dst_x))
+        targets = (ty_idx[:, None] * tx + tx_idx[None, :]).ravel()
+        sources = (sy_idx[:, None] * nx + sx_idx[None, :]).ravel()
+        return targets, sources, (wy[:, None] * wx[None, :]).ravel()
+
+    x_edges, y_edges = cell_edges(src_x), cell_edges(src_y)
+    fractions = (np.arange(SUPERSAMPLE) + 0.5) / SUPERSAMPLE
+    sub_x = (x_edges[:-1, None] + np.diff(x_edges)[:, None] * fractions).ravel()
+    sub_y = (y_edges[:-1, None] + np.diff(y_edges)[:, None] * fractions).ravel()
+    grid_x, grid_y = np.meshgrid(sub_x, sub_y)
+    px, py = transform_xy(grid_x, grid_y, src_crs, dst_crs)
+    rows, cols = _nearest(np.asarray(dst_y), np.asarray(py)), _nearest(np.asarray(dst_x), np.asarray(px))
+    inside = (rows >= 0) & (cols >= 0)
+    source_rows = np.repeat(np.arange(len(src_y)), SUPERSAMPLE)[:, None]
+    source_cols = np.repeat(np.arange(nx), SUPERSAMPLE)[None, :]
+    sources = np.broadcast_to(source_rows * nx + source_cols, inside.shape)[inside]
+    targets = (rows * tx + cols)[inside]
+    # Each part carries an equal share of its source cell's area (in source units)
+    area = np.abs(np.outer(np.diff(y_edges), np.diff(x_edges))).ravel() / SUPERSAMPLE ** 2
+    return targets, sources, area[sources]
+
+
+def bilinear_weights(src_x, src_y, dst_x, dst_y, src_crs=None, dst_crs=None):
+    """(target cell, source cell, weight) interpolating between the four surrounding centres."""
+    grid_x, grid_y = np.meshgrid(dst_x, dst_y)
+    px, py = transform_xy(grid_x, grid_y, dst_crs, src_crs)
+    targets = np.arange(grid_x.size)
+    parts = []
+    fractional = []
+    for coords, values in ((np.asarray(src_y, dtype=np.float64), np.ravel(py)),
+                           (np.asarray(src_x, dtype=np.float64), np.ravel(px))):
+        order = np.argsort(coords)  # Latitudes usually run north to south
+        position = np.interp(values, coords[order], np.arange(coords.size), left=np.nan, right=np.nan)
+        low = np.clip(np.floor(np.nan_to_num(position)), 0, max(0, coords.size - 2)).astype(np.int64)
+        fraction = np.nan_to_num(position) - low
+        fractional.append((order, low, np.minimum(low + 1, coords.size - 1), fraction, np.isfinite(position)))
+    (y_order, y_low, y_high, fy, y_ok), (x_order, x_low, x_high, fx, x_ok) = fractional
+    inside = y_ok & x_ok
+    nx = len(src_x)
+    for y_index, wy in ((y_low, 1 - fy), (y_high, fy)):
+        for x_index, wx in ((x_low, 1 - fx), (x_high, fx)):
+            weight = wy * wx
+            keep = inside & (weight > 0)
+            parts.append((targets[keep], (y_order[y_index] * nx + x_order[x_index])[keep], weight[keep]))
+    return tuple(np.concatenate(values) for values in zip(*parts))
+
+
+def nearest_weights(src_x, src_y, dst_x, dst_y, src_crs=None, dst_crs=None):
+    """(target cell, source cell, 1) for the source cell containing each target centre."""
+    grid_x, grid_y = np.meshgrid(dst_x, dst_y)
+    px, py = transform_xy(grid_x, grid_y, dst_crs, src_crs)
+    rows = _nearest(np.asarray(src_y, dtype=np.float64), np.asarray(py)).ravel()
+    cols = _nearest(np.asarray(src_x, dtype=np.float64), np.asarray(px)).ravel()
+    inside = (rows >= 0) & (cols >= 0)
+    return np.flatnonzero(inside), (rows * len(src_x) + cols)[inside], np.ones(int(inside.sum()))
+
+
+_BUILDERS = {"Conservative": conservative_weights, "Bilinear": bilinear_weights, "Nearest": nearest_weights}
+
+
+class RegridWeights:
+    """Sparse source-to-target weights, sorted by target and applied with grouped reductions.
+
+    Only the window of the source grid that any weight touches is read. A (time,
+    window) block is gathered to (time, nnz), multiplied by the weights and summed
+    per target with np.add.reduceat; dividing by the weight of the valid sources
+    keeps targets on the coast or over missing cells unbiased.
+    """
+
+    def __init__(self, targets, sources, weights, source_shape, target_shape):
+        order = np.argsort(targets, kind="stable")
+        targets, sources, weights = targets[order], sources[order], weights[order]
+        self.target_shape = tuple(target_shape)
+        self.targets, self.starts = np.unique(targets, return_index=True)
+        rows, cols = np.divmod(sources, source_shape[1])
+        if sources.size:
+            self.lat_slice = slice(int(rows.min()), int(rows.max()) + 1)
+            self.lon_slice = slice(int(cols.min()), int(cols.max()) + 1)
+        else:
+            self.lat_slice = self.lon_slice = slice(0, 0)
+        width = self.lon_slice.stop - self.lon_slice.start
+        self.cells = (rows - self.lat_slice.start) * width + (cols - self.lon_slice.start)
+        self.weights = weights.astype(np.float64)
+        self.nbytes = self.targets.nbytes + self.starts.nbytes + self.cells.nbytes + self.weights.nbytes
+
+    @property
+    def window_cells(self):
+        return (self.lat_slice.stop - self.lat_slice.start) * (self.lon_slice.stop - self.lon_slice.start)
+
+    def apply(self, window):
+        """(time, target rows, target cols) from a (time, lat, lon) block of the source window."""
+        n_time = window.shape[0]
+        out = np.full((n_time, self.target_shape[0] * self.target_shape[1]), np.nan)
+        if self.cells.size:
+            values = window.reshape(n_time, -1)[:, self.cells]
+            valid = ~np.isnan(values)
+            total = np.add.reduceat(np.where(valid, values * self.weights, 0.0), self.starts, axis=1)
+            weight = np.add.reduceat(valid * self.weights, self.starts, axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[:, self.targets] = np.where(weight > 0, total / weight, np.nan)
+        return out.reshape(n_time, *self.target_shape)
+
+    def save(self, path):
+        np.savez(path, targets=self.targets, starts=self.starts, cells=self.cells, weights=self.weights,
+                 window=[self.lat_slice.start, self.lat_slice.stop, self.lon_slice.start, self.lon_slice.stop],
+                 target_shape=self.target_shape)
+
+    @classmethod
+    def load(cls, path):
+        stored = np.load(path)
+        weights = cls.__new__(cls)
+        weights.targets, weights.starts = stored["targets"], stored["starts"]
+        weights.cells, weights.weights = stored["cells"], stored["weights"]
+        lat0, lat1, lon0, lon1 = (int(v) for v in stored["window"])
+        weights.lat_slice, weights.lon_slice = slice(lat0, lat1), slice(lon0, lon1)
+        weights.target_shape = tuple(int(v) for v in stored["target_shape"])
+        weights.nbytes = weights.targets.nbytes + weights.starts.nbytes + weights.cells.nbytes + weights.weights.nbytes
+        return weights
+
+
+def _grid_key(xs, ys):
+    xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    return hashlib.sha1(xs.tobytes() + ys.tobytes()).hexdigest()
+
+
+def regrid_weights(method, src_x, src_y, dst_x, dst_y, src_crs=None, dst_crs=None):
+    """RegridWeights for a grid pair, from memory, else the disk cache, else computed and cached."""
+    key = hashlib.sha1("|".join([
+        method, _grid_key(src_x, src_y), _grid_key(dst_x, dst_y),
+        src_crs.to_wkt() if src_crs is not None else "", dst_crs.to_wkt() if dst_crs is not None else "",
+    ]).encode()).hexdigest()
+    weights = _weights.get(key)
+    if weights is not None:
+        return weights
+    path = os.path.join(get_cache_dir("regrid"), f"{key}.npz")
+    if os.path.exists(path):
+        weights = RegridWeights.load(path)
+    else:
+        targets, sources, values = _BUILDERS[method](src_x, src_y, dst_x, dst_y, src_crs, dst_crs)
+        weights = RegridWeights(targets, sources, values, (len(src_y), len(src_x)), (len(dst_y), len(dst_x)))
+        weights.save(path)
+    _weights.put(key, weights)
+    return weights
+
+
+def write_regridded(variable, weights, out_path, name, dst_x, dst_y, dst_crs=None, progress=None):
+    """Regrid every time step of a variable into a chunked, compressed NetCDF file.
+
+    Time chunks of the source window are read, regridded and written one after
+    another, so memory stays at one chunk whatever the length of the series.
+    """
+    import netCDF4
+    times = variable["time"].values
+    chunk = time_chunk_for(max(weights.window_cells, len(dst_x) * len(dst_y)))
+    with netCDF4.Dataset(out_path, "w") as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("lat", len(dst_y))
+        dataset.createDimension("lon", len(dst_x))
+        time_var = dataset.createVariable("time", "f8", ("time",))
+        time_var.units = TIME_UNITS
+        time_var.calendar = getattr(times.flat[0], "calendar", None) or "standard"
+        dataset.createVariable("lat", "f8", ("lat",))[:] = dst_y
+        dataset.createVariable("lon", "f8", ("lon",))[:] = dst_x
+        data = dataset.createVariable(
+            name, "f4", ("time", "lat", "lon"), zlib=True, complevel=4, fill_value=np.float32(np.nan),
+            chunksizes=(max(1, min(chunk, 64)), len(dst_y), len(dst_x)),
+        )
+        data.units = variable.attrs.get("units", "")
+        data.long_name = name
+        if dst_crs is not None:
+            mapping = dataset.createVariable("crs", "i4")
+            mapping.crs_wkt = dst_crs.to_wkt()
+            data.grid_mapping = "crs"
+        dataset.source = "CUWALID App regridding"
+
+        for start, end in iter_time_chunks(variable, chunk):
+            window = variable.read(time=slice(start, end), lat=weights.lat_slice, lon=weights.lon_slice)
+            data[start:end] = weights.apply(np.asarray(window, dtype=np.float64))
+            time_var[start:end] = encode_times(times[start:end], time_var.calendar)
+            if progress:
+                progress(end / len(times))
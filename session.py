@@ -0,0 +1,185 @@
+import os
+import json
+import pickle
+import hashlib
+import rasterio
+import pandas as pd
+import geopandas as gpd
+
+from cache_utils import get_cache_dir, file_fingerprint
+from export_writers import read_table
+
+SESSION_VERSION = 1
+SESSION_FILTER = "CUWALID Session (*.cuwalid.json)"
+
+# Widgets (attributes of the main window) whose state is kept in a session
+SESSION_WIDGETS = [
+    "raster_checkbox", "shapefile_checkbox", "xy_checkbox", "display_crs_input",
+    "grid_precision", "precision_tolerance",
+    "subset_source", "subset_bbox", "subset_start", "subset_end",
+    "aggregation_frequency", "aggregation_statistic", "aggregation_output",
+    "summary_statistic", "summary_parameter", "summary_start", "summary_end", "summary_workers",
+    "region_source", "point_selector_list", "extract_variables_list", "extraction_workers",
+    "queue_extraction_checkbox", "csv_var_selector_1", "y_axis_label_1", "csv_var_selector_2", "y_axis_label_2",
+    "csv_aggregation_frequency", "csv_aggregation_statistic", "csv_aggregation_output",
+    "skill_pairing", "skill_breakdown", "skill_rank_by", "job_concurrency",
+    "regrid_method", "regrid_target", "regrid_resolution", "regrid_crs",
+    "batch_start", "batch_end", "batch_every", "batch_workers",
+]
+
+
+def read_raster(path):
+    """(data, extent, crs WKT or None) of a single-band raster."""
+    with rasterio.open(path) as src:
+        data = src.read(1)
+        extent = [src.bounds.left, src.bounds.right, src.bounds.bottom, src.bounds.top]
+        crs = src.crs.to_wkt() if src.crs else None  # ASCII grids usually have none
+    return data, extent, crs
+
+
+# Loaded sources: session key -> (main window attribute, reader)
+SOURCES = {
+    "raster": ("raster_data", lambda path: load_source(path, read_raster)[:2]),
+    "shapefile": ("shapefile_data", lambda path: load_source(path, gpd.read_file)),
+    "xy": ("xy_data", lambda path: load_source(path, pd.read_csv)),
+    "csv_1": ("csv_dataframe_1", lambda path: load_source(path, read_table)),
+    "csv_2": ("csv_dataframe_2", lambda path: load_source(path, read_table)),
+    "points": ("points_csv_data", lambda path: load_source(path, pd.read_csv)),
+}
+
+
+def source_cache_path(path):
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(get_cache_dir("sources"), f"{name}.pkl")
+
+
+def load_source(path, read):
+    """``read(path)``, answered from a binary copy in the cache while the file is unchanged.
+
+    Unpickling a parsed raster, GeoDataFrame or table is much faster than re-parsing
+    ASCII grids, shapefiles and CSVs; the copy is keyed by path and rewritten when
+    the file's size or modification time changes.
+    """
+    fingerprint = file_fingerprint(path)
+    cache_path = source_cache_path(path)
+    try:
+        with open(cache_path, "rb") as f:
+            cached_fingerprint, value = pickle.load(f)
+        if cached_fingerprint == fingerprint:
+            return value
+    except Exception:
+        pass  # Missing, stale or unreadable: parse the source again
+    value = read(path)
+    try:
+        with open(cache_path + ".tmp", "wb") as f:
+            pickle.dump((fingerprint, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+    except Exception as e:
+        print(f"Could not cache {path}: {e}")
+    return value
+
+
+class LazySource:
+    """A restored source that is read the first time something asks for its value."""
+
+    def __init__(self, path, read):
+        self.path = path
+        self.read = read
+
+    def load(self):
+        return self.read(self.path)
+
+
+class LazyAttribute:
+    """Instance attribute that resolves a LazySource on first access and keeps the value."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.name)
+        if isinstance(value, LazySource):
+            value = value.load()
+            obj.__dict__[self.name] = value
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+
+def widget_state(widget):
+    # Qt is imported here, not at the top, so headless batch rendering can use the source cache
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QCheckBox, QComboBox, QLineEdit, QListWidget, QSpinBox
+    from ui.table_models import CheckableSelector
+    if isinstance(widget, CheckableSelector):
+        return widget.state()
+    if isinstance(widget, QCheckBox):
+        return widget.isChecked()
+    if isinstance(widget, QLineEdit):
+        return widget.text()
+    if isinstance(widget, QComboBox):
+        return widget.currentText()
+    if isinstance(widget, QSpinBox):
+        return widget.value()
+    if isinstance(widget, QListWidget):
+        return [
+            [widget.item(i).text(), widget.item(i).checkState() == Qt.CheckState.Checked]
+            for i in range(widget.count())
+        ]
+    return None
+
+
+def set_widget_state(widget, state):
+    """Restore a widget_state() value without firing the widget's signals."""
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QCheckBox, QComboBox, QLineEdit, QListWidget, QListWidgetItem, QSpinBox
+    from ui.table_models import CheckableSelector
+    widget.blockSignals(True)
+    try:
+        if isinstance(widget, QCheckBox):
+            widget.setChecked(bool(state))
+        elif isinstance(widget, QLineEdit):
+            widget.setText(state)
+        elif isinstance(widget, QComboBox):
+            if widget.findText(state) >= 0:
+                widget.setCurrentText(state)
+        elif isinstance(widget, QSpinBox):
+            widget.setValue(int(state))
+        elif isinstance(widget, CheckableSelector):
+            widget.set_state(state)
+            widget.setEnabled(widget.count() > 0)
+        elif isinstance(widget, QListWidget):
+            widget.clear()
+            for text, checked in state:
+                item = QListWidgetItem(text)
+                item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+                widget.addItem(item)
+            widget.setEnabled(widget.count() > 0)
+    finally:
+        widget.blockSignals(False)
+
+
+def encode_subsets(subsets):
+    return {path: {dim: [w.start, w.stop] for dim, w in indexers.items()} for path, indexers in subsets.items()}
+
+
+def decode_subsets(subsets):
+    return {path: {dim: slice(*window) for dim, window in indexers.items()} for path, indexers in subsets.items()}
+
+
+def write_session(path, state):
+    state = dict(state, version=SESSION_VERSION)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def read_session(path):
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("version", 0) > SESSION_VERSION:
+        raise ValueError("The session was saved by a newer version of the app.")
+    return state
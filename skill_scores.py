@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from temporal_aggregation import SEASON_NAMES, calendar_fields
+
+METRICS = ["NSE", "KGE", "r", "Bias", "PBIAS (%)", "RMSE"]
+# Metrics where larger is better; the rest rank by smallest absolute value
+HIGHER_IS_BETTER = {"NSE", "KGE", "r"}
+PAIRINGS = ["Matching names", "All pairs"]
+BREAKDOWNS = ["Whole period", "Season", "Year"]
+# Pair columns gathered per block, so (time x pairs) work arrays stay around this many values
+BLOCK_VALUES = 8 * 1024 ** 2
+
+
+def pair_columns(observed, simulated, pairing="Matching names"):
+    """(observed, simulated) column pairs.
+
+    'Matching names' pairs an observed column with the simulated column of the same
+    name and with ensemble members named after it ('Q12_m01', 'Q12.3'); 'All pairs'
+    scores every simulated column against every observed one.
+    """
+    if pairing == "All pairs":
+        return [(obs, sim) for obs in observed for sim in simulated]
+    pairs = []
+    for obs in observed:
+        for sim in simulated:
+            if sim == obs or (sim.startswith(obs) and sim[len(obs)] in "_.-"):
+                pairs.append((obs, sim))
+    return pairs
+
+
+def find_date_column(df):
+    """Name of a table's date column, matched case-insensitively ('Date', 'date', 'DATE')."""
+    for column in df.columns:
+        if str(column).lower() == "date":
+            return column
+    raise ValueError("No 'Date' column found.")
+
+
+def align_on_dates(df1, df2, date_column=None):
+    """Dates present in both tables and the row of each table for them (one join for all pairs).
+
+    Without ``date_column`` each table's own date column is found by name, in any case.
+    """
+    dates1 = pd.to_datetime(df1[date_column or find_date_column(df1)]).values
+    dates2 = pd.to_datetime(df2[date_column or find_date_column(df2)]).values
+    dates, rows1, rows2 = np.intersect1d(dates1, dates2, assume_unique=False, return_indices=True)
+    return dates, rows1, rows2
+
+
+def breakdown_groups(dates, breakdown="Whole period"):
+    """[(label, row mask)] splitting the aligned dates into seasons or years."""
+    if breakdown == "Whole period":
+        return [("All", np.ones(len(dates), dtype=bool))]
+    year, month = calendar_fields(dates)
+    if breakdown == "Season":
+        season = (month % 12) // 3
+        return [(name, season == i) for i, name in enumerate(SEASON_NAMES) if (season == i).any()]
+    if breakdown == "Year":
+        return [(str(y), year == y) for y in np.unique(year)]
+    raise ValueError(f"Unknown breakdown: {breakdown}")
+
+
+def skill_metrics(obs, sim):
+    """Every metric for each column of (time, pair) arrays, over the rows where both are finite."""
+    valid = np.isfinite(obs) & np.isfinite(sim)
+    n = valid.sum(axis=0)
+    obs = np.where(valid, obs, 0.0)
+    sim = np.where(valid, sim, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sum_obs = obs.sum(axis=0)
+        mean_obs = sum_obs / n
+        mean_sim = sim.sum(axis=0) / n
+        dev_obs = np.where(valid, obs - mean_obs, 0.0)
+        dev_sim = np.where(valid, sim - mean_sim, 0.0)
+        ss_obs = (dev_obs ** 2).sum(axis=0)
+        ss_sim = (dev_sim ** 2).sum(axis=0)
+        error = sim - obs  # Zero where either is missing
+        sse = (error ** 2).sum(axis=0)
+        r = (dev_obs * dev_sim).sum(axis=0) / np.sqrt(ss_obs * ss_sim)
+        alpha = np.sqrt(ss_sim / ss_obs)
+        beta = mean_sim / mean_obs
+        return {
+            "N": n,
+            "NSE": 1 - sse / ss_obs,
+            "KGE": 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2),
+            "r": r,
+            "Bias": mean_sim - mean_obs,
+            "PBIAS (%)": 100 * error.sum(axis=0) / sum_obs,
+            "RMSE": np.sqrt(sse / n),
+        }
+
+
+def score_pairs(df1, df2, pairs, breakdown="Whole period", rank_by="KGE", date_column=None):
+    """Ranked skill table for observed (df1) vs simulated (df2) column pairs.
+
+    The tables are aligned on their dates once and read into two float arrays; each
+    breakdown group then scores blocks of pairs with whole-array operations, so
+    thousands of pairs cost a few passes over memory rather than a loop per pair.
+    """
+    dates, rows1, rows2 = align_on_dates(df1, df2, date_column)
+    if len(dates) == 0:
+        raise ValueError("The two datasets have no dates in common.")
+    obs_names = list(dict.fromkeys(obs for obs, _ in pairs))
+    sim_names = list(dict.fromkeys(sim for _, sim in pairs))
+    observed = df1[obs_names].to_numpy(dtype=np.float64)[rows1]
+    simulated = df2[sim_names].to_numpy(dtype=np.float64)[rows2]
+    obs_position = {name: i for i, name in enumerate(obs_names)}
+    sim_position = {name: i for i, name in enumerate(sim_names)}
+    obs_index = np.array([obs_position[obs] for obs, _ in pairs])
+    sim_index = np.array([sim_position[sim] for _, sim in pairs])
+
+    tables = []
+    for label, rows in breakdown_groups(dates, breakdown):
+        obs_rows, sim_rows = observed[rows], simulated[rows]
+        block = max(1, BLOCK_VALUES // max(1, len(obs_rows)))
+        parts = []
+        for start in range(0, len(pairs), block):
+            stop = min(start + block, len(pairs))
+            parts.append(skill_metrics(obs_rows[:, obs_index[start:stop]], sim_rows[:, sim_index[start:stop]]))
+        table = pd.DataFrame({name: np.concatenate([part[name] for part in parts]) for name in parts[0]})
+        table.insert(0, "Simulated", [sim for _, sim in pairs])
+        table.insert(0, "Observed", [obs for obs, _ in pairs])
+        table.insert(0, "Group", label)
+        tables.append(rank_table(table, rank_by))
+    return pd.concat(tables, ignore_index=True)
+
+
+def rank_table(table, rank_by="KGE"):
+    """Sort pairs best first by one metric and number them (pairs without a score go last)."""
+    key = table[rank_by] if rank_by in HIGHER_IS_BETTER else -table[rank_by].abs()
+    table = table.assign(_key=key).sort_values("_key", ascending=False, na_position="last", kind="stable")
+    table = table.drop(columns="_key").reset_index(drop=True)
+    table.insert(1, "Rank", np.arange(1, len(table) + 1))
+    return table
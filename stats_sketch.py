@@ -0,0 +1,200 @@
+import os
+import json
+import math
+import hashlib
+import numpy as np
+
+from cache_utils import LRUCache, get_cache_dir
+from extraction import time_chunk_for
+
+# Quantiles are accurate to within this relative error of the true value
+SKETCH_ACCURACY = 0.01
+# |values| below this count as zero (log buckets can't represent zero)
+SKETCH_MIN_VALUE = 1e-12
+
+_memory = LRUCache(max_items=256)  # Sketches already loaded this session
+
+
+class StatsSketch:
+    """Mergeable one-pass summary: count, mean, variance, extremes and a quantile sketch.
+
+    Quantiles come from logarithmic buckets (as in DDSketch): a value x falls in
+    bucket ceil(log_gamma |x|), so every quantile is within SKETCH_ACCURACY of the
+    true value whatever the range of the data, in a few thousand buckets at most.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.nan_count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0
+        self.positive = {}  # bucket index -> count
+        self.negative = {}
+
+    def _add_buckets(self, buckets, magnitudes):
+        indices = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+        keys, counts = np.unique(indices, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def update(self, block):
+        values = np.asarray(block, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        self.nan_count += int(values.size - finite.sum())
+        values = values[finite]
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.sum_sq += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        magnitudes = np.abs(values)
+        zero = magnitudes < SKETCH_MIN_VALUE
+        self.zero_count += int(zero.sum())
+        self._add_buckets(self.positive, values[(values > 0) & ~zero])
+        self._add_buckets(self.negative, -values[(values < 0) & ~zero])
+
+    def merge(self, other):
+        self.count += other.count
+        self.nan_count += other.nan_count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        return self
+
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate q-th quantile (0-1) of the finite values, or NaN if there are none."""
+        if self.count == 0:
+            return math.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        # Ascending order: large negative magnitudes first, then zero, then positives
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(self.min, -self._bucket_value(key))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self.max, self._bucket_value(key))
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0, "missing": self.nan_count}
+        mean = self.sum / self.count
+        variance = max(0.0, self.sum_sq / self.count - mean ** 2)
+        return {
+            "count": self.count,
+            "missing": self.nan_count,
+            "min": self.min,
+            "max": self.max,
+            "mean": mean,
+            "std": math.sqrt(variance),
+            "p2": self.quantile(0.02),
+            "median": self.quantile(0.5),
+            "p98": self.quantile(0.98),
+        }
+
+    def to_dict(self):
+        return {
+            "accuracy": self.accuracy, "count": self.count, "nan_count": self.nan_count,
+            "sum": self.sum, "sum_sq": self.sum_sq, "min": self.min, "max": self.max,
+            "zero_count": self.zero_count,
+            "positive": {str(key): count for key, count in self.positive.items()},
+            "negative": {str(key): count for key, count in self.negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["accuracy"])
+        for name in ("count", "nan_count", "sum", "sum_sq", "min", "max", "zero_count"):
+            setattr(sketch, name, data[name])
+        sketch.positive = {int(key): count for key, count in data["positive"].items()}
+        sketch.negative = {int(key): count for key, count in data["negative"].items()}
+        return sketch
+
+
+def robust_limits(sketch, low=0.02, high=0.98):
+    """Colour limits that ignore the most extreme values, or None if there's no data."""
+    if sketch is None or sketch.count == 0:
+        return None
+    vmin, vmax = sketch.quantile(low), sketch.quantile(high)
+    if not vmin < vmax:
+        vmin, vmax = sketch.min, sketch.max
+    return vmin, vmax
+
+
+def _sketch_path(registry, path, var_name):
+    digest = hashlib.sha1("|".join(registry.identity(path, var_name)).encode()).hexdigest()
+    return os.path.join(get_cache_dir("stats"), f"{digest}.json")
+
+
+def cached_sketch(registry, path, var_name):
+    """Sketch of a variable if it has already been computed for this file, else None."""
+    sketch_path = _sketch_path(registry, path, var_name)
+    sketch = _memory.get(sketch_path)
+    if sketch is None and os.path.exists(sketch_path):
+        try:
+            with open(sketch_path) as f:
+                sketch = StatsSketch.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        _memory.put(sketch_path, sketch)
+    return sketch
+
+
+def variable_sketch(registry, path, var_name, progress=None):
+    """Sketch of every value of a variable, computed in one streaming pass and cached per file."""
+    sketch = cached_sketch(registry, path, var_name)
+    if sketch is not None:
+        return sketch
+
+    variable = registry.open(path, var_name)
+    sketch = StatsSketch()
+    if "time" in variable.dims:
+        n_time = variable.sizes["time"]
+        chunk = time_chunk_for(int(np.prod(variable.shape)) // max(1, n_time))
+        for start in range(0, n_time, chunk):
+            sketch.update(variable.isel(time=slice(start, start + chunk)).values)
+            if progress is not None:
+                progress(min(start + chunk, n_time) / n_time)
+    else:
+        sketch.update(variable.values)
+
+    sketch_path = _sketch_path(registry, path, var_name)
+    with open(sketch_path + ".tmp", "w") as f:
+        json.dump(sketch.to_dict(), f)
+    os.replace(sketch_path + ".tmp", sketch_path)
+    _memory.put(sketch_path, sketch)
+    return sketch
+
+
+def sketch_variable(path, var_name, registry_spec):
+    """Compute and cache a variable's sketch in a worker process; returns its summary."""
+    from dataset_manager import DatasetManager
+    from derived_variables import DerivedVariableRegistry
+    registry = DerivedVariableRegistry.from_spec(DatasetManager(chunk_cache_bytes=0), registry_spec)
+    return variable_sketch(registry, path, var_name).summary()
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = ["Native", "Monthly", "Seasonal", "Annual"]
+STATISTICS = ["Mean", "Sum", "Min", "Max"]
+OUTPUTS = ["Values", "Climatology", "Anomalies"]
+SEASON_NAMES = ["DJF", "MAM", "JJA", "SON"]
+
+
+def calendar_fields(times):
+    """Year and month arrays for numpy/pandas datetimes or cftime objects."""
+    try:
+        index = pd.DatetimeIndex(times)
+        return index.year.values, index.month.values
+    except (TypeError, ValueError):
+        return (
+            np.array([t.year for t in times], dtype=np.int64),
+            np.array([t.month for t in times], dtype=np.int64),
+        )
+
+
+def period_keys(times, frequency):
+    """Integer key of the period each time step falls in (non-decreasing for sorted times)."""
+    year, month = calendar_fields(times)
+    year = year.astype(np.int64)
+    month = month.astype(np.int64)
+    if frequency == "Monthly":
+        return year * 12 + (month - 1)
+    if frequency == "Seasonal":
+        # December belongs to the DJF season of the following year
+        season_year = year + (month == 12)
+        return season_year * 4 + (month % 12) // 3
+    if frequency == "Annual":
+        return year
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+
+def period_start(key, frequency):
+    key = int(key)
+    if frequency == "Monthly":
+        return pd.Timestamp(year=key // 12, month=key % 12 + 1, day=1)
+    if frequency == "Seasonal":
+        season = key % 4
+        year = key // 4 - (1 if season == 0 else 0)
+        return pd.Timestamp(year=year, month=[12, 3, 6, 9][season], day=1)
+    return pd.Timestamp(year=key, month=1, day=1)
+
+
+def climatology_group(keys, times, frequency):
+    """Calendar group (month number, season name or 'All') used for climatologies."""
+    if frequency == "Seasonal":
+        return np.array([SEASON_NAMES[int(k) % 4] for k in keys])
+    if frequency == "Annual":
+        return np.array(["All"] * len(keys))
+    if frequency == "Monthly":
+        return np.asarray(keys) % 12 + 1
+    return calendar_fields(times)[1]
+
+
+class StreamingAggregator:
+    """Reduces (time, column) blocks to periods as they stream in.
+
+    Blocks must arrive in time order. Periods are contiguous along a sorted time
+    axis, so each block is reduced with ``reduceat`` and only the period that
+    straddles a block boundary is carried over; the cube never has to be held.
+    Reductions always accumulate in float64.
+    """
+
+    def __init__(self, columns, frequency="Native", statistic="Mean", output="Values"):
+        if frequency not in FREQUENCIES or statistic not in STATISTICS or output not in OUTPUTS:
+            raise ValueError(f"Unsupported aggregation: {frequency}/{statistic}/{output}")
+        self.columns = list(columns)
+        self.frequency = frequency
+        self.statistic = statistic
+        self.output = output
+
+        self._keys = []
+        self._times = []
+        self._rows = {"sum": [], "count": [], "min": [], "max": []}
+        self._open = None  # (key, time, sum, count, min, max) of the period still accumulating
+        self._native_offset = 0
+
+    def update(self, times, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block[:, None]
+        times = np.asarray(times)
+        if len(times) == 0:
+            return
+
+        if self.frequency == "Native":
+            keys = np.arange(self._native_offset, self._native_offset + len(times))
+            self._native_offset += len(times)
+        else:
+            keys = period_keys(times, self.frequency)
+
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+        valid = ~np.isnan(block)
+        sums = np.add.reduceat(np.where(valid, block, 0.0), starts, axis=0, dtype=np.float64)
+        counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        mins = np.fmin.reduceat(block, starts, axis=0)
+        maxs = np.fmax.reduceat(block, starts, axis=0)
+
+        for i, start in enumerate(starts):
+            group = (keys[start], times[start], sums[i], counts[i], mins[i], maxs[i])
+            if self._open is not None and self._open[0] == group[0]:
+                key, time, s, c, lo, hi = self._open
+                group = (key, time, s + group[2], c + group[3], np.fmin(lo, group[4]), np.fmax(hi, group[5]))
+            elif self._open is not None:
+                self._close_open()
+            self._open = group
+
+    def _close_open(self):
+        key, time, s, c, lo, hi = self._open
+        self._keys.append(key)
+        self._times.append(time)
+        self._rows["sum"].append(s)
+        self._rows["count"].append(c)
+        self._rows["min"].append(lo)
+        self._rows["max"].append(hi)
+        self._open = None
+
+    def _period_values(self):
+        if self._open is not None:
+            self._close_open()
+        if not self._keys:
+            return np.empty((0, len(self.columns)))
+        sums = np.vstack(self._rows["sum"])
+        counts = np.vstack(self._rows["count"])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.statistic == "Mean":
+                values = sums / counts
+            elif self.statistic == "Sum":
+                values = np.where(counts > 0, sums, np.nan)
+            elif self.statistic == "Min":
+                values = np.vstack(self._rows["min"])
+            else:
+                values = np.vstack(self._rows["max"])
+        return values
+
+    def result(self):
+        """DataFrame of the aggregated values, climatology or anomalies."""
+        values = self._period_values()
+        keys = np.asarray(self._keys)
+        if self.frequency == "Native":
+            dates = pd.to_datetime(self._times) if self._times else pd.DatetimeIndex([])
+        else:
+            dates = pd.DatetimeIndex([period_start(key, self.frequency) for key in keys])
+
+        if self.output == "Values":
+            df = pd.DataFrame(values, columns=self.columns)
+            df.insert(0, "Date", dates)
+            return df
+
+        groups = climatology_group(keys, self._times, self.frequency)
+        by_group = pd.DataFrame(values, columns=self.columns).groupby(groups, sort=True).mean()
+        if self.output == "Climatology":
+            label = {"Seasonal": "Season", "Annual": "Period"}.get(self.frequency, "Month")
+            if self.frequency == "Seasonal":
+                by_group = by_group.reindex([s for s in SEASON_NAMES if s in by_group.index])
+            return by_group.rename_axis(label).reset_index()
+
+        anomalies = values - by_group.loc[groups].to_numpy()
+        df = pd.DataFrame(anomalies, columns=self.columns)
+        df.insert(0, "Date", dates)
+        return df
+
+
+def aggregate_dataframe(df, columns, frequency="Native", statistic="Mean", output="Values", chunk_rows=100000):
+    """Run a 'Date'-indexed DataFrame through the streaming aggregator in row chunks."""
+    aggregator = StreamingAggregator(columns, frequency, statistic, output)
+    df = df.sort_values("Date")
+    times = pd.to_datetime(df["Date"]).values
+    data = df[list(columns)].to_numpy(dtype=np.float64)
+    for start in range(0, len(df), chunk_rows):
+        aggregator.update(times[start:start + chunk_rows], data[start:start + chunk_rows])
+    return aggregator.result()
@@ -0,0 +1,95 @@
+import os
+import hashlib
+import warnings
+import numpy as np
+from matplotlib import image as mpimg
+
+from cache_utils import get_cache_dir
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from extraction import time_chunk_for
+
+THUMBNAIL_SIZE = 96  # Longest side of a preview, in grid cells/pixels
+TIME_VIEWS = ["First", "Middle", "Last", "Mean"]
+MAP_VIEWS = ["Map"]
+
+
+def views_for(ndim):
+    return TIME_VIEWS if ndim == 3 else MAP_VIEWS
+
+
+def thumbnail_paths(registry, path, var_name, size=THUMBNAIL_SIZE):
+    """{view: png path} in the content-addressed cache (files may not exist yet).
+
+    The key is the registry identity of the variable, so a changed run, expression
+    or subset never shows a stale preview.
+    """
+    # 'north-up' retires previews from before descending latitudes were flipped
+    identity = registry.identity(path, var_name) + [str(size), "north-up"]
+    ndim = registry.open(path, var_name).ndim
+    folder = get_cache_dir("thumbnails")
+    paths = {}
+    for view in views_for(ndim):
+        digest = hashlib.sha1("|".join(identity + [view]).encode()).hexdigest()
+        paths[view] = os.path.join(folder, f"{digest}.png")
+    return paths
+
+
+def _strided_grid(variable, size):
+    """isel slices that read every n-th row and column, so the preview is about ``size`` cells wide."""
+    dims = [dim for dim in variable.dims if dim != "time"]
+    step = max(1, -(-max(variable.sizes[dim] for dim in dims) // size))
+    return {dim: slice(None, None, step) for dim in dims}
+
+
+def _save(png_path, data, vmin, vmax, origin="lower"):
+    masked = np.ma.masked_invalid(data)
+    tmp_path = png_path + ".tmp.png"
+    mpimg.imsave(tmp_path, masked, cmap="viridis", vmin=vmin, vmax=vmax, origin=origin)
+    os.replace(tmp_path, png_path)  # Never leave a half-written preview in the cache
+
+
+def render_thumbnails(path, var_name, registry_spec, size=THUMBNAIL_SIZE):
+    """Render the missing previews of one variable (runs in a worker process).
+
+    Only every n-th row and column is read, so a preview costs a small fraction of
+    a full frame; the temporal mean streams over the strided grid in time blocks.
+    Returns {view: png path}.
+    """
+    registry = DerivedVariableRegistry.from_spec(DatasetManager(chunk_cache_bytes=0), registry_spec)
+    paths = thumbnail_paths(registry, path, var_name, size)
+    if all(os.path.exists(png) for png in paths.values()):
+        return paths
+
+    variable = registry.open(path, var_name)
+    grid = _strided_grid(variable, size)
+    frames = {}
+    if variable.ndim == 3:
+        n_time = variable.sizes["time"]
+        for view, index in (("First", 0), ("Middle", n_time // 2), ("Last", n_time - 1)):
+            frames[view] = np.asarray(variable.isel(time=index, **grid).values, dtype=np.float64)
+        cells = frames["First"].size
+        total = np.zeros_like(frames["First"])
+        count = np.zeros(frames["First"].shape, dtype=np.int64)
+        chunk = time_chunk_for(cells)
+        for start in range(0, n_time, chunk):
+            block = np.asarray(variable.isel(time=slice(start, start + chunk), **grid).values, dtype=np.float64)
+            valid = ~np.isnan(block)
+            total += np.where(valid, block, 0.0).sum(axis=0)
+            count += valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frames["Mean"] = np.where(count > 0, total / count, np.nan)
+    else:
+        frames["Map"] = np.asarray(variable.isel(**grid).values, dtype=np.float64)
+
+    # One colour scale for all views of a variable so they can be compared
+    values = np.concatenate([frame.ravel() for frame in frames.values()])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN variables
+        vmin, vmax = np.nanpercentile(values, [2, 98]) if np.isfinite(values).any() else (0.0, 1.0)
+    # North up, as in the plots: origin at the bottom when latitude increases with the row index
+    lat = variable["lat"].values if "lat" in variable.coords else np.array([])
+    origin = "upper" if lat.size > 1 and lat[0] > lat[-1] else "lower"
+    for view, frame in frames.items():
+        _save(paths[view], frame, vmin, vmax, origin)
+    return paths
@@ -0,0 +1,138 @@
+import os
+import json
+import glob
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+from cache_utils import get_cache_dir
+
+# Set while recording; spawned worker processes inherit it and write their spans there
+TRACE_DIR_ENV = "CUWALID_TRACE_DIR"
+SUMMARY_COLUMNS = ["Span", "Calls", "Total (ms)", "Mean (ms)", "Max (ms)", "Processes"]
+
+
+class Tracer:
+    """Timing spans of the heavy paths, recorded only while tracing is switched on.
+
+    The app process keeps its spans in memory; worker processes (extraction pools,
+    summary maps, background jobs) append theirs to one file per process in the
+    trace folder, which the app merges when the trace is summarised or exported.
+    All spans use wall-clock microseconds so the processes share one timeline.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.recorded_folder = None  # Worker spans of the last recording, kept after it stops
+
+    @property
+    def folder(self):
+        return os.environ.get(TRACE_DIR_ENV)
+
+    @property
+    def enabled(self):
+        return bool(self.folder)
+
+    def start(self):
+        folder = get_cache_dir(os.path.join("traces", str(os.getpid())))
+        for path in glob.glob(os.path.join(folder, "*.jsonl")):
+            os.remove(path)
+        with self.lock:
+            self.events = []
+        os.environ[TRACE_DIR_ENV] = folder
+        self.recorded_folder = folder
+
+    def stop(self):
+        os.environ.pop(TRACE_DIR_ENV, None)
+
+    def clear(self):
+        if self.enabled:
+            self.start()
+            return
+        with self.lock:
+            self.events = []
+        self.recorded_folder = None
+
+    def record(self, name, start_us, duration_us, args):
+        event = {
+            "name": name, "cat": name.split(":")[0], "ph": "X", "ts": start_us, "dur": duration_us,
+            "pid": os.getpid(), "tid": threading.get_native_id(), "args": args,
+        }
+        if multiprocessing.parent_process() is None:
+            with self.lock:
+                self.events.append(event)
+            return
+        try:
+            with open(os.path.join(self.folder, f"{os.getpid()}.jsonl"), "a") as f:
+                f.write(json.dumps(event, default=str) + "\n")
+        except OSError:
+            pass  # The app stopped tracing and cleared the folder
+
+    @contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            end = time.time_ns()
+            self.record(name, start // 1000, max(1, (end - start) // 1000), args)
+
+    def collect(self):
+        """Every recorded span, from this process and from worker processes."""
+        with self.lock:
+            events = list(self.events)
+        if self.recorded_folder:
+            for path in glob.glob(os.path.join(self.recorded_folder, "*.jsonl")):
+                with open(path) as f:
+                    events.extend(json.loads(line) for line in f if line.strip())
+        return sorted(events, key=lambda event: event["ts"])
+
+    def summary(self):
+        """DataFrame of calls and total/mean/max time per span name, slowest first."""
+        events = self.collect()
+        if not events:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        frame = pd.DataFrame(events)
+        grouped = frame.groupby("name").agg(
+            calls=("dur", "size"), total=("dur", "sum"), mean=("dur", "mean"), max=("dur", "max"),
+            processes=("pid", "nunique"),
+        ).sort_values("total", ascending=False)
+        grouped[["total", "mean", "max"]] /= 1000
+        grouped = grouped.reset_index()
+        grouped.columns = SUMMARY_COLUMNS
+        return grouped
+
+    def export(self, path):
+        """Write the spans as Chrome trace JSON (chrome://tracing, Perfetto, speedscope)."""
+        events = self.collect()
+        names = [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+             "args": {"name": "CUWALID App" if pid == os.getpid() else f"Worker {pid}"}}
+            for pid in sorted({event["pid"] for event in events})
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": names + events, "displayTimeUnit": "ms"}, f, default=str)
+        return len(events)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def traced(name):
+    """Decorator recording a span around every call of a function."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
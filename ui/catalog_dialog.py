@@ -0,0 +1,47 @@
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QTableWidget, QAbstractItemView, QLabel
+)
+
+CATALOG_COLUMNS = ["File", "Variables", "Start", "End", "Steps", "Extent (xmin, ymin, xmax, ymax)"]
+
+
+def create_catalog_dialog(parent):
+    """Creates the dataset catalog browser (scan folders, filter, open)."""
+    parent.catalog_dialog = QDialog(parent)
+    parent.catalog_dialog.setWindowTitle("NetCDF Catalog")
+    parent.catalog_dialog.resize(900, 500)
+    layout = QVBoxLayout()
+
+    top_row = QHBoxLayout()
+    parent.catalog_scan_button = QPushButton("Scan Folder...")
+    parent.catalog_scan_button.clicked.connect(parent.data_processor.scan_catalog_folder)
+    top_row.addWidget(parent.catalog_scan_button)
+    parent.catalog_rescan_button = QPushButton("Rescan All")
+    parent.catalog_rescan_button.clicked.connect(parent.data_processor.rescan_catalog)
+    top_row.addWidget(parent.catalog_rescan_button)
+    parent.catalog_filter = QLineEdit()
+    parent.catalog_filter.setPlaceholderText("Filter by file or variable name")
+    parent.catalog_filter.textChanged.connect(parent.data_processor.refresh_catalog)
+    top_row.addWidget(parent.catalog_filter, 1)
+    layout.addLayout(top_row)
+
+    parent.catalog_table = QTableWidget(0, len(CATALOG_COLUMNS))
+    parent.catalog_table.setHorizontalHeaderLabels(CATALOG_COLUMNS)
+    parent.catalog_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    parent.catalog_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    parent.catalog_table.horizontalHeader().setStretchLastSection(True)
+    parent.catalog_table.cellDoubleClicked.connect(lambda row, _: parent.data_processor.open_catalog_entry(row))
+    layout.addWidget(parent.catalog_table)
+
+    bottom_row = QHBoxLayout()
+    parent.catalog_status = QLabel("")
+    bottom_row.addWidget(parent.catalog_status, 1)
+    parent.catalog_open_button = QPushButton("Open Selected")
+    parent.catalog_open_button.clicked.connect(
+        lambda: parent.data_processor.open_catalog_entry(parent.catalog_table.currentRow())
+    )
+    bottom_row.addWidget(parent.catalog_open_button)
+    layout.addLayout(bottom_row)
+
+    parent.catalog_dialog.setLayout(layout)
+    return parent.catalog_dialog
@@ -0,0 +1,46 @@
+from PyQt6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QAbstractItemView, QLabel, QSpinBox
+)
+
+JOB_COLUMNS = ["Job", "Priority", "State", "Progress", "ETA", "Message"]
+
+
+def init_jobs_tab(parent):
+    """Initializes the background job queue (extractions and model runs that survive restarts)."""
+    layout = QVBoxLayout()
+
+    top_row = QHBoxLayout()
+    top_row.addWidget(QLabel("Jobs at once:"))
+    parent.job_concurrency = QSpinBox()
+    parent.job_concurrency.setRange(1, 8)
+    parent.job_concurrency.setValue(parent.job_queue.max_running)
+    parent.job_concurrency.valueChanged.connect(lambda value: setattr(parent.job_queue, "max_running", value))
+    top_row.addWidget(parent.job_concurrency)
+    top_row.addStretch()
+    layout.addLayout(top_row)
+
+    parent.job_table = QTableWidget(0, len(JOB_COLUMNS))
+    parent.job_table.setHorizontalHeaderLabels(JOB_COLUMNS)
+    parent.job_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    parent.job_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+    parent.job_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    parent.job_table.horizontalHeader().setStretchLastSection(True)
+    layout.addWidget(parent.job_table)
+
+    button_row = QHBoxLayout()
+    parent.job_cancel_button = QPushButton("Cancel")
+    parent.job_cancel_button.clicked.connect(parent.data_processor.cancel_selected_job)
+    button_row.addWidget(parent.job_cancel_button)
+    parent.job_raise_button = QPushButton("Raise Priority")
+    parent.job_raise_button.clicked.connect(lambda: parent.data_processor.change_job_priority(1))
+    button_row.addWidget(parent.job_raise_button)
+    parent.job_lower_button = QPushButton("Lower Priority")
+    parent.job_lower_button.clicked.connect(lambda: parent.data_processor.change_job_priority(-1))
+    button_row.addWidget(parent.job_lower_button)
+    parent.job_clear_button = QPushButton("Remove Finished")
+    parent.job_clear_button.clicked.connect(parent.job_queue.remove_finished)
+    button_row.addWidget(parent.job_clear_button)
+    layout.addLayout(button_row)
+
+    parent.job_queue.changed.connect(parent.data_processor.refresh_jobs)
+    parent.jobs_tab.setLayout(layout)
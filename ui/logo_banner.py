@@ -36,6 +36,18 @@ def create_logo_banner(parent):
     version_label.setStyleSheet("color: #cccccc; font-size: 12px; padding-right: 10px;")
     right_buttons_layout.addWidget(version_label)
 
+    # Sessions: the loaded files, selections and view extents, restored without re-reading data
+    for text, slot, pixmap in (
+        ("Open Session", parent.data_processor.open_session, QStyle.StandardPixmap.SP_DialogOpenButton),
+        ("Save Session", parent.data_processor.save_session, QStyle.StandardPixmap.SP_DialogSaveButton),
+    ):
+        session_button = QPushButton(text)
+        session_button.setCursor(Qt.CursorShape.PointingHandCursor)
+        session_button.setStyleSheet("color: white; background-color: #444444; padding: 5px 10px;")
+        session_button.setIcon(parent.style().standardIcon(pixmap))
+        session_button.clicked.connect(slot)
+        right_buttons_layout.addWidget(session_button)
+
     help_button = QPushButton("Help")
     help_button.setCursor(Qt.CursorShape.PointingHandCursor)
     help_button.setStyleSheet("color: white; background-color: #444444; padding: 5px 10px;")
@@ -4,24 +4,48 @@ from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QTabWidget, QStat
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon
 
+from catalog import DatasetCatalog
 from constants import APP_STYLESHEET
 from data_processing import DataProcessor
+from dataset_manager import DatasetManager
+from derived_variables import DerivedVariableRegistry
+from job_queue import JobQueue
 from plotting_utils import Plotter
+from session import LazyAttribute
 
 from .model_tab import init_model_tab
 from .visualisation_tab import init_visualization_tab
+from .plot_workspace_tab import init_plot_workspace_tab
+from .jobs_tab import init_jobs_tab
+from .performance_tab import init_performance_tab
 from .logo_banner import create_logo_banner
 
 
 class CuwalidAPP(QMainWindow):
+    # Loaded sources; a restored session leaves them unread until first used
+    raster_data = LazyAttribute()
+    shapefile_data = LazyAttribute()
+    xy_data = LazyAttribute()
+    csv_dataframe_1 = LazyAttribute()
+    csv_dataframe_2 = LazyAttribute()
+    points_csv_data = LazyAttribute()
+
     def __init__(self):
         super().__init__()
+        self.dataset_manager = DatasetManager()
+        self.derived_variables = DerivedVariableRegistry(self.dataset_manager)
+        self.catalog = DatasetCatalog()
+        self.job_queue = JobQueue()
         self.data_processor = DataProcessor(self)
         self.plotter = Plotter(self)
 
         self.csv_dataframe_1 = None
         self.csv_dataframe_2 = None
         self.xy_data = None
+        self.shapefile_data = None
+        self.raster_crs = None  # CRS of ui.raster_data, if known
+        self.points_csv_data = None
+        self.source_paths = {}  # session source key -> file the source was loaded from
 
         self.initUI()
 
@@ -53,13 +77,22 @@ class CuwalidAPP(QMainWindow):
         self.tabs.setDocumentMode(True)
 
         self.visualization_tab = QWidget()
+        self.plots_tab = QWidget()
         self.model_tab = QWidget()
+        self.jobs_tab = QWidget()
+        self.performance_tab = QWidget()
 
         self.tabs.addTab(self.visualization_tab, "Visualisation")
+        self.tabs.addTab(self.plots_tab, "Plots")
         self.tabs.addTab(self.model_tab, "Run DRYP")
+        self.tabs.addTab(self.jobs_tab, "Jobs")
+        self.tabs.addTab(self.performance_tab, "Performance")
 
         init_visualization_tab(self)
+        init_plot_workspace_tab(self)
         init_model_tab(self)
+        init_jobs_tab(self)
+        init_performance_tab(self)
 
         tabs_layout.addWidget(self.tabs)
         main_layout.addWidget(tabs_container)
@@ -85,6 +118,13 @@ class CuwalidAPP(QMainWindow):
         self.status_bar.addPermanentWidget(self.progress_bar)
 
         self.netcdf_dataset = None
+        self.netcdf_path = None
+        self.summary_map = None
+
+    def closeEvent(self, event):
+        # Running jobs are stopped and stay queued; they resume from their checkpoint next start
+        self.job_queue.shutdown()
+        super().closeEvent(event)
 
     def show_loading(self, message="Loading data..."):
         self.loading_label.setText(message)
@@ -106,15 +146,13 @@ class CuwalidAPP(QMainWindow):
         self.load_csv_button_2.setEnabled(enabled)
         self.load_json_button.setEnabled(enabled)
         self.run_model_button.setEnabled(enabled)
+        self.check_inputs_button.setEnabled(enabled)
 
     def toggle_all_points(self, state):
-        for i in range(self.point_selector_list.count()):
-            self.point_selector_list.item(i).setCheckState(Qt.CheckState.Checked if state else Qt.CheckState.Unchecked)
+        self.point_selector_list.check_all(state)
 
     def toggle_all_csv1(self, state):
-        for i in range(self.csv_var_selector_1.count()):
-            self.csv_var_selector_1.item(i).setCheckState(Qt.CheckState.Checked if state else Qt.CheckState.Unchecked)
+        self.csv_var_selector_1.check_all(state)
 
     def toggle_all_csv2(self, state):
-        for i in range(self.csv_var_selector_2.count()):
-            self.csv_var_selector_2.item(i).setCheckState(Qt.CheckState.Checked if state else Qt.CheckState.Unchecked)
+        self.csv_var_selector_2.check_all(state)
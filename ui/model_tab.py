@@ -21,6 +21,13 @@ def init_model_tab(parent):
     parent.input_helper_button.clicked.connect(lambda: QDesktopServices.openUrl(QUrl("https://cuwalid.github.io/tools/input-helper/")))
     button_layout.addWidget(parent.input_helper_button)
 
+    parent.check_inputs_button = QPushButton("Check Inputs")
+    parent.check_inputs_button.setToolTip("Check that every input file exists and shares the model grid, "
+                                          "and estimate output size and memory, without starting DRYP")
+    parent.check_inputs_button.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+    parent.check_inputs_button.clicked.connect(parent.data_processor.check_model_inputs)
+    button_layout.addWidget(parent.check_inputs_button)
+
     # Add the horizontal layout to the main layout
     layout.addLayout(button_layout)
 
@@ -33,6 +40,11 @@ def init_model_tab(parent):
     parent.run_model_button.clicked.connect(parent.data_processor.run_model)
     layout.addWidget(parent.run_model_button)
 
+    parent.queue_model_button = QPushButton("Queue Run (background job)")
+    parent.queue_model_button.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+    parent.queue_model_button.clicked.connect(parent.data_processor.queue_model_run)
+    layout.addWidget(parent.queue_model_button)
+
     parent.model_output = QTextEdit()
     parent.model_output.setReadOnly(True)
     parent.model_output.setStyleSheet("background-color: black; color: lightgreen;")
@@ -0,0 +1,41 @@
+from PyQt6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QAbstractItemView, QLabel, QCheckBox
+)
+
+from tracing import SUMMARY_COLUMNS
+
+
+def init_performance_tab(parent):
+    """Initializes the performance panel: span timings of the heavy paths and trace export."""
+    layout = QVBoxLayout()
+
+    top_row = QHBoxLayout()
+    parent.trace_checkbox = QCheckBox("Record timings")
+    parent.trace_checkbox.setToolTip("Time file reads, masks, reductions, writes and figure renders, "
+                                     "including worker processes")
+    parent.trace_checkbox.toggled.connect(parent.data_processor.toggle_tracing)
+    top_row.addWidget(parent.trace_checkbox)
+    parent.trace_status_label = QLabel("Not recording")
+    top_row.addWidget(parent.trace_status_label, 1)
+    layout.addLayout(top_row)
+
+    parent.trace_table = QTableWidget(0, len(SUMMARY_COLUMNS))
+    parent.trace_table.setHorizontalHeaderLabels(SUMMARY_COLUMNS)
+    parent.trace_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    parent.trace_table.horizontalHeader().setStretchLastSection(True)
+    layout.addWidget(parent.trace_table)
+
+    button_row = QHBoxLayout()
+    parent.trace_refresh_button = QPushButton("Refresh")
+    parent.trace_refresh_button.clicked.connect(parent.data_processor.refresh_trace_summary)
+    button_row.addWidget(parent.trace_refresh_button)
+    parent.trace_clear_button = QPushButton("Clear")
+    parent.trace_clear_button.clicked.connect(parent.data_processor.clear_trace)
+    button_row.addWidget(parent.trace_clear_button)
+    parent.trace_export_button = QPushButton("Export Timeline...")
+    parent.trace_export_button.setToolTip("Chrome trace JSON, for chrome://tracing or ui.perfetto.dev")
+    parent.trace_export_button.clicked.connect(parent.data_processor.export_trace)
+    button_row.addWidget(parent.trace_export_button)
+    layout.addLayout(button_row)
+
+    parent.performance_tab.setLayout(layout)
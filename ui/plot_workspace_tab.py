@@ -0,0 +1,11 @@
+from PyQt6.QtWidgets import QVBoxLayout
+
+from plot_workspace import PlotWorkspace
+
+
+def init_plot_workspace_tab(parent):
+    """Initializes the embedded plot workspace (one persistent figure per view)."""
+    layout = QVBoxLayout()
+    parent.plot_workspace = PlotWorkspace()
+    layout.addWidget(parent.plot_workspace)
+    parent.plots_tab.setLayout(layout)
@@ -0,0 +1,206 @@
+import re
+import numpy as np
+import pandas as pd
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableView, QAbstractItemView, QHeaderView
+)
+
+_RANGE = re.compile(r"^\s*(\d+)\s*-\s*(\d+)\s*$")
+
+
+class CheckableRowsModel(QAbstractTableModel):
+    """Checkable rows over a DataFrame, for views that only ask for the rows on screen.
+
+    Check states live in one boolean array and the filter is an index array, so
+    checking everything, a range or the rows matching an attribute query is a
+    vectorised assignment and a single dataChanged, whatever the number of rows.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.set_rows([])
+
+    def set_rows(self, labels, frame=None, checked=None, frame_source=None):
+        """Rows labelled ``labels``; extra columns of ``frame`` are shown and can be queried.
+
+        ``frame_source`` is a callable giving the frame only when a query needs it
+        (e.g. for a restored session whose data hasn't been read yet).
+        """
+        self.beginResetModel()
+        self.labels = np.asarray([str(label) for label in labels], dtype=object)
+        self._frame = frame.reset_index(drop=True) if frame is not None else None
+        self.frame_source = frame_source
+        self.columns = [column for column in frame.columns if str(column) != "Label"] if frame is not None else []
+        self.checked = np.zeros(len(self.labels), dtype=bool) if checked is None else np.asarray(checked, dtype=bool)
+        self.visible = np.arange(len(self.labels))
+        self.endResetModel()
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            frame = self.frame_source() if self.frame_source is not None else None
+            self._frame = frame.reset_index(drop=True) if frame is not None else pd.DataFrame(
+                {"Name": self.labels})
+        return self._frame
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1 + len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.visible[index.row()]
+        if index.column() == 0:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return self.labels[row]
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if self.checked[row] else Qt.CheckState.Unchecked
+        elif role == Qt.ItemDataRole.DisplayRole:
+            return str(self.frame.iat[row, self.frame.columns.get_loc(self.columns[index.column() - 1])])
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or index.column() != 0:
+            return False
+        self.checked[self.visible[index.row()]] = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Vertical:
+            return str(self.visible[section] + 1)  # Position in the full list, as used by ranges
+        return "Name" if section == 0 else str(self.columns[section - 1])
+
+    def _changed(self):
+        if len(self.visible):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.visible) - 1, 0),
+                                  [Qt.ItemDataRole.CheckStateRole])
+
+    def set_filter(self, text):
+        """Show only rows whose label contains ``text`` (case-insensitive)."""
+        self.beginResetModel()
+        if text:
+            matches = pd.Series(self.labels).str.contains(text, case=False, regex=False).to_numpy()
+            self.visible = np.flatnonzero(matches)
+        else:
+            self.visible = np.arange(len(self.labels))
+        self.endResetModel()
+
+    def check_visible(self, state):
+        """Check or uncheck every row the filter shows (every row when there is no filter)."""
+        if len(self.visible) == len(self.labels):
+            self.checked[:] = state
+        else:
+            self.checked[self.visible] = state
+        self._changed()
+
+    def check_matching(self, selection, state=True):
+        """Check rows by 1-based position range ('1-500') or a pandas query on the columns ('East > 3e5')."""
+        match = _RANGE.match(selection)
+        if match:
+            first, last = int(match.group(1)), int(match.group(2))
+            self.checked[max(0, first - 1):last] = state
+            count = max(0, min(last, len(self.labels)) - max(0, first - 1))
+        else:
+            mask = np.asarray(self.frame.eval(selection), dtype=bool)
+            self.checked[mask] = state
+            count = int(mask.sum())
+        self._changed()
+        return count
+
+    def checked_rows(self):
+        return np.flatnonzero(self.checked)
+
+    def checked_labels(self):
+        return list(self.labels[self.checked])
+
+
+class CheckableSelector(QWidget):
+    """Filter box, virtualised checkable table and a bulk-selection box over a CheckableRowsModel."""
+
+    def __init__(self, parent=None, max_height=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter by name")
+        layout.addWidget(self.filter_input)
+
+        self.model = CheckableRowsModel(self)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.view.horizontalHeader().setStretchLastSection(True)
+        # Fixed row heights: the view never measures rows it doesn't show
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 6)
+        if max_height:
+            self.view.setMaximumHeight(max_height)
+        layout.addWidget(self.view)
+
+        bulk_row = QHBoxLayout()
+        self.bulk_input = QLineEdit()
+        self.bulk_input.setPlaceholderText("Rows '1-500' or a query, e.g. East > 300000")
+        bulk_row.addWidget(self.bulk_input, 1)
+        self.check_button = QPushButton("Check")
+        self.uncheck_button = QPushButton("Uncheck")
+        bulk_row.addWidget(self.check_button)
+        bulk_row.addWidget(self.uncheck_button)
+        layout.addLayout(bulk_row)
+
+        self.filter_input.textChanged.connect(self.model.set_filter)
+        self.check_button.clicked.connect(lambda: self.check_matching(True))
+        self.uncheck_button.clicked.connect(lambda: self.check_matching(False))
+
+    def set_rows(self, labels, frame=None, checked=None, frame_source=None):
+        self.filter_input.clear()
+        self.model.set_rows(labels, frame, checked, frame_source)
+        self.view.resizeColumnsToContents()
+
+    def check_matching(self, state):
+        text = self.bulk_input.text().strip()
+        if not text:
+            return
+        try:
+            count = self.model.check_matching(text, state)
+            self.bulk_input.setToolTip(f"{'Checked' if state else 'Unchecked'} {count} rows")
+            self.bulk_input.setStyleSheet("")
+        except Exception as e:
+            self.bulk_input.setToolTip(f"Not understood: {e}")
+            self.bulk_input.setStyleSheet("border: 1px solid #c0392b;")
+
+    def clear(self):
+        self.set_rows([])
+
+    def count(self):
+        return len(self.model.labels)
+
+    def check_all(self, state):
+        self.model.check_visible(bool(state))
+
+    def checked_rows(self):
+        return self.model.checked_rows()
+
+    def checked_labels(self):
+        return self.model.checked_labels()
+
+    def state(self):
+        """Labels and checked positions, for sessions (restored without the data behind them)."""
+        return {"labels": list(self.model.labels), "checked": self.checked_rows().tolist()}
+
+    def set_state(self, state, frame_source=None):
+        checked = np.zeros(len(state["labels"]), dtype=bool)
+        checked[state["checked"]] = True
+        self.set_rows(state["labels"], checked=checked, frame_source=frame_source)
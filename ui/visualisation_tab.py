@@ -1,11 +1,38 @@
+import os
 from PyQt6.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListWidget, QCheckBox, QComboBox,
     QSizePolicy, QGroupBox, QScrollArea, QWidget, QToolBox, QGridLayout, QStyle, QTabWidget,
-    QLineEdit
+    QLineEdit, QSpinBox
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon
 
+from cell_statistics import MAP_STATISTICS
+from dataset_manager import SUBSET_SOURCES
+from extraction import REGION_SOURCES
+from precision import PRECISIONS
+from regridding import REGRID_METHODS, REGRID_TARGETS
+from skill_scores import BREAKDOWNS, METRICS, PAIRINGS
+from temporal_aggregation import FREQUENCIES, STATISTICS, OUTPUTS
+from thumbnails import THUMBNAIL_SIZE, TIME_VIEWS
+from .table_models import CheckableSelector
+
+
+def create_aggregation_row():
+    """Frequency / statistic / output selectors for temporal aggregation."""
+    row = QHBoxLayout()
+    frequency = QComboBox()
+    frequency.addItems(FREQUENCIES)
+    statistic = QComboBox()
+    statistic.addItems(STATISTICS)
+    output = QComboBox()
+    output.addItems(OUTPUTS)
+    row.addWidget(QLabel("Aggregate:"))
+    row.addWidget(frequency)
+    row.addWidget(statistic)
+    row.addWidget(output)
+    return row, frequency, statistic, output
+
 def create_file_group(parent):
     """Creates the 'Load Files' group for raster, shapefile, and XY data."""
     file_group = QGroupBox("Plot Raster Maps")
@@ -54,6 +81,12 @@ def create_file_group(parent):
     parent.final_plot_button.clicked.connect(parent.plotter.plot_selected_files)
     file_group_layout.addWidget(parent.final_plot_button, 3, 0, 1, 3, Qt.AlignmentFlag.AlignCenter)
 
+    # Layers (and NetCDF frames) are reprojected onto this CRS for display
+    parent.display_crs_input = QLineEdit()
+    parent.display_crs_input.setPlaceholderText("Display CRS, e.g. EPSG:32637 (blank: the raster's or shapefile's CRS)")
+    file_group_layout.addWidget(QLabel("Display CRS:"), 4, 0)
+    file_group_layout.addWidget(parent.display_crs_input, 4, 1, 1, 2)
+
     file_group.setLayout(file_group_layout)
     return file_group
 
@@ -68,18 +101,125 @@ def create_netcdf_group(parent):
     parent.load_netcdf_button.setIcon(parent.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
     parent.load_netcdf_button.clicked.connect(parent.data_processor.load_netcdf)
     netcdf_layout.addWidget(parent.load_netcdf_button)
+    parent.browse_catalog_button = QPushButton("Browse Catalog...")
+    parent.browse_catalog_button.clicked.connect(parent.data_processor.browse_catalog)
+    netcdf_layout.addWidget(parent.browse_catalog_button)
 
     # No file loaded label
     parent.netcdf_file_label = QLabel("No file loaded")
     parent.netcdf_file_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
     netcdf_layout.addWidget(parent.netcdf_file_label)
 
+    # Open datasets picker (several runs can stay open at once)
+    netcdf_layout.addWidget(QLabel("Open Datasets:"))
+    dataset_row = QHBoxLayout()
+    parent.netcdf_dataset_selector = QComboBox()
+    parent.netcdf_dataset_selector.setEnabled(False)
+    parent.netcdf_dataset_selector.currentIndexChanged.connect(parent.data_processor.switch_netcdf_dataset)
+    dataset_row.addWidget(parent.netcdf_dataset_selector, 1)
+    parent.close_netcdf_button = QPushButton("Close")
+    parent.close_netcdf_button.setEnabled(False)
+    parent.close_netcdf_button.clicked.connect(parent.data_processor.close_netcdf_dataset)
+    dataset_row.addWidget(parent.close_netcdf_button)
+    parent.optimise_layout_button = QPushButton("Optimise Layout")
+    parent.optimise_layout_button.setToolTip(
+        "Write time- and space-chunked copies so point series and map frames both read quickly"
+    )
+    parent.optimise_layout_button.setEnabled(False)
+    parent.optimise_layout_button.clicked.connect(parent.data_processor.optimise_netcdf_layout)
+    dataset_row.addWidget(parent.optimise_layout_button)
+    netcdf_layout.addLayout(dataset_row)
+
+    # Opt-in reduced precision for cached grids; reductions still accumulate in float64
+    precision_row = QHBoxLayout()
+    precision_row.addWidget(QLabel("Grid Precision:"))
+    parent.grid_precision = QComboBox()
+    parent.grid_precision.addItems(PRECISIONS)
+    parent.grid_precision.setToolTip("Keep loaded and cached grids as float32 or scaled int16 to save memory")
+    precision_row.addWidget(parent.grid_precision)
+    parent.precision_tolerance = QLineEdit()
+    parent.precision_tolerance.setPlaceholderText("int16 max error (blank: any)")
+    precision_row.addWidget(parent.precision_tolerance, 1)
+    parent.grid_precision.currentTextChanged.connect(parent.data_processor.set_grid_precision)
+    parent.precision_tolerance.editingFinished.connect(parent.data_processor.set_grid_precision)
+    netcdf_layout.addLayout(precision_row)
+
+    # Optional subset applied on load: only this box and time range is ever read
+    netcdf_layout.addWidget(QLabel("Subset on Load:"))
+    subset_row = QHBoxLayout()
+    parent.subset_source = QComboBox()
+    parent.subset_source.addItems(SUBSET_SOURCES)
+    subset_row.addWidget(parent.subset_source)
+    parent.subset_bbox = QLineEdit()
+    parent.subset_bbox.setPlaceholderText("xmin, ymin, xmax, ymax")
+    parent.subset_bbox.setEnabled(False)
+    parent.subset_source.currentTextChanged.connect(
+        lambda text: parent.subset_bbox.setEnabled(text == "Manual box")
+    )
+    subset_row.addWidget(parent.subset_bbox, 1)
+    netcdf_layout.addLayout(subset_row)
+    subset_time_row = QHBoxLayout()
+    parent.subset_start = QLineEdit()
+    parent.subset_start.setPlaceholderText("Start (YYYY-MM-DD)")
+    subset_time_row.addWidget(parent.subset_start)
+    parent.subset_end = QLineEdit()
+    parent.subset_end.setPlaceholderText("End (YYYY-MM-DD)")
+    subset_time_row.addWidget(parent.subset_end)
+    parent.apply_subset_button = QPushButton("Apply Subset")
+    parent.apply_subset_button.clicked.connect(parent.data_processor.apply_subset_to_active)
+    subset_time_row.addWidget(parent.apply_subset_button)
+    netcdf_layout.addLayout(subset_time_row)
+
     # NetCDF variable selector
     netcdf_layout.addWidget(QLabel("NetCDF Variable:"))
     parent.netcdf_var_selector = QComboBox()
     parent.netcdf_var_selector.setEnabled(False)
+    parent.netcdf_var_selector.currentTextChanged.connect(parent.data_processor.show_thumbnails)
+    parent.netcdf_var_selector.currentTextChanged.connect(parent.data_processor.show_variable_summary)
     netcdf_layout.addWidget(parent.netcdf_var_selector)
 
+    # Quicklook previews (first/middle/last step and temporal mean), rendered in the background
+    thumbnail_row = QHBoxLayout()
+    parent.thumbnail_labels = []
+    for _ in TIME_VIEWS:
+        cell = QVBoxLayout()
+        image = QLabel()
+        image.setFixedSize(THUMBNAIL_SIZE + 4, THUMBNAIL_SIZE + 4)
+        image.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        caption = QLabel()
+        caption.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        cell.addWidget(image)
+        cell.addWidget(caption)
+        thumbnail_row.addLayout(cell)
+        parent.thumbnail_labels.append((caption, image))
+    thumbnail_row.addStretch(1)
+    netcdf_layout.addLayout(thumbnail_row)
+
+    # Whole-variable summary from the cached one-pass statistics sketch
+    summary_info_row = QHBoxLayout()
+    parent.variable_summary_label = QLabel("")
+    parent.variable_summary_label.setWordWrap(True)
+    summary_info_row.addWidget(parent.variable_summary_label, 1)
+    parent.variable_summary_button = QPushButton("Summarise")
+    parent.variable_summary_button.clicked.connect(parent.data_processor.summarise_variable)
+    summary_info_row.addWidget(parent.variable_summary_button)
+    netcdf_layout.addLayout(summary_info_row)
+
+    # Derived variables, e.g. "dch = rch - rp.fch" or "rch_m = convert(rch, 'mm', 'm') [m]"
+    derived_row = QHBoxLayout()
+    parent.derived_expression_input = QLineEdit()
+    parent.derived_expression_input.setPlaceholderText("Derived variable: name = expression [units]")
+    derived_row.addWidget(parent.derived_expression_input, 1)
+    parent.add_derived_button = QPushButton("Add Derived")
+    parent.add_derived_button.clicked.connect(parent.data_processor.define_derived_variable)
+    derived_row.addWidget(parent.add_derived_button)
+    netcdf_layout.addLayout(derived_row)
+
+    # Temporal aggregation applied while extraction streams over the time axis
+    (aggregation_row, parent.aggregation_frequency,
+     parent.aggregation_statistic, parent.aggregation_output) = create_aggregation_row()
+    netcdf_layout.addLayout(aggregation_row)
+
     # Tab widget
     parent.tab_widget = QTabWidget()
     parent.tab_widget.setTabPosition(QTabWidget.TabPosition.North)
@@ -93,12 +233,81 @@ def create_netcdf_group(parent):
     parent.plot_netcdf_button.setObjectName("plot-button")
     parent.plot_netcdf_button.setProperty("class", "plot-button")
     plot_layout.addWidget(parent.plot_netcdf_button)
+
+    # Per-cell summary maps over a time window (mean, extremes, percentile, exceedances, trend)
+    summary_row = QHBoxLayout()
+    parent.summary_statistic = QComboBox()
+    parent.summary_statistic.addItems(MAP_STATISTICS)
+    summary_row.addWidget(parent.summary_statistic)
+    parent.summary_parameter = QLineEdit()
+    parent.summary_parameter.setPlaceholderText("Threshold / percentile")
+    summary_row.addWidget(parent.summary_parameter)
+    parent.summary_start = QLineEdit()
+    parent.summary_start.setPlaceholderText("Start (YYYY-MM-DD)")
+    summary_row.addWidget(parent.summary_start)
+    parent.summary_end = QLineEdit()
+    parent.summary_end.setPlaceholderText("End (YYYY-MM-DD)")
+    summary_row.addWidget(parent.summary_end)
+    summary_row.addWidget(QLabel("Cores:"))
+    parent.summary_workers = QSpinBox()
+    parent.summary_workers.setRange(1, os.cpu_count() or 1)
+    summary_row.addWidget(parent.summary_workers)
+    plot_layout.addLayout(summary_row)
+
+    summary_buttons = QHBoxLayout()
+    parent.compute_summary_button = QPushButton("Compute Summary Map")
+    parent.compute_summary_button.setObjectName("plot-button")
+    parent.compute_summary_button.setProperty("class", "plot-button")
+    parent.compute_summary_button.clicked.connect(parent.data_processor.compute_summary_map)
+    summary_buttons.addWidget(parent.compute_summary_button)
+    parent.export_summary_button = QPushButton("Export Map (.asc)")
+    parent.export_summary_button.setEnabled(False)
+    parent.export_summary_button.clicked.connect(parent.data_processor.export_summary_map)
+    summary_buttons.addWidget(parent.export_summary_button)
+    plot_layout.addLayout(summary_buttons)
+
+    # Batch PNG maps of the ticked variables (or the selected one) over a range of dates
+    batch_row = QHBoxLayout()
+    batch_row.addWidget(QLabel("Batch Maps:"))
+    parent.batch_start = QLineEdit()
+    parent.batch_start.setPlaceholderText("Start (YYYY-MM-DD)")
+    batch_row.addWidget(parent.batch_start)
+    parent.batch_end = QLineEdit()
+    parent.batch_end.setPlaceholderText("End (YYYY-MM-DD)")
+    batch_row.addWidget(parent.batch_end)
+    batch_row.addWidget(QLabel("Every:"))
+    parent.batch_every = QSpinBox()
+    parent.batch_every.setRange(1, 100000)
+    parent.batch_every.setToolTip("Render every n-th time step")
+    batch_row.addWidget(parent.batch_every)
+    batch_row.addWidget(QLabel("Cores:"))
+    parent.batch_workers = QSpinBox()
+    parent.batch_workers.setRange(1, os.cpu_count() or 1)
+    batch_row.addWidget(parent.batch_workers)
+    parent.batch_render_button = QPushButton("Render Maps...")
+    parent.batch_render_button.setToolTip(
+        "PNG maps of the ticked extraction variables (or the selected one) with the ticked shapefile/XY "
+        "overlays, rendered as a background job; unchanged frames are skipped"
+    )
+    parent.batch_render_button.clicked.connect(parent.data_processor.batch_render_maps)
+    batch_row.addWidget(parent.batch_render_button)
+    plot_layout.addLayout(batch_row)
     plot_tab.setLayout(plot_layout)
     parent.tab_widget.addTab(plot_tab, "Plotting")
 
     # Extract Region tab
     extract_region_tab = QWidget()
     region_layout = QVBoxLayout()
+    # Zone rasters (integer catchment IDs on the model grid) come in through Load Raster File
+    source_row = QHBoxLayout()
+    source_row.addWidget(QLabel("Regions from:"))
+    parent.region_source = QComboBox()
+    parent.region_source.addItems(REGION_SOURCES)
+    parent.region_source.currentTextChanged.connect(
+        lambda source: parent.upload_shapefile_button.setEnabled(source == "Shapefile polygons")
+    )
+    source_row.addWidget(parent.region_source, 1)
+    region_layout.addLayout(source_row)
     parent.upload_shapefile_button = QPushButton("Upload Shapefile for Region")
     parent.upload_shapefile_button.clicked.connect(parent.data_processor.upload_extract_shapefile)
     region_layout.addWidget(parent.upload_shapefile_button)
@@ -117,15 +326,13 @@ def create_netcdf_group(parent):
     parent.upload_point_csv_button = QPushButton("Upload CSV for Points")
     parent.upload_point_csv_button.clicked.connect(parent.data_processor.upload_extract_points_csv)
     horizontal_row.addWidget(parent.upload_point_csv_button)
-    parent.point_selector_list = QListWidget()
-    parent.point_selector_list.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
+    parent.point_selector_list = CheckableSelector(max_height=120)
     parent.point_selector_list.setEnabled(False)
-    parent.point_selector_list.setMaximumHeight(120)
     horizontal_row.addWidget(parent.point_selector_list)
 
     point_label_layout = QHBoxLayout()
     point_label = QLabel("Upload and Select Points from CSV:")
-    parent.select_all_points_checkbox = QCheckBox("Select All")
+    parent.select_all_points_checkbox = QCheckBox("Select All (shown)")
     parent.select_all_points_checkbox.setEnabled(False)
     parent.select_all_points_checkbox.stateChanged.connect(parent.toggle_all_points)
     point_label_layout.addWidget(point_label)
@@ -142,6 +349,56 @@ def create_netcdf_group(parent):
     extract_point_tab.setLayout(point_layout)
     parent.tab_widget.addTab(extract_point_tab, "Extract Point")
 
+    # Regrid tab: the selected variable onto a new resolution/CRS or another run's grid
+    regrid_tab = QWidget()
+    regrid_layout = QVBoxLayout()
+    method_row = QHBoxLayout()
+    method_row.addWidget(QLabel("Method:"))
+    parent.regrid_method = QComboBox()
+    parent.regrid_method.addItems(REGRID_METHODS)
+    method_row.addWidget(parent.regrid_method)
+    method_row.addWidget(QLabel("Target:"))
+    parent.regrid_target = QComboBox()
+    parent.regrid_target.addItems(REGRID_TARGETS)
+    method_row.addWidget(parent.regrid_target, 1)
+    regrid_layout.addLayout(method_row)
+    target_row = QHBoxLayout()
+    parent.regrid_resolution = QLineEdit()
+    parent.regrid_resolution.setPlaceholderText("Cell size in target CRS units")
+    target_row.addWidget(parent.regrid_resolution)
+    parent.regrid_crs = QLineEdit()
+    parent.regrid_crs.setPlaceholderText("Target CRS (blank: the dataset's)")
+    target_row.addWidget(parent.regrid_crs)
+    parent.regrid_target.currentTextChanged.connect(
+        lambda text: [w.setEnabled(text == "Resolution") for w in (parent.regrid_resolution, parent.regrid_crs)]
+    )
+    regrid_layout.addLayout(target_row)
+    parent.regrid_button = QPushButton("Regrid Variable")
+    parent.regrid_button.setToolTip("Write the selected variable on the target grid to a NetCDF file")
+    parent.regrid_button.clicked.connect(parent.data_processor.regrid_variable)
+    parent.regrid_button.setObjectName("plot-button")
+    parent.regrid_button.setProperty("class", "plot-button")
+    regrid_layout.addWidget(parent.regrid_button)
+    regrid_tab.setLayout(regrid_layout)
+    parent.tab_widget.addTab(regrid_tab, "Regrid")
+
+    # Variables for the Extract Region/Point tabs; ticking several extracts them in one pass
+    extract_row = QHBoxLayout()
+    extract_row.addWidget(QLabel("Extract variables\n(none ticked: the selected one):"))
+    parent.extract_variables_list = QListWidget()
+    parent.extract_variables_list.setEnabled(False)
+    parent.extract_variables_list.setMaximumHeight(80)
+    extract_row.addWidget(parent.extract_variables_list, 1)
+    extract_row.addWidget(QLabel("Workers:"))
+    parent.extraction_workers = QSpinBox()
+    parent.extraction_workers.setRange(1, os.cpu_count() or 1)
+    parent.extraction_workers.setToolTip("Processes sharing the extraction, by time chunk (and zone group)")
+    extract_row.addWidget(parent.extraction_workers)
+    parent.queue_extraction_checkbox = QCheckBox("Run as\nbackground job")
+    parent.queue_extraction_checkbox.setToolTip("Queue the extraction on the Jobs tab; it resumes after a restart")
+    extract_row.addWidget(parent.queue_extraction_checkbox)
+    netcdf_layout.addLayout(extract_row)
+
     netcdf_layout.addWidget(parent.tab_widget)
     netcdf_group.setLayout(netcdf_layout)
     return netcdf_group
@@ -157,10 +414,8 @@ def create_csv_group(parent):
     parent.load_csv_button_1.setIcon(parent.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
     parent.load_csv_button_1.clicked.connect(lambda: parent.data_processor.load_csv(1))
     parent.csv_file_label_1 = QLabel("No file loaded")
-    parent.csv_var_selector_1 = QListWidget()
-    parent.csv_var_selector_1.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
+    parent.csv_var_selector_1 = CheckableSelector(max_height=100)
     parent.csv_var_selector_1.setEnabled(False)
-    parent.csv_var_selector_1.setMaximumHeight(100)
     parent.y_axis_label_1 = QLineEdit()
     parent.y_axis_label_1.setPlaceholderText("Enter Y-axis title for Dataset 1")
     parent.y_axis_label_1.setEnabled(False)
@@ -185,10 +440,8 @@ def create_csv_group(parent):
     parent.load_csv_button_2.setIcon(parent.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon))
     parent.load_csv_button_2.clicked.connect(lambda: parent.data_processor.load_csv(2))
     parent.csv_file_label_2 = QLabel("No file loaded")
-    parent.csv_var_selector_2 = QListWidget()
-    parent.csv_var_selector_2.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
+    parent.csv_var_selector_2 = CheckableSelector(max_height=100)
     parent.csv_var_selector_2.setEnabled(False)
-    parent.csv_var_selector_2.setMaximumHeight(100)
     parent.y_axis_label_2 = QLineEdit()
     parent.y_axis_label_2.setPlaceholderText("Enter Y-axis title for Dataset 2")
     parent.y_axis_label_2.setEnabled(False)
@@ -208,13 +461,38 @@ def create_csv_group(parent):
     csv_layout.addWidget(parent.csv_var_selector_2, 4, 1)
     csv_layout.addWidget(parent.y_axis_label_2, 6, 1)
 
+    (csv_aggregation_row, parent.csv_aggregation_frequency,
+     parent.csv_aggregation_statistic, parent.csv_aggregation_output) = create_aggregation_row()
+    csv_layout.addLayout(csv_aggregation_row, 7, 0, 1, 2)
+
     parent.plot_csv_button = QPushButton("Plot timeseries CSV")
     parent.plot_csv_button.setEnabled(False)
     parent.plot_csv_button.setObjectName("plot-button")
     parent.plot_csv_button.setProperty("class", "plot-button")
     parent.plot_csv_button.clicked.connect(parent.plotter.plot_csv_variable)
 
-    csv_layout.addWidget(parent.plot_csv_button, 7, 0, 1, 2, Qt.AlignmentFlag.AlignCenter)
+    csv_layout.addWidget(parent.plot_csv_button, 8, 0, 1, 2, Qt.AlignmentFlag.AlignCenter)
+
+    # Skill of dataset 2 (simulated) against dataset 1 (observed), for every column pair
+    skill_row = QHBoxLayout()
+    skill_row.addWidget(QLabel("Skill:"))
+    parent.skill_pairing = QComboBox()
+    parent.skill_pairing.addItems(PAIRINGS)
+    parent.skill_pairing.setToolTip("Matching names also pairs ensemble members such as 'Q12_m01' with 'Q12'")
+    skill_row.addWidget(parent.skill_pairing)
+    parent.skill_breakdown = QComboBox()
+    parent.skill_breakdown.addItems(BREAKDOWNS)
+    skill_row.addWidget(parent.skill_breakdown)
+    skill_row.addWidget(QLabel("Rank by:"))
+    parent.skill_rank_by = QComboBox()
+    parent.skill_rank_by.addItems(METRICS)
+    parent.skill_rank_by.setCurrentText("KGE")
+    skill_row.addWidget(parent.skill_rank_by)
+    parent.score_skill_button = QPushButton("Score Dataset 2 vs 1...")
+    parent.score_skill_button.setEnabled(False)
+    parent.score_skill_button.clicked.connect(parent.data_processor.score_skill)
+    skill_row.addWidget(parent.score_skill_button)
+    csv_layout.addLayout(skill_row, 9, 0, 1, 2)
 
     csv_group.setLayout(csv_layout)
     return csv_group